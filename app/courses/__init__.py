@@ -0,0 +1 @@
+default_app_config = "app.courses.apps.CoursesConfig"
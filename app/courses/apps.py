@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 
 class CoursesConfig(AppConfig):
-    name = "courses"
+    name = "app.courses"
+
+    def ready(self):
+        from . import checks, signals  # noqa
@@ -0,0 +1,133 @@
+import time
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def get_cache(name):
+    """
+    Return the cache backend configured for ``name``.
+    Each cache used by the courses app is looked up through a setting that
+    holds a ``CACHES`` alias, so any of them can be moved to a dedicated
+    backend (memcached, redis, ...) without code changes.
+    """
+    return caches[getattr(settings, name, "default")]
+
+
+def render_cache_key(item):
+    return "content-render:{}:{}:{}".format(
+        item._meta.label_lower, item.pk, item.updated.timestamp()
+    )
+
+
+def version_key(name):
+    return "fragment-version:{}".format(name)
+
+
+def get_versions(*names):
+    """
+    Return the current version token of each of ``names``.
+    Tokens are random rather than counters so a version evicted from the
+    cache never comes back with a value older fragments were stored under.
+    """
+    cache = get_cache("FRAGMENT_CACHE")
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*names):
+    """
+    Invalidate the fragments built on ``names``.
+    The versions change right away and again once the transaction commits,
+    so a fragment rebuilt from uncommitted-yet data isn't kept.
+    """
+
+    def bump():
+        get_cache("FRAGMENT_CACHE").set_many(
+            {version_key(name): uuid4().hex for name in names}, None
+        )
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def enrollment_key(user_id):
+    return "enrollments:{}".format(user_id)
+
+
+def get_enrolled_course_ids(user):
+    """
+    Ids of the courses ``user`` is enrolled in, newest first, cached per
+    user until forget_enrollments() is called for them.
+    """
+    cache = get_cache("ENROLLMENT_CACHE")
+    key = enrollment_key(user.pk)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = list(user.courses_joined.values_list("id", flat=True))
+        cache.set(key, course_ids, settings.ENROLLMENT_CACHE_TIMEOUT)
+    return course_ids
+
+
+def forget_enrollments(*user_ids):
+    """
+    Drop the cached enrollments of ``user_ids``, now and, inside a
+    transaction, again once it commits, as bump_versions() does.
+    """
+
+    def forget():
+        get_cache("ENROLLMENT_CACHE").delete_many(
+            [enrollment_key(user_id) for user_id in user_ids]
+        )
+
+    forget()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(forget)
+
+
+def fragment_key(name, *parts):
+    """
+    Cache key of fragment ``name`` for ``parts``, which may come from the
+    request and are hashed to keep the key valid for any backend.
+    """
+    digest = md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    return "fragment:{}:{}".format(name, digest)
+
+
+def get_or_build(key, build):
+    """
+    Return the cached value of ``key``, calling ``build`` on a miss.
+    Only the worker that takes the rebuild lock calls ``build``, others
+    poll until the value appears and build it themselves only if the
+    holder doesn't store it before the lock expires.
+    """
+    cache = get_cache("FRAGMENT_CACHE")
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock_key = key + ":lock"
+    lock_timeout = settings.FRAGMENT_CACHE_LOCK_TIMEOUT
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, 1, lock_timeout):
+        time.sleep(0.05)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if time.monotonic() > deadline:
+            return build()
+    try:
+        value = cache.get(key)
+        if value is None:
+            value = build()
+            cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return value
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# caches invalidated or shared across the worker processes
+SHARED_CACHES = (
+    "CONTENT_RENDER_CACHE",
+    "FRAGMENT_CACHE",
+    "ENROLLMENT_CACHE",
+    "AWS_S3_URL_CACHE",
+)
+
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    A cache that is invalidated on save must be shared by the workers: with
+    a per-process backend the other workers keep serving what one of them
+    invalidated.
+    """
+    errors = []
+    for name in SHARED_CACHES:
+        alias = getattr(settings, name, None)
+        if not alias:
+            continue
+        backend = settings.CACHES.get(alias, {}).get("BACKEND")
+        if backend in PROCESS_LOCAL_BACKENDS:
+            errors.append(
+                Error(
+                    "{} uses the process-local {} cache.".format(name, alias),
+                    hint="Configure a cache shared by the workers, such as "
+                    "DatabaseCache, in CACHES.",
+                    id="courses.E001",
+                )
+            )
+    return errors
@@ -0,0 +1,65 @@
+import time
+from datetime import datetime, timezone
+from hashlib import md5
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+
+class ConditionalGetMixin:
+    """
+    Answer GET and HEAD requests with ETag and Last-Modified validators,
+    and with 304 Not Modified without rendering when they still match.
+    Views implement ``get_validator_values`` returning the ``updated``
+    maxima and row counts of what the page shows, read in one aggregate
+    query. The ETag also covers the user, the CSRF cookie the page's forms
+    were rendered for and the request path.
+    Pages embed signed media urls, so validators also change every
+    ``lifetime`` seconds to make browsers refetch them before they expire.
+    """
+
+    lifetime = None
+
+    def get_validators(self, request, *args, **kwargs):
+        if not hasattr(self, "_validators"):
+            values = self.get_validator_values(request, *args, **kwargs)
+            dates = [
+                value
+                for value in values.values()
+                if isinstance(value, datetime)
+            ]
+            window = None
+            if self.lifetime:
+                window = int(time.time() // self.lifetime)
+                dates.append(
+                    datetime.fromtimestamp(
+                        window * self.lifetime, timezone.utc
+                    )
+                )
+            parts = [
+                sorted(values.items()),
+                window,
+                request.user.pk,
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+                request.get_full_path(),
+            ]
+            self._validators = (
+                md5(repr(parts).encode()).hexdigest(),
+                max(dates) if dates else None,
+            )
+        return self._validators
+
+    def get_etag(self, request, *args, **kwargs):
+        return self.get_validators(request, *args, **kwargs)[0]
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return self.get_validators(request, *args, **kwargs)[1]
+
+    def dispatch(self, request, *args, **kwargs):
+        dispatch = super().dispatch
+        if request.method in ("GET", "HEAD"):
+            dispatch = condition(
+                etag_func=self.get_etag,
+                last_modified_func=self.get_last_modified,
+            )(dispatch)
+        return dispatch(request, *args, **kwargs)
@@ -0,0 +1,426 @@
+from collections import defaultdict, namedtuple
+from itertools import accumulate, islice
+from random import Random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.template.defaultfilters import slugify
+
+from .cache import bump_versions
+from .models import (
+    RATING_VALUES,
+    Content,
+    Course,
+    CourseStats,
+    Module,
+    Rating,
+    SlugCounter,
+    Subject,
+    Text,
+)
+from .search import INDEX_BATCH_SIZE, index_courses
+
+Dataset = namedtuple("Dataset", "owner subjects courses students enrollments")
+
+# generated ratings lean towards the high values, as real ones do
+RATING_WEIGHTS = [1, 1, 2, 5, 10, 8]
+
+
+def seed_dataset(
+    seed=1,
+    prefix="bench",
+    subjects=5,
+    courses=100,
+    modules=5,
+    contents=5,
+    students=100,
+    enrollments=5,
+    rating_ratio=0.3,
+):
+    """
+    Generate a dataset of ``courses`` courses of one owner and
+    ``students`` students with DatasetGenerator, index its courses for
+    search and return it as a Dataset. Module, content and enrollment
+    counts average the given ones; the enrolled students come first.
+    """
+    generator = DatasetGenerator(
+        seed=seed,
+        prefix=prefix,
+        users=students + 1,
+        teachers=0,
+        subjects=subjects,
+        courses=courses,
+        modules=modules,
+        contents=contents,
+        enrollments=enrollments,
+        rating_ratio=rating_ratio,
+    )
+    generator.generate()
+    User = get_user_model()
+    first_user = generator.first_ids[User]
+    owner = User.objects.get(pk=first_user)
+    course_ids = [stats.course_id for stats in generator.stats]
+    enrolled = defaultdict(list)
+    for course_id, student_id in (
+        Course.students.through.objects.filter(course_id__in=course_ids)
+        .order_by("pk")
+        .values_list("course_id", "user_id")
+    ):
+        enrolled[student_id].append(course_id)
+    student_ids = sorted(
+        range(first_user + 1, first_user + students + 1),
+        key=lambda student_id: student_id not in enrolled,
+    )
+    for i in range(0, len(course_ids), INDEX_BATCH_SIZE):
+        index_courses(course_ids[i : i + INDEX_BATCH_SIZE])
+    return Dataset(
+        owner,
+        [generator.first_ids[Subject] + i for i in range(subjects)],
+        course_ids,
+        student_ids,
+        {student_id: enrolled[student_id] for student_id in student_ids},
+    )
+
+
+def forget_slugs(prefix):
+    """
+    Delete the SlugCounter rows claimed by the datasets of ``prefix``, so
+    a dataset deleted with its slugs can be generated again.
+    """
+    for model, noun in ((Subject, "subject"), (Course, "course")):
+        base = slugify("{} {}".format(prefix, noun))
+        SlugCounter.objects.filter(
+            Q(slug=base) | Q(slug__startswith=base + "-"),
+            model=model._meta.label_lower,
+        ).delete()
+
+
+def zipf_weights(rng, count, exponent):
+    """
+    Cumulative Zipf weights of ``count`` items for rng.choices(): the item
+    of popularity rank r weighs 1 / r ** exponent. Ranks are shuffled so
+    popularity doesn't follow insertion order.
+    """
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return list(accumulate(1 / rank**exponent for rank in ranks))
+
+
+class DatasetGenerator:
+    """
+    Insert a large synthetic dataset: users, a share of them teaching,
+    subjects, courses with modules of text contents, and enrollments and
+    ratings spread over courses by Zipfian popularity.
+
+    Everything derives from ``seed``. Ids, slugs and orders are computed
+    here rather than queried per row by the models: rows get explicit ids
+    after the highest existing one and the sequences are reset at the end,
+    so nothing is read back, and the CourseStats rows are written from the
+    generated counts. Rows are inserted as plain tuples with executemany(),
+    skipping model instances and signals, which would cost more than the
+    inserts themselves. The dataset is meant for an otherwise idle
+    database: concurrent inserts would compete for the ids.
+    """
+
+    def __init__(
+        self,
+        seed=1,
+        prefix="gen",
+        users=1000,
+        teachers=0.01,
+        subjects=20,
+        courses=100,
+        modules=10,
+        contents=5,
+        enrollments=3,
+        rating_ratio=0.3,
+        exponent=1.1,
+        batch_size=5000,
+        progress=None,
+    ):
+        self.rng = Random(seed)
+        self.prefix = prefix
+        self.users = users
+        self.teachers = max(1, int(users * teachers))
+        self.subjects = subjects
+        self.courses = courses
+        self.modules = modules
+        self.contents = contents
+        self.enrollments = enrollments
+        self.rating_ratio = rating_ratio
+        self.exponent = exponent
+        self.batch_size = batch_size
+        self.progress = progress or (lambda model, count: None)
+        self.counts = {}
+
+    def generate(self):
+        User = get_user_model()
+        username = "{}-user-0".format(self.prefix)
+        if User.objects.filter(username=username).exists():
+            raise ValueError(
+                "A dataset of prefix {} was already generated".format(
+                    self.prefix
+                )
+            )
+        self.subject_slugs = self.claim_slugs(
+            Subject, "subject", self.subjects
+        )
+        self.course_slugs = self.claim_slugs(Course, "course", self.courses)
+        self.first_ids = {
+            model: (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+            for model in (User, Subject, Course, Module, Text)
+        }
+        self.stats = [
+            CourseStats(course_id=self.first_ids[Course] + i)
+            for i in range(self.courses)
+        ]
+        self.insert(
+            User,
+            ["id", "username", "email", "password", "is_teacher"],
+            self.generate_users(),
+        )
+        self.insert(Subject, ["id", "title", "slug"], self.generate_subjects())
+        self.insert(
+            Course,
+            ["id", "owner", "subject", "title", "slug", "overview"],
+            self.generate_courses(),
+        )
+        self.insert_contents()
+        self.insert_enrollments()
+        for stats in self.stats:
+            if stats.rating_count:
+                stats.rating_average = stats.rating_sum / stats.rating_count
+        fields = [
+            "course_id",
+            "total_modules",
+            "total_contents",
+            "total_students",
+            "rating_sum",
+            "rating_count",
+            "rating_average",
+            *("ratings_{}".format(value) for value in RATING_VALUES),
+        ]
+        self.insert(
+            CourseStats,
+            fields,
+            (
+                tuple(getattr(stats, name) for name in fields)
+                for stats in self.stats
+            ),
+        )
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), list(self.first_ids)
+            ):
+                cursor.execute(sql)
+        bump_versions("catalog", "subjects")
+        return self.counts
+
+    def claim_slugs(self, model, noun, count):
+        """
+        Slugs of the titles "<prefix> <noun> <i>" of ``count`` rows of
+        ``model``, claimed in SlugCounter as reserve_slugs() would: each
+        slug gets a counter, so saving the same title again adds a suffix,
+        and the counter of the shared "<prefix>-<noun>" base is moved past
+        the generated suffixes. Slugs already in use raise ValueError.
+        """
+        base = slugify("{} {}".format(self.prefix, noun))
+        slugs = ["{}-{}".format(base, i) for i in range(count)]
+        label = model._meta.label_lower
+        with transaction.atomic():
+            counter, _ = SlugCounter.objects.select_for_update().get_or_create(
+                model=label,
+                slug=base,
+                defaults={"last": model._last_slug_suffix(base)},
+            )
+            used = set(
+                model.objects.filter(slug__startswith=base + "-").values_list(
+                    "slug", flat=True
+                )
+            )
+            # reserve_slugs() hands out the suffixes 1 to counter.last
+            if counter.last >= 1 or used.intersection(slugs):
+                raise ValueError(
+                    "Slugs starting with {} are already in use".format(base)
+                )
+            counter.last = max(counter.last, count - 1)
+            counter.save(update_fields=["last"])
+            for batch in range(0, count, self.batch_size):
+                SlugCounter.objects.bulk_create(
+                    [
+                        SlugCounter(model=label, slug=slug, last=0)
+                        for slug in slugs[batch : batch + self.batch_size]
+                    ],
+                    ignore_conflicts=True,
+                )
+        return slugs
+
+    def spread(self, mean):
+        """
+        A count averaging ``mean``, between 1 and twice the mean.
+        """
+        return self.rng.randint(1, max(1, 2 * mean - 1))
+
+    def insert(self, model, fields, rows):
+        """
+        Insert ``rows``, tuples of database values of ``fields``, with one
+        executemany() and transaction per ``batch_size`` rows. The other
+        columns get the values of a new instance, defaults and auto_now
+        timestamps included.
+        """
+        opts = model._meta
+        given = [opts.get_field(name) for name in fields]
+        rest = [
+            field
+            for field in opts.concrete_fields
+            if field not in given and not field.primary_key
+        ]
+        template = model()
+        defaults = tuple(
+            field.get_db_prep_save(field.pre_save(template, True), connection)
+            for field in rest
+        )
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            connection.ops.quote_name(opts.db_table),
+            ", ".join(
+                connection.ops.quote_name(field.column)
+                for field in given + rest
+            ),
+            ", ".join(["%s"] * len(given + rest)),
+        )
+        rows = iter(rows)
+        while True:
+            batch = [row + defaults for row in islice(rows, self.batch_size)]
+            if not batch:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            self.counts[model] = self.counts.get(model, 0) + len(batch)
+            self.progress(model, self.counts[model])
+
+    def generate_users(self):
+        first = self.first_ids[get_user_model()]
+        for i in range(self.users):
+            username = "{}-user-{}".format(self.prefix, i)
+            yield (
+                first + i,
+                username,
+                "{}@example.com".format(username),
+                UNUSABLE_PASSWORD_PREFIX,
+                i < self.teachers,
+            )
+
+    def generate_subjects(self):
+        first = self.first_ids[Subject]
+        for i in range(self.subjects):
+            title = "{} subject {}".format(self.prefix, i)
+            yield (first + i, title, self.subject_slugs[i])
+
+    def generate_courses(self):
+        first_user = self.first_ids[get_user_model()]
+        self.owners = []
+        for i, stats in enumerate(self.stats):
+            title = "{} course {}".format(self.prefix, i)
+            self.owners.append(first_user + self.rng.randrange(self.teachers))
+            yield (
+                stats.course_id,
+                self.owners[i],
+                self.first_ids[Subject] + self.rng.randrange(self.subjects),
+                title,
+                self.course_slugs[i],
+                "Overview of {}".format(title),
+            )
+
+    def insert_contents(self):
+        """
+        Insert the modules, texts and contents of the courses, a batch of
+        each in turn so contents only reference inserted rows.
+        """
+        text_type = ContentType.objects.get_for_model(Text).pk
+        module_id = self.first_ids[Module]
+        text_id = self.first_ids[Text]
+        modules, texts, contents = [], [], []
+        for i, stats in enumerate(self.stats):
+            # items belong to the course owner, who edits them
+            owner_id = self.owners[i]
+            stats.total_modules = self.spread(self.modules)
+            for order in range(stats.total_modules):
+                modules.append(
+                    (
+                        module_id,
+                        stats.course_id,
+                        "Module {}".format(order + 1),
+                        "Module {} of course {}".format(order + 1, i),
+                        order,
+                    )
+                )
+                for content_order in range(self.spread(self.contents)):
+                    texts.append(
+                        (
+                            text_id,
+                            owner_id,
+                            "Text {}".format(content_order + 1),
+                            "Lorem ipsum dolor sit amet.",
+                        )
+                    )
+                    contents.append(
+                        (module_id, text_type, text_id, content_order)
+                    )
+                    text_id += 1
+                    stats.total_contents += 1
+                module_id += 1
+            if len(contents) >= self.batch_size or i == len(self.stats) - 1:
+                self.insert(
+                    Module,
+                    ["id", "course", "title", "description", "order"],
+                    modules,
+                )
+                self.insert(Text, ["id", "owner", "title", "content"], texts)
+                self.insert(
+                    Content,
+                    ["module", "content_type", "object_id", "order"],
+                    contents,
+                )
+                modules, texts, contents = [], [], []
+
+    def insert_enrollments(self):
+        """
+        Enroll every user in about ``enrollments`` courses picked by
+        popularity, and have them rate a ``rating_ratio`` share of them.
+        """
+        first_user = self.first_ids[get_user_model()]
+        weights = zipf_weights(self.rng, self.courses, self.exponent)
+        indexes = range(self.courses)
+        ratings = []
+
+        def enrollments():
+            for i in range(self.users):
+                user_id = first_user + i
+                picked = self.rng.choices(
+                    indexes,
+                    cum_weights=weights,
+                    k=self.rng.randint(0, 2 * self.enrollments),
+                )
+                for index in sorted(set(picked)):
+                    stats = self.stats[index]
+                    stats.total_students += 1
+                    yield (stats.course_id, user_id)
+                    if self.rng.random() < self.rating_ratio:
+                        value = self.rng.choices(
+                            RATING_VALUES, weights=RATING_WEIGHTS
+                        )[0]
+                        stats.rating_count += 1
+                        stats.rating_sum += value
+                        field = "ratings_{}".format(value)
+                        setattr(stats, field, getattr(stats, field) + 1)
+                        ratings.append((stats.course_id, user_id, value))
+                if len(ratings) >= self.batch_size:
+                    self.insert(Rating, ["course", "user", "value"], ratings)
+                    ratings.clear()
+
+        self.insert(Course.students.through, ["course", "user"], enrollments())
+        self.insert(Rating, ["course", "user", "value"], ratings)
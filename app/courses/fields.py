@@ -1,36 +1,88 @@
-from django.db import models
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import connections, models, router
+from django.db.models import Max
 
 
 class OrderField(models.PositiveIntegerField):
     """
     Automatically assign an order value to records
-    Will order course modules with respect to the course they belong to 
+    Will order course modules with respect to the course they belong to
     and module contents with respect to the module they belong to.
+    The parent rows named in ``for_fields`` are locked while the next value
+    is read, so concurrent inserts under the same parent get distinct
+    values as long as the save runs in a transaction (see OrderedModel).
     """
 
     def __init__(self, for_fields=None, *args, **kwargs):
         self.for_fields = for_fields
         super(OrderField, self).__init__(*args, **kwargs)
 
+    def get_for_attnames(self):
+        return [
+            self.model._meta.get_field(field).attname
+            for field in self.for_fields or []
+        ]
+
+    def lock_parents(self, using, values):
+        """
+        Lock the parent rows referenced by ``values`` ({attname: ids}).
+        """
+        connection = connections[using]
+        if not (
+            connection.features.has_select_for_update
+            and connection.in_atomic_block
+        ):
+            return
+        for field in self.for_fields or []:
+            field = self.model._meta.get_field(field)
+            if not field.is_relation:
+                continue
+            parents = field.related_model._base_manager.using(using)
+            list(
+                parents.select_for_update()
+                .filter(pk__in=values[field.attname])
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+
+    def next_values(self, using, groups):
+        """
+        Return the next free order value of each group in one query.
+        ``groups`` are tuples of the ``for_fields`` attname values.
+        """
+        attnames = self.get_for_attnames()
+        values = {
+            attname: {group[i] for group in groups}
+            for i, attname in enumerate(attnames)
+        }
+        self.lock_parents(using, values)
+        qs = self.model._base_manager.using(using).filter(
+            **{attname + "__in": ids for attname, ids in values.items()}
+        )
+        if attnames:
+            last = {
+                tuple(row[attname] for attname in attnames): row["last"]
+                for row in qs.values(*attnames)
+                .annotate(last=Max(self.attname))
+                .order_by()
+            }
+        else:
+            last = {(): qs.aggregate(last=Max(self.attname))["last"]}
+        return {
+            group: 0 if last.get(group) is None else last[group] + 1
+            for group in groups
+        }
+
     def pre_save(self, model_instance, add):
         if getattr(model_instance, self.attname) is None:
             # no current value
-            try:
-                qs = self.model.objects.all()
-                if self.for_fields:
-                    # filter by objects with the same field values
-                    # for the fields in "for_fields"
-                    query = {
-                        field: getattr(model_instance, field)
-                        for field in self.for_fields
-                    }
-                    qs = qs.filter(**query)
-                # get the order of the last item
-                last_item = qs.latest(self.attname)
-                value = last_item.order + 1
-            except ObjectDoesNotExist:
-                value = 0
+            using = model_instance._state.db or router.db_for_write(
+                self.model, instance=model_instance
+            )
+            group = tuple(
+                getattr(model_instance, attname)
+                for attname in self.get_for_attnames()
+            )
+            value = self.next_values(using, [group])[group]
             setattr(model_instance, self.attname, value)
             return value
         else:
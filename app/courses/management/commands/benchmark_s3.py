@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3.session
+from botocore.exceptions import ClientError
+from django.core.management.base import BaseCommand
+
+from utils.content_manager.aws_S3 import S3Storage
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a boto3 resource per thread with the shared S3 client: "
+        "connection setup time and HEAD latency from concurrent threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--requests", type=int, default=20)
+        parser.add_argument(
+            "--name",
+            default="default.jpg",
+            help="Name of the object requested, it may not exist.",
+        )
+
+    def handle(self, *args, **options):
+        storage = S3Storage()
+        key = storage._encode_name(
+            storage._normalize_name(storage._clean_name(options["name"]))
+        )
+        local = threading.local()
+
+        def per_thread_client():
+            if not hasattr(local, "client"):
+                local.client = (
+                    boto3.session.Session()
+                    .resource(
+                        "s3",
+                        aws_access_key_id=storage.access_key,
+                        aws_secret_access_key=storage.secret_key,
+                        region_name=storage.region_name,
+                        use_ssl=storage.use_ssl,
+                        endpoint_url=storage.endpoint_url,
+                    )
+                    .meta.client
+                )
+            return local.client
+
+        for label, get_client in (
+            ("resource per thread", per_thread_client),
+            ("shared client", lambda: storage.client),
+        ):
+            self.run(label, get_client, storage.bucket_name, key, options)
+
+    def run(self, label, get_client, bucket, key, options):
+        setups, latencies = [], []
+        lock = threading.Lock()
+
+        def work(i):
+            started = time.perf_counter()
+            client = get_client()
+            setup = time.perf_counter() - started
+            timings = []
+            for request in range(options["requests"]):
+                started = time.perf_counter()
+                try:
+                    client.head_object(Bucket=bucket, Key=key)
+                except ClientError:
+                    pass
+                timings.append(time.perf_counter() - started)
+            with lock:
+                setups.append(setup)
+                latencies.extend(timings)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            list(pool.map(work, range(options["threads"])))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            "{:<20} setup {:8.1f} ms total  HEAD p50 {:6.1f} ms  "
+            "p95 {:6.1f} ms  {:7.1f} req/s".format(
+                label,
+                sum(setups) * 1000,
+                percentile(latencies, 0.5) * 1000,
+                percentile(latencies, 0.95) * 1000,
+                len(latencies) / elapsed,
+            )
+        )
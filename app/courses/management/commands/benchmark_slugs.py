@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.authentication.models import User
+from app.courses.models import Course, Subject
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create many courses sharing one title and report the cost of "
+        "slug allocation. Everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=10000)
+        parser.add_argument("--title", default="Benchmark course")
+        parser.add_argument("--report-every", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        owner = User.objects.create(username="benchmark-slugs")
+        subject = Subject.objects.create(title="Benchmark slugs")
+        every = options["report_every"]
+        started = batch_started = time.perf_counter()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            for i in range(1, options["courses"] + 1):
+                Course.objects.create(
+                    owner=owner, subject=subject, title=options["title"]
+                )
+                if i % every == 0:
+                    now = time.perf_counter()
+                    self.stdout.write(
+                        "{:>8} courses  {:8.3f} ms/course".format(
+                            i, (now - batch_started) * 1000 / every
+                        )
+                    )
+                    batch_started = now
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                "{} courses in {:.2f}s, {:.1f} queries/course".format(
+                    options["courses"],
+                    elapsed,
+                    counter.count / options["courses"],
+                )
+            )
+        )
@@ -0,0 +1,370 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from app.courses.datasets import forget_slugs, seed_dataset
+from app.courses.models import Course, Module, Subject
+from app.courses.progress import buffer
+
+
+def summary(values):
+    values = sorted(values)
+    return {
+        "mean": statistics.mean(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a dataset in the configured database and measure latency, "
+        "queries and allocated memory of the course pages, search, "
+        "enrollment and rating. Results are written as JSON, optionally "
+        "compared with an earlier run. The seeded rows are committed to "
+        "the database and deleted afterwards: don't run it against "
+        "production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--subjects", type=int, default=5)
+        parser.add_argument("--courses", type=int, default=100)
+        parser.add_argument("--modules", type=int, default=5)
+        parser.add_argument("--contents", type=int, default=5)
+        parser.add_argument("--students", type=int, default=100)
+        parser.add_argument("--enrollments", type=int, default=5)
+        parser.add_argument(
+            "--rating-ratio",
+            type=float,
+            default=0.3,
+            help="Share of the enrollments rated.",
+        )
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument(
+            "--hot",
+            type=int,
+            default=10,
+            help="Courses the course pages cycle through.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=10,
+            help="Untimed requests per scenario, enough to cover --hot.",
+        )
+        parser.add_argument(
+            "--allocations",
+            type=int,
+            default=5,
+            help="Requests traced with tracemalloc, apart from the timed "
+            "ones as tracing slows them down.",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            dest="scenarios",
+            help="Only run these scenarios.",
+        )
+        parser.add_argument("--output", default="benchmark.json")
+        parser.add_argument(
+            "--compare", help="Earlier results to compare with."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.2,
+            help="Ratio to the earlier p50 latency reported as regression.",
+        )
+
+    def handle(self, *args, **options):
+        previous = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                previous = json.load(f)
+        self.rng = random.Random(options["seed"])
+        # courses are indexed as the seed commits rather than by workers
+        # competing with the measured requests
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            SEARCH_INDEX_WORKERS=0,
+        ):
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    dataset = seed_dataset(
+                        options["seed"],
+                        subjects=options["subjects"],
+                        courses=options["courses"],
+                        modules=options["modules"],
+                        contents=options["contents"],
+                        students=options["students"],
+                        enrollments=options["enrollments"],
+                        rating_ratio=options["rating_ratio"],
+                    )
+            except ValueError:
+                raise CommandError(
+                    "The dataset of an earlier run is still in the database"
+                )
+            self.stdout.write(
+                "Seeded in {:.1f}s".format(time.perf_counter() - started)
+            )
+            try:
+                results = self.run(dataset, options)
+            finally:
+                self.cleanup(dataset)
+        params = {
+            name: options[name]
+            for name in (
+                "seed",
+                "subjects",
+                "courses",
+                "modules",
+                "contents",
+                "students",
+                "enrollments",
+                "rating_ratio",
+                "requests",
+                "hot",
+                "warmup",
+            )
+        }
+        report = {
+            "meta": {
+                "revision": git_revision(),
+                "date": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+            },
+            "params": params,
+            "results": results,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write("Results written to {}".format(options["output"]))
+        if previous:
+            self.compare(previous, report, options["threshold"])
+
+    def run(self, dataset, options):
+        self.dataset = dataset
+        student = dataset.students[0]
+        self.client = Client()
+        self.client.force_login(type(dataset.owner).objects.get(pk=student))
+        self.slugs = dict(
+            Course.objects.filter(pk__in=dataset.courses).values_list(
+                "pk", "slug"
+            )
+        )
+        self.titles = dict(
+            Course.objects.filter(pk__in=dataset.courses).values_list(
+                "pk", "title"
+            )
+        )
+        self.first_modules = dict(
+            Module.objects.filter(
+                course__in=dataset.courses, order=0
+            ).values_list("course_id", "pk")
+        )
+        self.hot = dataset.courses[: options["hot"]]
+        self.joined = dataset.enrollments[student]
+        self.others = [
+            pk for pk in dataset.courses if pk not in set(self.joined)
+        ] or dataset.courses
+        scenarios = {
+            "catalog": (self.catalog, False),
+            "catalog_cold": (self.catalog, True),
+            "course_detail": (self.course_detail, False),
+            "course_detail_cold": (self.course_detail, True),
+            "module_contents": (self.module_contents, False),
+            "dashboard": (self.dashboard, False),
+            "search": (self.search, False),
+            "enroll": (self.enroll, False),
+            "rate": (self.rate, False),
+        }
+        wanted = options["scenarios"] or list(scenarios)
+        unknown = set(wanted).difference(scenarios)
+        if unknown:
+            raise CommandError(
+                "Unknown scenarios {}".format(", ".join(sorted(unknown)))
+            )
+        results = {}
+        for name in wanted:
+            request, cold = scenarios[name]
+            results[name] = self.measure(request, cold, options)
+            self.stdout.write(
+                "{:<20} p50 {:7.2f} ms  p95 {:7.2f} ms  {:5.1f} queries  "
+                "{:8.1f} KiB".format(
+                    name,
+                    results[name]["latency_ms"]["p50"],
+                    results[name]["latency_ms"]["p95"],
+                    results[name]["queries"]["mean"],
+                    results[name]["allocated_kib"]["mean"],
+                )
+            )
+        return results
+
+    def measure(self, request, cold, options):
+        for i in range(options["warmup"]):
+            self.send(request, i)
+        latencies, queries, allocated = [], [], []
+        for i in range(options["requests"]):
+            if cold:
+                for cache in caches.all():
+                    cache.clear()
+            started = time.perf_counter()
+            count = self.send(request, i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(count)
+        for i in range(options["allocations"]):
+            if cold:
+                for cache in caches.all():
+                    cache.clear()
+            # restarted per request to reset the peak, reset_peak() needs
+            # Python 3.9
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                self.send(request, i)
+                allocated.append(
+                    (tracemalloc.get_traced_memory()[1] - before) / 1024
+                )
+            finally:
+                tracemalloc.stop()
+        return {
+            "requests": options["requests"],
+            "latency_ms": summary(latencies),
+            "queries": summary(queries),
+            "allocated_kib": summary(allocated or [0]),
+        }
+
+    def send(self, request, i):
+        """
+        Make request ``i`` in a transaction of its own, so on-commit
+        handlers such as the enrollment cache invalidation run as when it
+        is served, and return the number of queries it made.
+        """
+        with transaction.atomic():
+            # entered after the BEGIN of the transaction
+            with CaptureQueriesContext(connection) as captured:
+                response = request(i)
+        self.expect_success(response)
+        return len(captured)
+
+    def cleanup(self, dataset):
+        """
+        Delete the seeded rows and their slug counters. Courses, texts,
+        enrollments, ratings and progress go with their users.
+        """
+        # views recorded by the module pages refer to the deleted contents
+        buffer.clear()
+        with transaction.atomic():
+            type(dataset.owner).objects.filter(
+                pk__in=[dataset.owner.pk, *dataset.students]
+            ).delete()
+            Subject.objects.filter(pk__in=dataset.subjects).delete()
+            forget_slugs("bench")
+
+    def expect_success(self, response):
+        if response.status_code >= 400:
+            raise CommandError(
+                "{} answered {}".format(
+                    response.request["PATH_INFO"], response.status_code
+                )
+            )
+
+    def pick(self, course_ids, i):
+        return course_ids[i % len(course_ids)]
+
+    def catalog(self, i):
+        return self.client.get(reverse("student_courses_list"))
+
+    def course_detail(self, i):
+        slug = self.slugs[self.pick(self.hot, i)]
+        return self.client.get(reverse("student_course_detail", args=[slug]))
+
+    def module_contents(self, i):
+        course_id = self.pick(self.joined, i)
+        return self.client.get(
+            reverse(
+                "module_content_list",
+                args=[course_id, self.first_modules[course_id]],
+            )
+        )
+
+    def dashboard(self, i):
+        return self.client.get(reverse("home"))
+
+    def search(self, i):
+        # a title finds one course, "lorem ipsum" is in every course
+        query = self.titles[self.pick(self.hot, i)] if i % 2 else "lorem ipsum"
+        return self.client.get(reverse("student_course_search"), {"q": query})
+
+    def enroll(self, i):
+        course_id = self.pick(self.others, i)
+        return self.client.post(
+            reverse("student_enroll"), {"course": course_id}
+        )
+
+    def rate(self, i):
+        course_id = self.pick(self.hot, i)
+        return self.client.post(
+            reverse("course_rating", args=[course_id]),
+            {"points": self.rng.randint(0, 5)},
+        )
+
+    def compare(self, previous, report, threshold):
+        self.stdout.write(
+            "Compared with {} ({})".format(
+                previous["meta"].get("revision"), previous["meta"]["date"]
+            )
+        )
+        for name, result in report["results"].items():
+            before = previous["results"].get(name)
+            if before is None:
+                continue
+            ratio = result["latency_ms"]["p50"] / before["latency_ms"]["p50"]
+            line = (
+                "{:<20} p50 {:7.2f} -> {:7.2f} ms ({:+.0%})  "
+                "queries {:5.1f} -> {:5.1f}".format(
+                    name,
+                    before["latency_ms"]["p50"],
+                    result["latency_ms"]["p50"],
+                    ratio - 1,
+                    before["queries"]["mean"],
+                    result["queries"]["mean"],
+                )
+            )
+            regressed = ratio > threshold or (
+                result["queries"]["mean"] > before["queries"]["mean"]
+            )
+            self.stdout.write(
+                self.style.ERROR(line + "  REGRESSION") if regressed else line
+            )
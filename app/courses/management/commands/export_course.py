@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from app.courses.transfer import export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Write courses with their modules, contents and items as JSON "
+        "Lines, for import_course. Media are referenced by name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_ids", nargs="+", type=int)
+        parser.add_argument(
+            "--output", default="-", help="File to write, - for stdout."
+        )
+
+    def handle(self, *args, **options):
+        if options["output"] == "-":
+            self.write(self.stdout, options["course_ids"])
+        else:
+            with open(options["output"], "w") as output:
+                self.write(output, options["course_ids"])
+
+    def write(self, output, course_ids):
+        for line in export_lines(course_ids):
+            output.write(line)
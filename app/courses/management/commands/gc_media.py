@@ -0,0 +1,108 @@
+import json
+import os
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.courses.media import delete_files, referenced_among
+from app.courses.models import File
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the stored media no course, image or file row refers to. "
+        "The listing is processed in key order, each batch of it checked "
+        "against the database, and the position reached is saved to "
+        "--checkpoint after every batch, so an interrupted run resumes "
+        "where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefix",
+            action="append",
+            dest="prefixes",
+            help="Directory to collect, images/ and files/ by default.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=24,
+            help="Keep objects modified less than this many hours ago.",
+        )
+        parser.add_argument("--batch", type=int, default=1000)
+        parser.add_argument("--checkpoint", help="Checkpoint file.")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the orphans without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        self.storage = File._meta.get_field("file").storage
+        if not hasattr(self.storage, "iter_objects"):
+            raise CommandError("The media storage can't be listed.")
+        self.options = options
+        self.checkpoint = self.load_checkpoint()
+        cutoff = timezone.now() - timedelta(hours=options["min_age"])
+        scanned = orphans = 0
+        for prefix in options["prefixes"] or ["images/", "files/"]:
+            if prefix in self.checkpoint["done"]:
+                continue
+            objects = iter(
+                self.storage.iter_objects(
+                    prefix, start_after=self.checkpoint["after"].get(prefix)
+                )
+            )
+            while True:
+                batch = list(islice(objects, options["batch"]))
+                if not batch:
+                    break
+                scanned += len(batch)
+                names = [
+                    name
+                    for name, size, modified in batch
+                    if modified <= cutoff
+                ]
+                referenced = referenced_among(names)
+                orphans += self.collect(
+                    prefix,
+                    [name for name in names if name not in referenced],
+                    batch[-1][0],
+                )
+            self.checkpoint["done"].append(prefix)
+            self.save_checkpoint()
+        if options["checkpoint"] and not options["dry_run"]:
+            os.remove(options["checkpoint"])
+        self.stdout.write(
+            "{} {} orphans of {} objects".format(
+                "Found" if options["dry_run"] else "Deleted", orphans, scanned
+            )
+        )
+
+    def collect(self, prefix, names, position):
+        if self.options["dry_run"]:
+            for name in names:
+                self.stdout.write(name)
+        else:
+            delete_files(self.storage, names)
+        if position:
+            self.checkpoint["after"][prefix] = position
+            self.save_checkpoint()
+        return len(names)
+
+    def load_checkpoint(self):
+        path = self.options["checkpoint"]
+        if path and os.path.exists(path):
+            with open(path) as checkpoint:
+                return json.load(checkpoint)
+        return {"after": {}, "done": []}
+
+    def save_checkpoint(self):
+        path = self.options["checkpoint"]
+        if path and not self.options["dry_run"]:
+            with open(path + ".tmp", "w") as checkpoint:
+                json.dump(self.checkpoint, checkpoint)
+            os.replace(path + ".tmp", path)
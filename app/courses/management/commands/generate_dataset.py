@@ -0,0 +1,101 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.courses.datasets import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large synthetic dataset for load testing: users, "
+        "courses with modules and text contents, and enrollments and "
+        "ratings spread over courses by Zipfian popularity. The same seed "
+        "generates the same dataset. Rows are committed batch by batch, "
+        "run rebuild_search_index afterwards to search them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--prefix",
+            default="gen",
+            help="Start of the generated usernames, titles and slugs.",
+        )
+        parser.add_argument("--users", type=int, default=1000000)
+        parser.add_argument(
+            "--teachers",
+            type=float,
+            default=0.01,
+            help="Share of the users owning courses.",
+        )
+        parser.add_argument("--subjects", type=int, default=50)
+        parser.add_argument("--courses", type=int, default=50000)
+        parser.add_argument(
+            "--modules", type=int, default=8, help="Mean per course."
+        )
+        parser.add_argument(
+            "--contents", type=int, default=5, help="Mean per module."
+        )
+        parser.add_argument(
+            "--enrollments", type=int, default=3, help="Mean per user."
+        )
+        parser.add_argument(
+            "--rating-ratio",
+            type=float,
+            default=0.3,
+            help="Share of the enrollments rated.",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Exponent of the course popularity distribution.",
+        )
+        parser.add_argument("--batch", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if min(options["users"], options["courses"], options["subjects"]) < 1:
+            raise CommandError("--users, --courses and --subjects must be > 0")
+        generator = DatasetGenerator(
+            seed=options["seed"],
+            prefix=options["prefix"],
+            users=options["users"],
+            teachers=options["teachers"],
+            subjects=options["subjects"],
+            courses=options["courses"],
+            modules=options["modules"],
+            contents=options["contents"],
+            enrollments=options["enrollments"],
+            rating_ratio=options["rating_ratio"],
+            exponent=options["zipf"],
+            batch_size=options["batch"],
+            progress=self.progress,
+        )
+        self.started = time.perf_counter()
+        self.reported = {}
+        try:
+            counts = generator.generate()
+        except ValueError as e:
+            raise CommandError(e)
+        elapsed = time.perf_counter() - self.started
+        total = sum(counts.values())
+        self.stdout.write(
+            "Generated {} rows in {:.1f}s ({:.0f} rows/s)".format(
+                total, elapsed, total / elapsed
+            )
+        )
+        for model, count in counts.items():
+            self.stdout.write("  {:<20} {}".format(model._meta.label, count))
+
+    def progress(self, model, count):
+        # a line per model every 100k rows or so
+        step = count // 100000
+        if self.reported.get(model) != step:
+            self.reported[model] = step
+            self.stdout.write(
+                "{} {} rows, {:.0f}s".format(
+                    model._meta.label,
+                    count,
+                    time.perf_counter() - self.started,
+                )
+            )
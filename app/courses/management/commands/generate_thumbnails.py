@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from app.courses.models import Course, Image
+from app.courses.thumbnails import generate_derivatives, record_derivatives
+
+
+class Command(BaseCommand):
+    help = "Generate the thumbnails of existing course and content images."
+
+    def handle(self, *args, **options):
+        fields = [(Course, "image"), (Image, "file")]
+        for model, field_name in fields:
+            storage = model._meta.get_field(field_name).storage
+            names = (
+                model.objects.exclude(**{field_name: ""})
+                .values_list(field_name, flat=True)
+                .distinct()
+                .order_by()
+            )
+            for name in names.iterator():
+                try:
+                    generate_derivatives(storage, name)
+                    record_derivatives(name)
+                except Exception as error:
+                    self.stderr.write("{}: {}".format(name, error))
+                else:
+                    self.stdout.write(name)
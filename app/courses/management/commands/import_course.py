@@ -0,0 +1,57 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from app.courses.transfer import CourseImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the courses of an export_course file. The file is read as "
+        "a stream and each course is inserted in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="JSON Lines file, - for stdin.")
+        parser.add_argument(
+            "--owner",
+            help="Username owning every imported row, by default the "
+            "users of the export with the same usernames.",
+        )
+        parser.add_argument(
+            "--media-source",
+            help="Directory with the media the storage doesn't have yet.",
+        )
+        parser.add_argument("--batch", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            User = get_user_model()
+            try:
+                owner = User.objects.get(username=options["owner"])
+            except User.DoesNotExist:
+                raise CommandError("Unknown user {}".format(options["owner"]))
+        importer = CourseImporter(
+            owner=owner,
+            media_source=options["media_source"],
+            batch_size=options["batch"],
+        )
+        try:
+            if options["input"] == "-":
+                counts = importer.load(sys.stdin)
+            else:
+                with open(options["input"]) as lines:
+                    counts = importer.load(lines)
+        except (KeyError, ValueError, ObjectDoesNotExist) as error:
+            raise CommandError("Invalid export: {!r}".format(error))
+        for name in importer.missing_media:
+            self.stderr.write("Missing media {}".format(name))
+        self.stdout.write(
+            "Imported "
+            + ", ".join(
+                "{} {}".format(count, name) for name, count in counts.items()
+            )
+        )
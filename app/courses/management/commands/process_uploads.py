@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.courses.uploads import process_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Transfer staged content uploads to the media storage. Runs until "
+        "interrupted unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no upload is due.",
+        )
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=10,
+            help="Uploads claimed at a time.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2.0,
+            help="Seconds to wait when no upload is due.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            done = process_uploads(options["batch"])
+            total += done
+            if done:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
+        self.stdout.write("Processed {} uploads".format(total))
@@ -0,0 +1,32 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from app.courses.models import Course
+from app.courses.search import INDEX_BATCH_SIZE, index_courses
+
+
+class Command(BaseCommand):
+    help = "Rebuild the course search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "course_ids",
+            nargs="*",
+            type=int,
+            help="Only reindex these courses.",
+        )
+
+    def handle(self, *args, **options):
+        course_ids = iter(
+            options["course_ids"]
+            or Course.objects.order_by("pk").values_list("pk", flat=True)
+        )
+        count = 0
+        while True:
+            batch = list(islice(course_ids, INDEX_BATCH_SIZE))
+            if not batch:
+                break
+            index_courses(batch)
+            count += len(batch)
+        self.stdout.write("Indexed {} courses".format(count))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.content_manager.aws_S3 import S3Storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the hit rate of the signed S3 URL cache over every process "
+        "sharing it, as published each AWS_S3_URL_STATS_INTERVAL seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bucket",
+            help="Bucket of the storage, AWS_STORAGE_BUCKET_NAME "
+            "by default.",
+        )
+
+    def handle(self, *args, **options):
+        storage = S3Storage(bucket=options["bucket"])
+        if not storage.url_cache:
+            raise CommandError("AWS_S3_URL_CACHE is not set")
+        stats = storage.shared_url_cache_stats()
+        self.stdout.write(
+            "{hits} hits, {misses} misses, {rate:.1%} hit rate".format(
+                hits=stats["hits"],
+                misses=stats["misses"],
+                rate=stats["hit_rate"],
+            )
+        )
@@ -0,0 +1,79 @@
+from django.db import models, router, transaction
+from django.db.models import Case, Value, When
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .fields import OrderField
+
+# bulk_create() skips post_save, receivers use this to keep up
+post_bulk_create = Signal(providing_args=["objs"])
+
+
+class OrderedQuerySet(models.QuerySet):
+    """
+    Queryset for models with an OrderField.
+    """
+
+    def get_order_field(self):
+        for field in self.model._meta.concrete_fields:
+            if isinstance(field, OrderField):
+                return field
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Create ``objs`` assigning consecutive orders to those without one.
+        The next order of every parent is read in a single query while the
+        parents are locked, then all rows go in with one INSERT per batch.
+        """
+        objs = list(objs)
+        field = self.get_order_field()
+        using = self.db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            pending = [
+                obj for obj in objs if getattr(obj, field.attname) is None
+            ]
+            if pending:
+                attnames = field.get_for_attnames()
+                groups = [
+                    tuple(getattr(obj, attname) for attname in attnames)
+                    for obj in pending
+                ]
+                next_values = field.next_values(using, set(groups))
+                for obj, group in zip(pending, groups):
+                    setattr(obj, field.attname, next_values[group])
+                    next_values[group] += 1
+            objs = super().bulk_create(objs, *args, **kwargs)
+            post_bulk_create.send(sender=self.model, objs=objs, using=using)
+        return objs
+
+    def set_order(self, pks):
+        """
+        Give the rows of ``pks`` the order of their position in the list,
+        using a single UPDATE ... CASE statement. ``auto_now`` fields are
+        set as a save() would.
+        """
+        field = self.get_order_field()
+        if not pks:
+            return 0
+        values = {
+            other.attname: timezone.now()
+            for other in self.model._meta.concrete_fields
+            if getattr(other, "auto_now", False)
+        }
+        values[field.attname] = Case(
+            *[When(pk=pk, then=Value(order)) for order, pk in enumerate(pks)],
+            output_field=field,
+        )
+        return self.filter(pk__in=pks).update(**values)
+
+
+class ContentQuerySet(OrderedQuerySet):
+    def with_items(self):
+        """
+        Resolve the generic ``item`` of every content in bulk.
+        Contents are grouped by content type and each concrete model
+        (text, video, image, file) is fetched with a single ``id__in``
+        query, so the number of queries does not grow with the number
+        of contents.
+        """
+        return self.select_related("content_type").prefetch_related("item")
@@ -0,0 +1,112 @@
+import logging
+import posixpath
+
+from django.conf import settings
+
+from .models import Course, File, Image
+from .thumbnails import FORMATS, derivative_name
+
+logger = logging.getLogger(__name__)
+
+# models with a stored file and the field holding it
+FILE_FIELDS = {Course: "image", Image: "file", File: "file"}
+
+IMAGE_MODELS = (Course, Image)
+
+
+def stored_names(instance):
+    """
+    Names of the stored files of ``instance``: its file and, for images,
+    the thumbnails generated from it. Nothing for the field's default.
+    """
+    model = type(instance)
+    field = model._meta.get_field(FILE_FIELDS[model])
+    name = getattr(instance, field.attname).name
+    if not name or name == field.default:
+        return []
+    names = [name]
+    if model in IMAGE_MODELS:
+        names += [
+            derivative_name(name, size, extension)
+            for size in settings.THUMBNAIL_SIZES
+            for extension in FORMATS
+        ]
+    return names
+
+
+def is_referenced(name):
+    """
+    Whether a row still uses the stored file ``name``. Uploads with the
+    same name share the object when the storage overwrites files.
+    """
+    return any(
+        model.objects.filter(**{field_name: name}).exists()
+        for model, field_name in FILE_FIELDS.items()
+    )
+
+
+def derivative_source(name):
+    """
+    Name of the original a derivative ``name`` was generated from:
+    images/thumbs/photo.png-card.webp -> images/photo.png.
+    None for names that aren't derivatives.
+    """
+    directory, filename = posixpath.split(name)
+    root, extension = posixpath.splitext(filename)
+    if posixpath.basename(directory) != "thumbs":
+        return None
+    if extension[1:] not in FORMATS:
+        return None
+    for size in settings.THUMBNAIL_SIZES:
+        suffix = "-" + size
+        if root.endswith(suffix) and len(root) > len(suffix):
+            return posixpath.join(
+                posixpath.dirname(directory), root[: -len(suffix)]
+            )
+    return None
+
+
+def referenced_among(names):
+    """
+    The ``names`` used by the database, files and thumbnails, looked up
+    with one query per model so a listing is checked batch by batch.
+    """
+    names = list(names)
+    referenced = set()
+    for model, field_name in FILE_FIELDS.items():
+        referenced.update(
+            model.objects.filter(**{field_name + "__in": names}).values_list(
+                field_name, flat=True
+            )
+        )
+    sources = set(filter(None, map(derivative_source, names)))
+    for model in IMAGE_MODELS if sources else ():
+        field_name = FILE_FIELDS[model]
+        originals = (
+            model.objects.filter(**{field_name + "__in": sources})
+            .values_list(field_name, flat=True)
+            .distinct()
+            .order_by()
+        )
+        for original in originals:
+            referenced.update(stored_names(model(**{field_name: original})))
+    return referenced.intersection(names)
+
+
+def delete_files(storage, names):
+    """
+    Delete ``names`` from ``storage``, in batches where it supports it.
+    """
+    if not names:
+        return
+    if hasattr(storage, "delete_many"):
+        failed = storage.delete_many(names)
+    else:
+        failed = []
+        for name in names:
+            try:
+                storage.delete(name)
+            except OSError:
+                failed.append(name)
+    for name in failed:
+        logger.warning("Could not delete %s", name)
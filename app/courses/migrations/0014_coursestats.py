@@ -0,0 +1,92 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:23
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def counts(queryset, field, **aggregates):
+    return {
+        row[field]: row
+        for row in queryset.values(field).annotate(**aggregates).order_by()
+    }
+
+
+def create_course_stats(apps, schema_editor):
+    Course = apps.get_model("courses", "Course")
+    CourseStats = apps.get_model("courses", "CourseStats")
+    modules = counts(
+        apps.get_model("courses", "Module").objects.all(),
+        "course",
+        total=Count("id"),
+    )
+    contents = counts(
+        apps.get_model("courses", "Content").objects.all(),
+        "module__course",
+        total=Count("id"),
+    )
+    students = counts(
+        Course.students.through.objects.all(), "course", total=Count("id")
+    )
+    ratings = counts(
+        apps.get_model("courses", "Rating").objects.all(),
+        "course",
+        total=Count("id"),
+        value=Sum("value"),
+    )
+    empty = {"total": 0, "value": 0}
+    stats = []
+    for course_id in Course.objects.values_list("id", flat=True).iterator():
+        rating = ratings.get(course_id, empty)
+        stats.append(
+            CourseStats(
+                course_id=course_id,
+                total_modules=modules.get(course_id, empty)["total"],
+                total_contents=contents.get(course_id, empty)["total"],
+                total_students=students.get(course_id, empty)["total"],
+                rating_sum=rating["value"],
+                rating_count=rating["total"],
+                rating_average=(
+                    rating["value"] / rating["total"]
+                    if rating["total"]
+                    else None
+                ),
+            )
+        )
+    CourseStats.objects.bulk_create(stats, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0013_rating"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseStats",
+            fields=[
+                (
+                    "course",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="courses.Course",
+                    ),
+                ),
+                (
+                    "total_modules",
+                    models.PositiveIntegerField(db_index=True, default=0),
+                ),
+                ("total_contents", models.PositiveIntegerField(default=0)),
+                ("total_students", models.PositiveIntegerField(default=0)),
+                ("rating_sum", models.PositiveIntegerField(default=0)),
+                ("rating_count", models.PositiveIntegerField(default=0)),
+                ("rating_average", models.FloatField(blank=True, null=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_course_stats, migrations.RunPython.noop),
+    ]
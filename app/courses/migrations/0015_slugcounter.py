@@ -0,0 +1,33 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0014_coursestats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlugCounter",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("slug", models.SlugField(max_length=200)),
+                ("last", models.IntegerField(default=-1)),
+            ],
+            options={
+                "unique_together": {("model", "slug")},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0015_slugcounter"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="course",
+            options={"ordering": ["-created", "-id"]},
+        ),
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(
+                fields=["-created", "-id"], name="course_created_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0016_course_keyset_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchTerm",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=64)),
+                ("weight", models.PositiveIntegerField()),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_terms",
+                        to="courses.Course",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("term", "course")},
+            },
+        ),
+    ]
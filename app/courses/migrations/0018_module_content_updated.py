@@ -0,0 +1,30 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0017_searchterm"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="content",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="module",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
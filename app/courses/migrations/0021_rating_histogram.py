@@ -0,0 +1,62 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_histograms(apps, schema_editor):
+    CourseStats = apps.get_model("courses", "CourseStats")
+    histograms = {}
+    counts = (
+        apps.get_model("courses", "Rating")
+        .objects.values("course", "value")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in counts:
+        histograms.setdefault(row["course"], {})[
+            "ratings_{}".format(row["value"])
+        ] = row["count"]
+    for course_id, values in histograms.items():
+        CourseStats.objects.filter(course_id=course_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0020_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coursestats",
+            name="ratings_0",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="coursestats",
+            name="ratings_1",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="coursestats",
+            name="ratings_2",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="coursestats",
+            name="ratings_3",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="coursestats",
+            name="ratings_4",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="coursestats",
+            name="ratings_5",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_histograms, migrations.RunPython.noop),
+    ]
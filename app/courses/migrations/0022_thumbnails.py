@@ -0,0 +1,23 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0021_rating_histogram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="thumbnails",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="thumbnails",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0022_thumbnails"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="searchterm",
+            index=models.Index(
+                fields=["term", "-weight"], name="searchterm_term_weight"
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:05
+
+from collections import Counter, defaultdict
+
+from django.db import migrations
+
+from app.courses.search import (
+    FIELD_WEIGHTS,
+    INDEX_BATCH_SIZE,
+    MAX_OCCURRENCES,
+    tokenize,
+)
+
+
+def documents(apps, course_ids, text_type):
+    """
+    The (course_id, field, text) triples of the search index, read with
+    the historical models.
+    """
+    Course = apps.get_model("courses", "Course")
+    Module = apps.get_model("courses", "Module")
+    Content = apps.get_model("courses", "Content")
+    Text = apps.get_model("courses", "Text")
+    for course_id, title, overview in Course.objects.filter(
+        pk__in=course_ids
+    ).values_list("pk", "title", "overview"):
+        yield course_id, "title", title
+        yield course_id, "overview", overview
+    for course_id, title, description in Module.objects.filter(
+        course_id__in=course_ids
+    ).values_list("course_id", "title", "description"):
+        yield course_id, "module_title", title
+        yield course_id, "module_description", description
+    if text_type is None:
+        return
+    text_courses = defaultdict(list)
+    for text_id, course_id in Content.objects.filter(
+        module__course_id__in=course_ids, content_type=text_type
+    ).values_list("object_id", "module__course_id"):
+        text_courses[text_id].append(course_id)
+    for text_id, title, content in Text.objects.filter(
+        id__in=text_courses
+    ).values_list("id", "title", "content"):
+        for course_id in text_courses[text_id]:
+            yield course_id, "text_title", title
+            yield course_id, "text_content", content
+
+
+def fill_search_terms(apps, schema_editor):
+    SearchTerm = apps.get_model("courses", "SearchTerm")
+    text_type = (
+        apps.get_model("contenttypes", "ContentType")
+        .objects.filter(app_label="courses", model="text")
+        .first()
+    )
+    course_ids = list(
+        apps.get_model("courses", "Course")
+        .objects.order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    for i in range(0, len(course_ids), INDEX_BATCH_SIZE):
+        batch = course_ids[i : i + INDEX_BATCH_SIZE]
+        weights = defaultdict(Counter)
+        for course_id, field, value in documents(apps, batch, text_type):
+            for term, count in Counter(tokenize(value)).items():
+                weights[course_id][term] += FIELD_WEIGHTS[field] * min(
+                    count, MAX_OCCURRENCES
+                )
+        SearchTerm.objects.filter(course_id__in=batch).delete()
+        SearchTerm.objects.bulk_create(
+            [
+                SearchTerm(term=term, course_id=course_id, weight=weight)
+                for course_id, terms in weights.items()
+                for term, weight in terms.items()
+            ],
+            batch_size=INDEX_BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("courses", "0023_searchterm_term_weight"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_search_terms, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,43 @@
+import re
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Count, Sum
 from django.template.defaultfilters import slugify
 from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from app.courses.cache import get_cache, render_cache_key
 from app.courses.fields import OrderField
+from app.courses.managers import ContentQuerySet, OrderedQuerySet
 
 User = get_user_model()
 
 
+class SlugCounter(models.Model):
+    """
+    Highest suffix handed out for a base slug of a model, so the next free
+    slug is found without probing the model's table.
+    """
+
+    model = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=200)
+    last = models.IntegerField(default=-1)
+
+    class Meta:
+        unique_together = ("model", "slug")
+
+    def __str__(self):
+        return "<SlugCounter {} {}-{}>".format(
+            self.model, self.slug, self.last
+        )
+
+
 class BaseModel(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -19,19 +46,76 @@ class BaseModel(models.Model):
     class Meta:
         abstract = True
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_title = instance.__dict__.get("title")
+        return instance
+
     @classmethod
     def generate_unique_slug(cls, value):
-        origin_slug = slugify(value)
-        unique_slug = origin_slug
-        numb = 1
-        while cls.objects.filter(slug=unique_slug).exists():
-            unique_slug = "%s-%d" % (origin_slug, numb)
-            numb += 1
-        return unique_slug
+        return cls.reserve_slugs(value, 1)[0]
+
+    @classmethod
+    def reserve_slugs(cls, value, count):
+        """
+        Allocate ``count`` unique slugs for ``value``.
+        The suffixes come from the base slug's SlugCounter row, which is
+        locked while it is bumped, so concurrent saves and bulk imports
+        get distinct slugs with a constant number of queries.
+        """
+        max_length = cls._meta.get_field("slug").max_length
+        origin_slug = slugify(value)[: max_length - 11]
+        label = cls._meta.label_lower
+        with transaction.atomic():
+            counters = SlugCounter.objects.select_for_update()
+            counter = counters.filter(model=label, slug=origin_slug).first()
+            if counter is None:
+                try:
+                    with transaction.atomic():
+                        counter = SlugCounter.objects.create(
+                            model=label,
+                            slug=origin_slug,
+                            last=cls._last_slug_suffix(origin_slug),
+                        )
+                except IntegrityError:
+                    counter = counters.get(model=label, slug=origin_slug)
+            first = counter.last + 1
+            if first == 0 and re.search(r"-\d+$", origin_slug):
+                # "python-3" as such could be suffix 3 of "python"
+                first = 1
+            counter.last = first + count - 1
+            counter.save(update_fields=["last"])
+        return [
+            "%s-%d" % (origin_slug, numb) if numb else origin_slug
+            for numb in range(first, first + count)
+        ]
+
+    @classmethod
+    def _last_slug_suffix(cls, origin_slug):
+        """
+        Highest suffix already used for ``origin_slug``, for slugs saved
+        before its counter existed.
+        """
+        last = -1
+        slugs = cls.objects.filter(
+            models.Q(slug=origin_slug)
+            | models.Q(slug__startswith=origin_slug + "-")
+        ).values_list("slug", flat=True)
+        for slug in slugs.iterator():
+            suffix = slug[len(origin_slug) + 1 :]
+            if slug == origin_slug:
+                last = max(last, 0)
+            elif suffix.isdigit():
+                last = max(last, int(suffix))
+        return last
 
     def save(self, *args, **kwargs):
-        self.slug = self.generate_unique_slug(self.title)
+        title_changed = self.title != getattr(self, "_loaded_title", None)
+        if self._state.adding or not self.slug or title_changed:
+            self.slug = self.generate_unique_slug(self.title)
         super().save(*args, **kwargs)
+        self._loaded_title = self.title
 
 
 class Subject(BaseModel):
@@ -62,18 +146,29 @@ class Course(BaseModel):
     image = models.ImageField(
         upload_to="images", blank=True, default="default.jpg"
     )
+    # the derivatives of ``image`` were generated, see thumbnails.py
+    thumbnails = models.BooleanField(default=False, editable=False)
 
     students = models.ManyToManyField(
         User, related_name="courses_joined", blank=True
     )
 
     class Meta:
-        ordering = ["-created"]
+        ordering = ["-created", "-id"]
+        indexes = [
+            models.Index(
+                fields=["-created", "-id"], name="course_created_id_idx"
+            )
+        ]
 
     def __str__(self):
         return self.title
 
 
+# the values a course can be rated with
+RATING_VALUES = range(0, 6)
+
+
 class Rating(models.Model):
     user = models.ForeignKey(
         User, related_name="user_rating", on_delete=models.CASCADE
@@ -83,20 +178,43 @@ class Rating(models.Model):
     )
     value = models.IntegerField(
         verbose_name="Rating",
-        validators=[MinValueValidator(0), MaxValueValidator(5)],
+        validators=[
+            MinValueValidator(RATING_VALUES[0]),
+            MaxValueValidator(RATING_VALUES[-1]),
+        ],
     )
 
     class Meta:
         unique_together = ("user", "course")
 
 
-class Module(models.Model):
+class OrderedModel(models.Model):
+    """
+    Base for models with an OrderField: the save runs in a transaction so
+    the parent lock taken by the field is held until the row is inserted.
+    """
+
+    objects = OrderedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
+class Module(OrderedModel):
     course = models.ForeignKey(
         Course, related_name="modules", on_delete=models.CASCADE
     )
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     order = OrderField(blank=True, for_fields=["course"])
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["order"]
@@ -105,7 +223,7 @@ class Module(models.Model):
         return "<Module {}. {}>".format(self.order, self.title)
 
 
-class Content(models.Model):
+class Content(OrderedModel):
     module = models.ForeignKey(
         Module, related_name="contents", on_delete=models.CASCADE
     )
@@ -117,11 +235,159 @@ class Content(models.Model):
         limit_choices_to={"model__in": ("text", "video", "image", "file")},
     )
     order = OrderField(blank=True, for_fields=["module"])
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = ContentQuerySet.as_manager()
 
     class Meta:
         ordering = ["order"]
 
 
+class CourseStats(models.Model):
+    """
+    Denormalized counters of a course, kept current by the signal handlers
+    in ``app.courses.signals`` so listing pages don't aggregate live.
+    """
+
+    course = models.OneToOneField(
+        Course,
+        related_name="stats",
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    total_modules = models.PositiveIntegerField(default=0, db_index=True)
+    total_contents = models.PositiveIntegerField(default=0)
+    total_students = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(null=True, blank=True)
+    # number of ratings of each value of RATING_VALUES
+    ratings_0 = models.PositiveIntegerField(default=0)
+    ratings_1 = models.PositiveIntegerField(default=0)
+    ratings_2 = models.PositiveIntegerField(default=0)
+    ratings_3 = models.PositiveIntegerField(default=0)
+    ratings_4 = models.PositiveIntegerField(default=0)
+    ratings_5 = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "<CourseStats {}>".format(self.course_id)
+
+    @property
+    def rating_histogram(self):
+        return [
+            getattr(self, "ratings_{}".format(value))
+            for value in RATING_VALUES
+        ]
+
+    @classmethod
+    def rate(cls, course_id, user_id, value):
+        """
+        Store the rating of a course by a user, replacing their previous
+        one, and apply it to the rating counters in the same transaction.
+        The stats row is locked first, so raters of a course are applied
+        one after another and none of their changes is lost. A course
+        without one gets it, counted from its rows.
+        """
+        with transaction.atomic():
+            stats, created = cls.objects.select_for_update().get_or_create(
+                course_id=course_id
+            )
+            if created:
+                cls.refresh(
+                    course_id, modules=True, students=True, ratings=True
+                )
+                stats.refresh_from_db()
+            ratings = Rating.objects.filter(
+                course_id=course_id, user_id=user_id
+            )
+            previous = ratings.values_list("value", flat=True).first()
+            if previous is None:
+                # bulk_create() skips post_save, which would recount
+                Rating.objects.bulk_create(
+                    [Rating(course_id=course_id, user_id=user_id, value=value)]
+                )
+                stats.rating_count += 1
+            else:
+                ratings.update(value=value)
+                stats.rating_sum -= previous
+                field = "ratings_{}".format(previous)
+                setattr(stats, field, getattr(stats, field) - 1)
+            stats.rating_sum += value
+            field = "ratings_{}".format(value)
+            setattr(stats, field, getattr(stats, field) + 1)
+            stats.rating_average = stats.rating_sum / stats.rating_count
+            stats.save()
+        return stats
+
+    @classmethod
+    def refresh(cls, course_id, modules=False, students=False, ratings=False):
+        """
+        Recount the requested counters of a course with indexed queries
+        scoped to that course and store them in one update.
+        """
+        values = {}
+        if modules:
+            values["total_modules"] = Module.objects.filter(
+                course_id=course_id
+            ).count()
+            values["total_contents"] = Content.objects.filter(
+                module__course_id=course_id
+            ).count()
+        if students:
+            values["total_students"] = Course.students.through.objects.filter(
+                course_id=course_id
+            ).count()
+        if ratings:
+            aggregate = Rating.objects.filter(course_id=course_id).aggregate(
+                rating_sum=Sum("value"), rating_count=Count("id")
+            )
+            values["rating_sum"] = aggregate["rating_sum"] or 0
+            values["rating_count"] = aggregate["rating_count"]
+            values["rating_average"] = (
+                values["rating_sum"] / values["rating_count"]
+                if values["rating_count"]
+                else None
+            )
+            histogram = dict(
+                Rating.objects.filter(course_id=course_id)
+                .values("value")
+                .annotate(count=Count("id"))
+                .order_by()
+                .values_list("value", "count")
+            )
+            for value in RATING_VALUES:
+                values["ratings_{}".format(value)] = histogram.get(value, 0)
+        values["updated"] = timezone.now()
+        # update() rather than save(): the course may be going away as part
+        # of a cascade delete and its stats row must not be recreated.
+        cls.objects.filter(course_id=course_id).update(**values)
+
+
+class SearchTerm(models.Model):
+    """
+    Inverted index of the course search: ``term`` occurs in ``course``
+    with ``weight``. Maintained by ``app.courses.search``.
+    """
+
+    term = models.CharField(max_length=64)
+    course = models.ForeignKey(
+        Course, related_name="search_terms", on_delete=models.CASCADE
+    )
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("term", "course")
+        indexes = [
+            models.Index(
+                fields=["term", "-weight"], name="searchterm_term_weight"
+            )
+        ]
+
+    def __str__(self):
+        return "<SearchTerm {} {}>".format(self.term, self.course_id)
+
+
 class ModuleContentType(models.Model):
     owner = models.ForeignKey(
         User, related_name="%(class)s_related", on_delete=models.CASCADE
@@ -134,9 +400,21 @@ class ModuleContentType(models.Model):
         abstract = True
 
     def render(self):
-        return render_to_string(
-            "course/{}.html".format(self._meta.model_name), {"item": self}
-        )
+        """
+        Render the item with its ``course/<model>.html`` template.
+        The output is cached per (model, pk, updated), so saving the item
+        invalidates its entry.
+        """
+        cache = get_cache("CONTENT_RENDER_CACHE")
+        key = render_cache_key(self)
+        html = cache.get(key)
+        if html is None:
+            html = render_to_string(
+                "course/{}.html".format(self._meta.model_name),
+                {"item": self},
+            )
+            cache.set(key, html, settings.CONTENT_RENDER_CACHE_TIMEOUT)
+        return mark_safe(html)
 
 
 class Text(ModuleContentType):
@@ -149,7 +427,109 @@ class File(ModuleContentType):
 
 class Image(ModuleContentType):
     file = models.ImageField(upload_to="images", default="default.jpg")
+    thumbnails = models.BooleanField(default=False, editable=False)
 
 
 class Video(ModuleContentType):
     url = models.URLField(blank=True)
+
+
+class UploadTask(models.Model):
+    """
+    Transfer of a staged upload to the storage of an item's ``file``,
+    queued by the content form and run by the process_uploads command.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    owner = models.ForeignKey(
+        User, related_name="upload_tasks", on_delete=models.CASCADE
+    )
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    item = GenericForeignKey("content_type", "object_id")
+    staged_name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "updated"], name="uploadtask_status_idx"
+            )
+        ]
+
+    def __str__(self):
+        return "<UploadTask {} {}>".format(self.pk, self.status)
+
+
+class ContentProgress(models.Model):
+    """
+    What a student did with a content: when it was last viewed and when
+    it was completed. Written in batches by ``app.courses.progress``.
+    """
+
+    user = models.ForeignKey(
+        User, related_name="content_progress", on_delete=models.CASCADE
+    )
+    content = models.ForeignKey(
+        Content, related_name="progress", on_delete=models.CASCADE
+    )
+    # the module of the content, kept here to roll progress up per module
+    module = models.ForeignKey(
+        Module, related_name="content_progress", on_delete=models.CASCADE
+    )
+    viewed = models.DateTimeField()
+    completed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("user", "content")
+
+    def __str__(self):
+        return "<ContentProgress {} {}>".format(self.user_id, self.content_id)
+
+
+class ModuleProgress(models.Model):
+    """
+    Contents of a module viewed and completed by a student, one row per
+    student and module so the dashboard reads it without aggregating.
+    """
+
+    user = models.ForeignKey(
+        User, related_name="module_progress", on_delete=models.CASCADE
+    )
+    module = models.ForeignKey(
+        Module, related_name="progress", on_delete=models.CASCADE
+    )
+    course = models.ForeignKey(
+        Course, related_name="module_progress", on_delete=models.CASCADE
+    )
+    viewed = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "module")
+        indexes = [
+            models.Index(
+                fields=["user", "course"], name="moduleprogress_course_idx"
+            )
+        ]
+
+    def __str__(self):
+        return "<ModuleProgress {} {}>".format(self.user_id, self.module_id)
@@ -0,0 +1,42 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(obj):
+    value = "{}|{}".format(obj.created.isoformat(), obj.pk)
+    return urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Return the (created, pk) position of a cursor, ValueError if invalid.
+    """
+    try:
+        created, pk = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        created = parse_datetime(created)
+    except (TypeError, UnicodeError, ValueError) as error:
+        raise ValueError("Invalid cursor") from error
+    if created is None:
+        raise ValueError("Invalid cursor")
+    return created, int(pk)
+
+
+def keyset_page(queryset, cursor, size):
+    """
+    Return a page of ``queryset`` newest first and the cursor of the next
+    page, or None on the last one.
+    Pages are located with a (created, id) comparison instead of an
+    OFFSET, so any page costs the same index range scan however deep it
+    is.
+    """
+    if cursor:
+        created, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created__lt=created) | Q(created=created, pk__lt=pk)
+        )
+    page = list(queryset.order_by("-created", "-pk")[: size + 1])
+    if len(page) > size:
+        return page[:size], encode_cursor(page[size - 1])
+    return page, None
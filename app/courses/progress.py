@@ -0,0 +1,262 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Content, ContentProgress, Module, ModuleProgress
+
+logger = logging.getLogger(__name__)
+
+
+def merge(events, key, module_id, viewed, completed):
+    """
+    Fold an event into ``events``: the last view and the first completion
+    of a (user id, content id) pair are kept.
+    """
+    if key in events:
+        _, last_viewed, first_completed = events[key]
+        viewed = max(viewed, last_viewed)
+        if first_completed and (not completed or first_completed < completed):
+            completed = first_completed
+    events[key] = (module_id, viewed, completed)
+
+
+class ProgressBuffer:
+    """
+    Progress events of this process, coalesced per student and content.
+    Page views don't write: events are kept in memory and written in one
+    batch once PROGRESS_BUFFER_SIZE pairs are pending, when the next event
+    comes PROGRESS_FLUSH_INTERVAL seconds after the last write, and when
+    the process exits.
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.lock = threading.Lock()
+        self.flushed = time.monotonic()
+
+    def __len__(self):
+        return len(self.events)
+
+    def clear(self):
+        with self.lock:
+            self.events = {}
+
+    def record(self, user_id, content_id, module_id, completed=False):
+        now = timezone.now()
+        with self.lock:
+            merge(
+                self.events,
+                (user_id, content_id),
+                module_id,
+                now,
+                now if completed else None,
+            )
+            due = (
+                len(self.events) >= settings.PROGRESS_BUFFER_SIZE
+                or time.monotonic() - self.flushed
+                >= settings.PROGRESS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending events, return how many pairs were written.
+        Events of a failed write are put back for the next flush.
+        """
+        with self.lock:
+            events, self.events = self.events, {}
+            self.flushed = time.monotonic()
+        if not events:
+            return 0
+        try:
+            write_progress(events)
+        except Exception:
+            logger.exception("Could not write %s progress events", len(events))
+            with self.lock:
+                for key, event in events.items():
+                    merge(self.events, key, *event)
+            return 0
+        return len(events)
+
+
+buffer = ProgressBuffer()
+atexit.register(buffer.flush)
+
+
+def record_view(user, module_id):
+    """
+    Buffer a view of the contents of the module by ``user``, counted only
+    for the students enrolled in its course, like completions.
+    """
+    contents = Content.objects.filter(
+        module_id=module_id, module__course__students=user
+    ).values_list("pk", flat=True)
+    for content_id in contents:
+        buffer.record(user.pk, content_id, module_id)
+
+
+def record_completion(user, content):
+    buffer.record(user.pk, content.pk, content.module_id, completed=True)
+
+
+def write_progress(events):
+    """
+    Store ``events``, a dict of (user id, content id) to (module id,
+    viewed, completed), and roll them up per module.
+    Missing rows are inserted in one statement and existing ones updated
+    with one statement per student, each row set to its own times, so
+    the queries follow the students of the batch rather than its events,
+    and each student's rows are only locked by the flush carrying their
+    events. A view never moves ``viewed`` back: a flush put back after a
+    failed write may carry older times than one written since.
+    """
+    contents = set(
+        Content.objects.filter(
+            pk__in={content_id for _, content_id in events}
+        ).values_list("pk", flat=True)
+    )
+    by_user = defaultdict(dict)
+    for (user_id, content_id), event in sorted(events.items()):
+        # contents deleted since the event was recorded are left out
+        if content_id in contents:
+            by_user[user_id][content_id] = event
+    if not by_user:
+        return
+    with transaction.atomic():
+        ContentProgress.objects.bulk_create(
+            [
+                ContentProgress(
+                    user_id=user_id,
+                    content_id=content_id,
+                    module_id=module_id,
+                    viewed=viewed,
+                    completed=completed,
+                )
+                for user_id, user_events in by_user.items()
+                for content_id, (module_id, viewed, completed) in (
+                    user_events.items()
+                )
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        for user_id, user_events in by_user.items():
+            rows = ContentProgress.objects.filter(user_id=user_id)
+            rows.filter(content_id__in=user_events).update(
+                viewed=Greatest(
+                    "viewed",
+                    per_content(
+                        {
+                            content_id: event[1]
+                            for content_id, event in user_events.items()
+                        },
+                        "viewed",
+                    ),
+                )
+            )
+            completed = {
+                content_id: event[2]
+                for content_id, event in user_events.items()
+                if event[2]
+            }
+            if completed:
+                rows.filter(
+                    content_id__in=completed, completed__isnull=True
+                ).update(completed=per_content(completed, "completed"))
+        rollup(
+            {
+                (user_id, event[0])
+                for user_id, user_events in by_user.items()
+                for event in user_events.values()
+            }
+        )
+
+
+def per_content(values, field):
+    """
+    CASE expression giving each row the value of its content id in
+    ``values``, so one UPDATE writes different values per row.
+    """
+    return Case(
+        *[
+            When(content_id=content_id, then=Value(value))
+            for content_id, value in values.items()
+        ],
+        output_field=ContentProgress._meta.get_field(field),
+    )
+
+
+def rollup(pairs):
+    """
+    Recount the ModuleProgress rows of the (user id, module id) ``pairs``.
+    The rows are locked before counting, so of two flushes touching the
+    same student and module the last one counts the rows of both.
+    """
+    users = {user_id for user_id, _ in pairs}
+    modules = dict(
+        Module.objects.filter(
+            pk__in={module_id for _, module_id in pairs}
+        ).values_list("pk", "course_id")
+    )
+    ModuleProgress.objects.bulk_create(
+        [
+            ModuleProgress(
+                user_id=user_id, module_id=module_id, course_id=course_id
+            )
+            for user_id, module_id in sorted(pairs)
+            for course_id in [modules.get(module_id)]
+            if course_id
+        ],
+        ignore_conflicts=True,
+    )
+    rows = [
+        row
+        for row in ModuleProgress.objects.select_for_update()
+        .filter(user_id__in=users, module_id__in=modules)
+        .order_by("user_id", "module_id")
+        if (row.user_id, row.module_id) in pairs
+    ]
+    counts = {
+        (count["user_id"], count["module_id"]): count
+        for count in ContentProgress.objects.filter(
+            user_id__in=users, module_id__in=modules
+        )
+        .values("user_id", "module_id")
+        .annotate(
+            viewed=Count("id"),
+            completed=Count("id", filter=Q(completed__isnull=False)),
+        )
+        .order_by()
+    }
+    now = timezone.now()
+    for row in rows:
+        count = counts.get((row.user_id, row.module_id), {})
+        row.viewed = count.get("viewed", 0)
+        row.completed = count.get("completed", 0)
+        row.updated = now
+    ModuleProgress.objects.bulk_update(
+        rows, ["viewed", "completed", "updated"], batch_size=500
+    )
+
+
+def course_progress(user, course_ids):
+    """
+    Contents completed by ``user`` in each of ``course_ids``, summed from
+    their ModuleProgress rows in one indexed query.
+    """
+    return dict(
+        ModuleProgress.objects.filter(user=user, course_id__in=course_ids)
+        .values("course_id")
+        .annotate(completed=Sum("completed"))
+        .order_by()
+        .values_list("course_id", "completed")
+    )
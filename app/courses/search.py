@@ -0,0 +1,233 @@
+import logging
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, transaction
+
+from .models import (
+    Content,
+    Course,
+    CourseStats,
+    Module,
+    SearchTerm,
+    Text,
+)
+
+logger = logging.getLogger(__name__)
+
+TERM_MAX_LENGTH = SearchTerm._meta.get_field("term").max_length
+
+# weight of one occurrence of a term in each indexed field
+FIELD_WEIGHTS = {
+    "title": 8,
+    "overview": 3,
+    "module_title": 4,
+    "module_description": 2,
+    "text_title": 2,
+    "text_content": 1,
+}
+
+# occurrences counted per field, so long bodies don't drown the title
+MAX_OCCURRENCES = 3
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on "
+    "or that the this to was were will with".split()
+)
+
+WORD_RE = re.compile(r"\w+")
+
+# courses indexed per batch by the workers and rebuild_search_index
+INDEX_BATCH_SIZE = 100
+
+_pending = set()
+_lock = threading.Lock()
+_executor = None
+
+
+def tokenize(value):
+    """
+    Lowercased words of ``value`` without stop words and single letters.
+    """
+    return [
+        word[:TERM_MAX_LENGTH]
+        for word in WORD_RE.findall((value or "").lower())
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+def course_documents(course_ids):
+    """
+    Yield the (course_id, field, text) triples indexed for ``course_ids``,
+    a few queries for the whole batch.
+    """
+    courses = Course.objects.filter(pk__in=course_ids).values_list(
+        "pk", "title", "overview"
+    )
+    for course_id, title, overview in courses:
+        yield course_id, "title", title
+        yield course_id, "overview", overview
+    modules = Module.objects.filter(course_id__in=course_ids).values_list(
+        "course_id", "title", "description"
+    )
+    for course_id, title, description in modules:
+        yield course_id, "module_title", title
+        yield course_id, "module_description", description
+    contents = Content.objects.filter(
+        module__course_id__in=course_ids,
+        content_type=ContentType.objects.get_for_model(Text),
+    )
+    text_courses = defaultdict(list)
+    for text_id, course_id in contents.values_list(
+        "object_id", "module__course_id"
+    ):
+        text_courses[text_id].append(course_id)
+    texts = Text.objects.filter(
+        id__in=contents.values("object_id")
+    ).values_list("id", "title", "content")
+    for text_id, title, content in texts:
+        for course_id in text_courses[text_id]:
+            yield course_id, "text_title", title
+            yield course_id, "text_content", content
+
+
+def index_courses(course_ids):
+    """
+    Replace the index entries of ``course_ids``, dropping those of the
+    courses that are gone.
+    """
+    course_ids = list(course_ids)
+    weights = defaultdict(Counter)
+    for course_id, field, value in course_documents(course_ids):
+        occurrences = Counter(tokenize(value))
+        for term, count in occurrences.items():
+            weights[course_id][term] += FIELD_WEIGHTS[field] * min(
+                count, MAX_OCCURRENCES
+            )
+    with transaction.atomic():
+        SearchTerm.objects.filter(course_id__in=course_ids).delete()
+        SearchTerm.objects.bulk_create(
+            (
+                SearchTerm(term=term, course_id=course_id, weight=weight)
+                for course_id, terms in weights.items()
+                for term, weight in terms.items()
+            ),
+            batch_size=INDEX_BATCH_SIZE,
+        )
+
+
+def index_course(course_id):
+    index_courses([course_id])
+
+
+def _index_pending():
+    """
+    Index the queued courses, a batch at a time, until the queue is empty.
+    """
+    while True:
+        with _lock:
+            course_ids = sorted(_pending)[:INDEX_BATCH_SIZE]
+            _pending.difference_update(course_ids)
+        if not course_ids:
+            return
+        try:
+            index_courses(course_ids)
+        except Exception:
+            logger.exception("Could not index courses %s", course_ids)
+
+
+def _index():
+    close_old_connections()
+    try:
+        _index_pending()
+    finally:
+        close_old_connections()
+
+
+def queue_index(course_ids):
+    """
+    Index ``course_ids`` in the SEARCH_INDEX_WORKERS threads, or right
+    away when there are none. A course saved again before a worker gets
+    to it is indexed once.
+    """
+    if not settings.SEARCH_INDEX_WORKERS:
+        course_ids = sorted(course_ids)
+        for i in range(0, len(course_ids), INDEX_BATCH_SIZE):
+            index_courses(course_ids[i : i + INDEX_BATCH_SIZE])
+        return
+    global _executor
+    with _lock:
+        _pending.update(course_ids)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SEARCH_INDEX_WORKERS,
+                thread_name_prefix="search-index",
+            )
+    _executor.submit(_index)
+
+
+def schedule_index(course_ids):
+    """
+    Queue ``course_ids`` for indexing once the current transaction
+    commits, when the related rows are final and courses deleted in a
+    cascade are gone.
+    """
+    course_ids = set(course_ids)
+    if course_ids:
+        transaction.on_commit(partial(queue_index, course_ids))
+
+
+def top_postings(term, limit):
+    """
+    The course ids and weights of the ``limit`` heaviest postings of
+    ``term``, read from the (term, weight) index.
+    """
+    return dict(
+        SearchTerm.objects.filter(term=term)
+        .order_by("-weight")
+        .values_list("course_id", "weight")[:limit]
+    )
+
+
+def search_courses(query, offset=0, limit=20):
+    """
+    Return the ids of the listed courses containing every term of
+    ``query``, best match first.
+    The score of a course is the sum of the weights of the query terms
+    in it. The candidates are the courses of the rarest query term. A
+    term in more than SEARCH_MAX_CANDIDATES courses only contributes its
+    heaviest postings, so a query reads a bounded number of rows however
+    common its terms are.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    cap = settings.SEARCH_MAX_CANDIDATES
+    postings = {term: top_postings(term, cap) for term in sorted(terms)}
+    rarest = min(postings, key=lambda term: len(postings[term]))
+    scores = postings.pop(rarest)
+    for term, weights in postings.items():
+        if scores and len(weights) >= cap:
+            # truncated, look the candidates up on the (term, course) index
+            weights = dict(
+                SearchTerm.objects.filter(
+                    term=term, course_id__in=scores
+                ).values_list("course_id", "weight")
+            )
+        scores = {
+            course_id: score + weights[course_id]
+            for course_id, score in scores.items()
+            if course_id in weights
+        }
+    listed = CourseStats.objects.filter(
+        course_id__in=scores, total_modules__gt=0
+    ).values_list("course_id", flat=True)
+    ranked = sorted(
+        listed, key=lambda course_id: (-scores[course_id], -course_id)
+    )
+    return ranked[offset : offset + limit]
@@ -0,0 +1,334 @@
+import threading
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_versions, forget_enrollments
+from .managers import post_bulk_create
+from .media import FILE_FIELDS, delete_files, is_referenced, stored_names
+from .models import (
+    Content,
+    Course,
+    CourseStats,
+    File,
+    Image,
+    Module,
+    Rating,
+    Subject,
+    Text,
+    Video,
+)
+from .search import schedule_index
+from .thumbnails import schedule_derivatives
+
+IMAGE_FIELDS = {Course: "image", Image: "file"}
+
+_deleting = threading.local()
+
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, raw, **kwargs):
+    if created:
+        CourseStats.objects.get_or_create(course=instance)
+        if raw:
+            # fixtures may have loaded the related rows first
+            CourseStats.refresh(
+                instance.pk, modules=True, students=True, ratings=True
+            )
+
+
+def refresh_module_stats(course_ids, saved=True):
+    """
+    Recount the modules and contents of ``course_ids``. On saves the stats
+    rows of courses inserted without one are created first, as the
+    catalog only lists courses whose stats count modules.
+    """
+    if saved:
+        CourseStats.objects.bulk_create(
+            [CourseStats(course_id=course_id) for course_id in course_ids],
+            ignore_conflicts=True,
+        )
+    for course_id in course_ids:
+        CourseStats.refresh(course_id, modules=True)
+
+
+def module_course_ids(module):
+    """
+    The course of ``module``, and the one it was moved from by this save.
+    """
+    previous = getattr(module, "_previous_course_id", None)
+    return {module.course_id, previous} - {None}
+
+
+@receiver(pre_save, sender=Module)
+def remember_module_course(sender, instance, raw, **kwargs):
+    instance._previous_course_id = None
+    if instance.pk and not raw:
+        instance._previous_course_id = (
+            Module.objects.filter(pk=instance.pk)
+            .values_list("course_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def update_module_stats(sender, instance, **kwargs):
+    if instance.course_id in deleting(Course):
+        return
+    course_ids = {instance.course_id}
+    if not kwargs.get("created", True):
+        # a module saved again only changes the counts when it moved
+        course_ids = module_course_ids(instance)
+        if len(course_ids) == 1:
+            return
+    refresh_module_stats(course_ids, saved="created" in kwargs)
+
+
+def deleting(model):
+    """
+    The pks of the ``model`` rows whose delete is under way in this
+    thread. Their children are deleted first, each sending its signals,
+    and the counts are refreshed once by the parent instead.
+    """
+    if not hasattr(_deleting, "pks"):
+        _deleting.pks = defaultdict(set)
+    return _deleting.pks[model]
+
+
+@receiver(pre_delete, sender=Course)
+@receiver(pre_delete, sender=Module)
+def remember_deleted_parent(sender, instance, **kwargs):
+    deleting(sender).add(instance.pk)
+
+
+def content_course_ids(content):
+    """
+    The course of ``content``, and the one it was moved from by this save.
+    """
+    module_ids = {
+        content.module_id,
+        getattr(content, "_previous_module_id", None),
+    } - {None}
+    return set(
+        Module.objects.filter(id__in=module_ids).values_list(
+            "course_id", flat=True
+        )
+    )
+
+
+@receiver(pre_save, sender=Content)
+def remember_content_module(sender, instance, raw, **kwargs):
+    instance._previous_module_id = None
+    if instance.pk and not raw:
+        instance._previous_module_id = (
+            Content.objects.filter(pk=instance.pk)
+            .values_list("module_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_delete, sender=Content)
+def update_content_stats(sender, instance, **kwargs):
+    if instance.module_id in deleting(Module):
+        return
+    if not kwargs.get("created", True):
+        # a content saved again only changes the counts when it moved
+        previous = getattr(instance, "_previous_module_id", None)
+        if previous in (None, instance.module_id):
+            return
+    refresh_module_stats(
+        content_course_ids(instance), saved="created" in kwargs
+    )
+
+
+@receiver(post_bulk_create, sender=Module)
+@receiver(post_bulk_create, sender=Content)
+def update_bulk_stats(sender, objs, **kwargs):
+    if sender is Module:
+        course_ids = {module.course_id for module in objs}
+    else:
+        course_ids = set(
+            Module.objects.filter(
+                id__in={content.module_id for content in objs}
+            ).values_list("course_id", flat=True)
+        )
+    refresh_module_stats(course_ids)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def update_rating_stats(sender, instance, **kwargs):
+    CourseStats.refresh(instance.course_id, ratings=True)
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def update_student_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # user.courses_joined.clear() doesn't tell which courses lost the
+        # student once done, remember them beforehand.
+        instance._cleared_course_ids = list(
+            instance.courses_joined.values_list("id", flat=True)
+        )
+    if action == "pre_clear" and not reverse:
+        instance._cleared_student_ids = list(
+            instance.students.values_list("id", flat=True)
+        )
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        course_ids = [instance.pk]
+    elif action == "post_clear":
+        course_ids = getattr(instance, "_cleared_course_ids", [])
+    else:
+        course_ids = pk_set
+    for course_id in course_ids:
+        CourseStats.refresh(course_id, students=True)
+    if reverse:
+        forget_enrollments(instance.pk)
+    elif action == "post_clear":
+        forget_enrollments(*getattr(instance, "_cleared_student_ids", []))
+    else:
+        forget_enrollments(*pk_set)
+
+
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=Image)
+def flag_uploaded_image(sender, instance, raw, **kwargs):
+    field_file = getattr(instance, IMAGE_FIELDS[sender])
+    # the upload is still uncommitted until the field's pre_save runs
+    instance._image_uploaded = (
+        not raw and bool(field_file) and not field_file._committed
+    )
+    if instance._image_uploaded:
+        # the derivatives are those of the previous image until regenerated
+        instance.thumbnails = False
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Image)
+def generate_thumbnails(sender, instance, **kwargs):
+    if getattr(instance, "_image_uploaded", False):
+        field_file = getattr(instance, IMAGE_FIELDS[sender])
+        storage, name = field_file.storage, field_file.name
+        transaction.on_commit(lambda: schedule_derivatives(storage, name))
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, **kwargs):
+    schedule_index([instance.pk])
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def index_module(sender, instance, **kwargs):
+    schedule_index(module_course_ids(instance))
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_delete, sender=Content)
+def index_content(sender, instance, **kwargs):
+    if instance.module_id in deleting(Module):
+        return
+    if instance.content_type_id == ContentType.objects.get_for_model(Text).id:
+        schedule_index(content_course_ids(instance))
+
+
+@receiver(post_save, sender=Text)
+def index_text(sender, instance, **kwargs):
+    schedule_index(
+        Content.objects.filter(
+            content_type=ContentType.objects.get_for_model(Text),
+            object_id=instance.pk,
+        ).values_list("module__course_id", flat=True)
+    )
+
+
+@receiver(post_bulk_create, sender=Module)
+@receiver(post_bulk_create, sender=Content)
+def index_bulk(sender, objs, **kwargs):
+    if sender is Module:
+        schedule_index(module.course_id for module in objs)
+    else:
+        schedule_index(
+            Module.objects.filter(
+                id__in={content.module_id for content in objs}
+            ).values_list("course_id", flat=True)
+        )
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_subject_fragments(sender, instance, **kwargs):
+    bump_versions("catalog", "subjects")
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_fragments(sender, instance, **kwargs):
+    bump_versions("catalog", "course:{}".format(instance.pk))
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def invalidate_module_fragments(sender, instance, **kwargs):
+    bump_versions(
+        "catalog",
+        *[
+            "course:{}".format(course_id)
+            for course_id in module_course_ids(instance)
+        ]
+    )
+
+
+@receiver(post_bulk_create, sender=Module)
+def invalidate_bulk_module_fragments(sender, objs, **kwargs):
+    course_ids = {module.course_id for module in objs}
+    bump_versions(
+        "catalog", *["course:{}".format(course_id) for course_id in course_ids]
+    )
+
+
+@receiver(post_save, sender=Text)
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Image)
+@receiver(post_save, sender=File)
+def touch_contents(sender, instance, created, **kwargs):
+    # module pages are validated on Content.updated, not on their items
+    if not created:
+        Content.objects.filter(
+            content_type=ContentType.objects.get_for_model(sender),
+            object_id=instance.pk,
+        ).update(updated=timezone.now())
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=File)
+def delete_stored_files(sender, instance, **kwargs):
+    names = stored_names(instance)
+    if names:
+        storage = getattr(instance, FILE_FIELDS[sender]).storage
+
+        def delete():
+            if not is_referenced(names[0]):
+                delete_files(storage, names)
+
+        transaction.on_commit(delete)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Module)
+def forget_deleted_parent(sender, instance, **kwargs):
+    deleting(sender).discard(instance.pk)
@@ -0,0 +1,31 @@
+from django import template
+from django.conf import settings
+
+from app.courses.thumbnails import thumbnail_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag("thumbnail.html")
+def thumbnail(field_file, size, alt=""):
+    """
+    Render a <picture> of the ``size`` derivatives of an image, WebP first
+    and JPEG as fallback, or the original until they exist.
+    """
+    return picture(thumbnail_sources(field_file, size), size, alt)
+
+
+@register.inclusion_tag("thumbnail.html")
+def picture(sources, size, alt=""):
+    """
+    Render a <picture> of ``sources`` precomputed by thumbnail_sources().
+    """
+    width, height, crop = settings.THUMBNAIL_SIZES[size]
+    return {
+        "webp": sources["webp"],
+        "src": sources["src"],
+        "alt": alt,
+        "width": width,
+        "height": height,
+        "crop": crop,
+    }
@@ -7,15 +7,19 @@ from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
+from app.courses.progress import buffer as progress_buffer
+
 
 class BaseTestCase(object):
-    fixtures = ["users", "subjects"]
+    fixtures = ["all"]
     current_user = "anonymous"
     current_password = ""
 
     def setUp(self):
         # disable logging
         logging.disable(logging.INFO)
+        cache.clear()
+        progress_buffer.clear()
         self.media_root = tempfile.mkdtemp()
         settings.MEDIA_ROOT = self.media_root
 
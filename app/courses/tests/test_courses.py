@@ -0,0 +1,1601 @@
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.db.models.fields.files import FieldFile
+from django.test import (
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from app.students.enrollment import bulk_enroll
+from utils.content_manager.aws_metadata import ObjectMetadata
+
+from ..models import (
+    Content,
+    Course,
+    CourseStats,
+    File,
+    Image,
+    Module,
+    ModuleProgress,
+    ContentProgress,
+    Rating,
+    SearchTerm,
+    SlugCounter,
+    Subject,
+    Text,
+    UploadTask,
+    Video,
+)
+from ..checks import check_shared_caches
+from ..cache import fragment_key, get_enrolled_course_ids, get_or_build
+from ..media import referenced_among, stored_names
+from ..progress import buffer, course_progress, write_progress
+from .. import search
+from ..search import index_course, search_courses, tokenize
+from ..uploads import process_uploads
+from ..transfer import CourseImporter, export_lines
+from ..thumbnails import (
+    generate_derivatives,
+    record_derivatives,
+    thumbnail_sources,
+    thumbnail_url,
+)
+from .basetestcase import EIPTestCase
+
+
+class ModuleContentListTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.get(pk=13)
+        self.module = Module.objects.create(course=self.course, title="Intro")
+        self.url = reverse(
+            "module_content_list", args=[self.course.id, self.module.id]
+        )
+        self.user_login()
+
+    def add_contents(self, count):
+        for i in range(count):
+            text = Text.objects.create(
+                owner=self.course.owner, title="Text", content="text"
+            )
+            Content.objects.create(module=self.module, item=text)
+            video = Video.objects.create(owner=self.course.owner, title="Vid")
+            Content.objects.create(module=self.module, item=video)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_contents_are_loaded_in_constant_queries(self):
+        self.add_contents(1)
+        few = self.count_queries()
+        self.add_contents(20)
+        many = self.count_queries()
+        self.assertEqual(few, many)
+
+    def test_with_items_resolves_items(self):
+        self.add_contents(2)
+        expected = [
+            content.item
+            for content in Content.objects.filter(module=self.module)
+        ]
+        with self.assertNumQueries(3):
+            contents = Content.objects.filter(module=self.module)
+            items = [content.item for content in contents.with_items()]
+        self.assertEqual(items, expected)
+
+
+class RenderCacheTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.text = Text.objects.create(
+            owner_id=1, title="Text", content="first"
+        )
+
+    def test_render_is_cached(self):
+        html = self.text.render()
+        with mock.patch("app.courses.models.render_to_string") as render:
+            self.assertEqual(self.text.render(), html)
+        render.assert_not_called()
+
+    def test_save_invalidates_render(self):
+        self.assertIn("first", self.text.render())
+        self.text.content = "second"
+        self.text.save()
+        self.assertIn("second", self.text.render())
+
+
+class CourseStatsTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.create(
+            owner_id=1, subject_id=1, title="Stats"
+        )
+
+    def stats(self):
+        return CourseStats.objects.get(course=self.course)
+
+    def test_stats_follow_modules_contents_students_and_ratings(self):
+        self.assertEqual(self.stats().total_modules, 0)
+        module = Module.objects.create(course=self.course, title="One")
+        text = Text.objects.create(owner_id=1, title="Text", content="text")
+        content = Content.objects.create(module=module, item=text)
+        self.course.students.add(1, 2)
+        Rating.objects.create(user_id=1, course=self.course, value=4)
+        Rating.objects.create(user_id=2, course=self.course, value=1)
+
+        stats = self.stats()
+        self.assertEqual(stats.total_modules, 1)
+        self.assertEqual(stats.total_contents, 1)
+        self.assertEqual(stats.total_students, 2)
+        self.assertEqual(stats.rating_sum, 5)
+        self.assertEqual(stats.rating_count, 2)
+        self.assertEqual(stats.rating_average, 2.5)
+
+        content.delete()
+        self.course.students.remove(2)
+        self.assertEqual(self.stats().total_contents, 0)
+        self.assertEqual(self.stats().total_students, 1)
+        module.delete()
+        self.assertEqual(self.stats().total_modules, 0)
+        self.course.delete()
+        self.assertFalse(CourseStats.objects.filter(course_id=stats.pk))
+
+    def test_moved_module_updates_both_courses(self):
+        other = CourseStats.objects.get(course_id=13)
+        module = Module.objects.create(course=self.course, title="One")
+        text = Text.objects.create(owner_id=1, title="Text", content="text")
+        Content.objects.create(module=module, item=text)
+        module.course_id = 13
+        module.save()
+        self.assertEqual(
+            (self.stats().total_modules, self.stats().total_contents), (0, 0)
+        )
+        stats = CourseStats.objects.get(course_id=13)
+        self.assertEqual(stats.total_modules, other.total_modules + 1)
+        self.assertEqual(stats.total_contents, other.total_contents + 1)
+
+    def test_moved_content_updates_both_courses(self):
+        other = CourseStats.objects.get(course_id=13)
+        module = Module.objects.create(course=self.course, title="One")
+        text = Text.objects.create(owner_id=1, title="Text", content="text")
+        content = Content.objects.create(module=module, item=text)
+        content.module = Module.objects.filter(course_id=13).first()
+        content.save()
+        self.assertEqual(self.stats().total_contents, 0)
+        self.assertEqual(
+            CourseStats.objects.get(course_id=13).total_contents,
+            other.total_contents + 1,
+        )
+
+    def test_deleting_a_module_counts_once(self):
+        module = Module.objects.create(course=self.course, title="One")
+        for i in range(3):
+            text = Text.objects.create(owner_id=1, title="Text", content="x")
+            Content.objects.create(module=module, item=text)
+        with mock.patch("app.courses.signals.refresh_module_stats") as refresh:
+            module.delete()
+        refresh.assert_called_once_with({self.course.pk}, saved=False)
+        with mock.patch("app.courses.signals.refresh_module_stats") as refresh:
+            Course.objects.get(pk=13).delete()
+        refresh.assert_not_called()
+
+    def test_module_gives_course_missing_stats(self):
+        CourseStats.objects.filter(course=self.course).delete()
+        Module.objects.create(course=self.course, title="One")
+        self.assertEqual(self.stats().total_modules, 1)
+        response = self.client.get(reverse("student_courses_list"))
+        self.assertContains(response, "Stats")
+
+    def test_rating_again_replaces_the_previous_rating(self):
+        self.user_login()
+        url = reverse("course_rating", args=[12])
+        self.client.post(url, {"points": 4})
+        self.client.post(url, {"points": 2})
+        CourseStats.rate(12, 2, 5)
+        stats = CourseStats.objects.get(course_id=12)
+        self.assertEqual(Rating.objects.filter(course_id=12).count(), 2)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (7, 2))
+        self.assertEqual(stats.rating_average, 3.5)
+        self.assertEqual(stats.rating_histogram, [0, 0, 1, 0, 0, 1])
+        CourseStats.refresh(12, ratings=True)
+        self.assertEqual(
+            CourseStats.objects.get(course_id=12).rating_histogram,
+            stats.rating_histogram,
+        )
+        self.assertEqual(self.client.post(url, {"points": 6}).status_code, 400)
+
+    def test_rating_creates_missing_stats(self):
+        Rating.objects.create(course_id=12, user_id=2, value=2)
+        CourseStats.objects.filter(course_id=12).delete()
+        stats = CourseStats.rate(12, 1, 4)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (6, 2))
+        self.assertEqual(stats.total_modules, 1)
+        self.assertEqual(CourseStats.objects.get(course_id=12), stats)
+
+    def test_pages_read_ratings_from_stats(self):
+        self.user_login()
+        CourseStats.rate(12, 1, 3)
+        CourseStats.rate(12, 2, 4)
+        response = self.client.get(
+            reverse("module_content_list", args=[12, 4])
+        )
+        self.assertEqual(response.context["rating"], 3.5)
+        self.assertEqual(response.context["user_rating"], 3)
+        course = Course.objects.get(pk=12)
+        response = self.client.get(
+            reverse("student_course_detail", args=[course.slug])
+        )
+        self.assertEqual(response.context["rating"], 3.5)
+        self.assertEqual(response.context["user_rating"], 3)
+
+    def test_fixture_courses_have_stats(self):
+        self.assertEqual(
+            CourseStats.objects.get(course_id=12).total_modules, 1
+        )
+        self.assertEqual(
+            CourseStats.objects.get(course_id=13).total_modules, 2
+        )
+
+    def test_catalog_lists_courses_with_modules(self):
+        Module.objects.create(course=self.course, title="One")
+        response = self.client.get(reverse("student_courses_list"))
+        self.assertEqual(
+            {course.id for course in response.context["courses"]},
+            {12, 13, self.course.id},
+        )
+
+
+class SlugTestCase(EIPTestCase):
+    def create_course(self, title):
+        return Course.objects.create(owner_id=1, subject_id=1, title=title)
+
+    def test_same_title_gets_next_suffix(self):
+        # "simon-says-1" .. "simon-says-4" come from the fixture
+        slugs = [self.create_course("Simon says").slug for i in range(3)]
+        self.assertEqual(
+            slugs, ["simon-says-5", "simon-says-6", "simon-says-7"]
+        )
+
+    def count_create_queries(self, title):
+        with CaptureQueriesContext(connection) as queries:
+            course = self.create_course(title)
+        return course, len(queries)
+
+    def test_slug_allocation_runs_in_constant_queries(self):
+        self.create_course("Popular")
+        course, few = self.count_create_queries("Popular")
+        for i in range(20):
+            self.create_course("Popular")
+        course, many = self.count_create_queries("Popular")
+        self.assertEqual(course.slug, "popular-22")
+        self.assertEqual(few, many)
+
+    def test_slug_only_changes_with_title(self):
+        course = self.create_course("Edited")
+        course.overview = "new overview"
+        course.save()
+        self.assertEqual(Course.objects.get(pk=course.pk).slug, "edited")
+        course = Course.objects.get(pk=course.pk)
+        course.title = "Renamed"
+        course.save()
+        self.assertEqual(course.slug, "renamed")
+
+    def test_numbered_base_does_not_collide(self):
+        slugs = [self.create_course("Python").slug for i in range(4)]
+        self.assertEqual(slugs[3], "python-3")
+        self.assertEqual(self.create_course("Python 3").slug, "python-3-1")
+
+    def test_reserve_slugs(self):
+        self.assertEqual(
+            Course.reserve_slugs("Bulk", 3), ["bulk", "bulk-1", "bulk-2"]
+        )
+        self.assertEqual(
+            SlugCounter.objects.get(model="courses.course", slug="bulk").last,
+            2,
+        )
+
+
+class OrderTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.create(
+            owner_id=1, subject_id=1, title="Ordered"
+        )
+
+    def test_save_assigns_next_order(self):
+        first = Module.objects.create(course=self.course, title="One")
+        second = Module.objects.create(course=self.course, title="Two")
+        self.assertEqual((first.order, second.order), (0, 1))
+
+    def test_bulk_create_assigns_consecutive_orders(self):
+        Module.objects.create(course=self.course, title="One")
+        other = Course.objects.get(pk=13)
+        modules = Module.objects.bulk_create(
+            [
+                Module(course=self.course, title="Two"),
+                Module(course=other, title="Three"),
+                Module(course=self.course, title="Four"),
+            ]
+        )
+        self.assertEqual([module.order for module in modules], [1, 2, 2])
+        self.assertEqual(
+            CourseStats.objects.get(course=self.course).total_modules, 3
+        )
+
+    def test_reorder_in_one_update(self):
+        Module.objects.bulk_create(
+            [Module(course=self.course, title=str(i)) for i in range(3)]
+        )
+        pks = list(
+            Module.objects.filter(course=self.course).values_list(
+                "pk", flat=True
+            )
+        )
+        self.user_login()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("course_module_order", args=[self.course.id]),
+                json.dumps(pks[::-1]),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len([q for q in queries if q["sql"].startswith("UPDATE")]), 1
+        )
+        self.assertEqual(
+            list(
+                Module.objects.filter(course=self.course).values_list(
+                    "pk", flat=True
+                )
+            ),
+            pks[::-1],
+        )
+
+    def test_reorder_rejects_foreign_ids(self):
+        self.user_login()
+        response = self.client.post(
+            reverse("course_module_order", args=[self.course.id]),
+            json.dumps([2]),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_reorder_contents(self):
+        self.user_login()
+        response = self.client.post(
+            reverse("module_content_order", args=[4]),
+            json.dumps([2, 1]),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(
+                Content.objects.filter(module_id=4).values_list(
+                    "pk", flat=True
+                )
+            ),
+            [2, 1],
+        )
+
+    def test_reorder_requires_every_child_once(self):
+        modules = [
+            Module.objects.create(course=self.course, title=str(i))
+            for i in range(3)
+        ]
+        pks = [module.pk for module in modules]
+        self.user_login()
+        url = reverse("course_module_order", args=[self.course.id])
+        for body in (
+            pks[:2][::-1],
+            pks + [pks[0]],
+            [pks[2], pks[1], pks[1]],
+            {str(pk): pk for pk in pks},
+        ):
+            response = self.client.post(
+                url, json.dumps(body), content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            list(
+                Module.objects.filter(course=self.course).values_list(
+                    "order", flat=True
+                )
+            ),
+            [0, 1, 2],
+        )
+
+
+class ThumbnailTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = FileSystemStorage(location=self.media_root)
+        output = BytesIO()
+        PILImage.new("RGB", (1200, 900), "blue").save(output, "PNG")
+        self.name = self.storage.save(
+            "images/photo.png", ContentFile(output.getvalue())
+        )
+
+    def test_derivatives_are_generated_for_each_size(self):
+        generate_derivatives(self.storage, self.name)
+        with self.storage.open("images/thumbs/photo.png-card.webp") as card:
+            self.assertEqual(PILImage.open(card).size, (400, 100))
+        with self.storage.open(
+            "images/thumbs/photo.png-content.jpg"
+        ) as content:
+            self.assertEqual(PILImage.open(content).size, (800, 600))
+
+    def test_thumbnail_falls_back_to_original(self):
+        Course.objects.filter(pk=12).update(image=self.name)
+        course = Course.objects.get(pk=12)
+        self.assertEqual(
+            thumbnail_url(course.image, "card"), "/media/images/photo.png"
+        )
+        generate_derivatives(self.storage, self.name)
+        record_derivatives(self.name)
+        course.refresh_from_db()
+        with mock.patch.object(FileSystemStorage, "exists") as exists:
+            sources = thumbnail_sources(course.image, "card")
+        exists.assert_not_called()
+        self.assertEqual(
+            sources,
+            {
+                "webp": "/media/images/thumbs/photo.png-card.webp",
+                "src": "/media/images/thumbs/photo.png-card.jpg",
+            },
+        )
+
+    def test_new_image_waits_for_its_derivatives(self):
+        Course.objects.filter(pk=12).update(thumbnails=True)
+        course = Course.objects.get(pk=12)
+        with self.settings(MEDIA_ROOT=self.media_root):
+            course.image = SimpleUploadedFile(
+                "new.png", self.storage.open(self.name).read()
+            )
+            course.save()
+        course.refresh_from_db()
+        self.assertFalse(course.thumbnails)
+
+
+@override_settings(COURSES_PER_PAGE=5)
+class CatalogPaginationTestCase(EIPTestCase):
+    def create_courses(self, count):
+        for i in range(count):
+            course = Course.objects.create(
+                owner_id=1, subject_id=1, title="Course"
+            )
+            Module.objects.create(course=course, title="Module")
+
+    def get_page(self, cursor=None):
+        url = reverse("student_courses_list")
+        if cursor:
+            url += "?after=" + cursor
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.context, len(queries)
+
+    def test_pages_walk_the_catalog_in_constant_queries(self):
+        self.create_courses(10)
+        expected = list(
+            Course.objects.filter(stats__total_modules__gt=0).values_list(
+                "pk", flat=True
+            )
+        )
+        seen, cursor, query_counts = [], None, set()
+        while True:
+            context, queries = self.get_page(cursor)
+            seen += [course.pk for course in context["courses"]]
+            query_counts.add(queries)
+            cursor = context["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(query_counts), 1)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse("student_courses_list") + "?after=nope"
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COURSES_PER_PAGE=1)
+class SearchTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.python = Course.objects.create(
+            owner_id=1, subject_id=1, title="Python basics"
+        )
+        module = Module.objects.create(
+            course=self.python, title="Loops", description="for and while"
+        )
+        text = Text.objects.create(
+            owner_id=1, title="Notes", content="Generators in python"
+        )
+        Content.objects.create(module=module, item=text)
+        self.django = Course.objects.create(
+            owner_id=1, subject_id=1, title="Django", overview="Python web"
+        )
+        Module.objects.create(course=self.django, title="Views")
+        for course in Course.objects.all():
+            index_course(course.pk)
+
+    def search(self, query, page=1):
+        response = self.client.get(
+            reverse("student_course_search"), {"q": query, "page": page}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_migration_fills_the_index(self):
+        fill = import_module(
+            "app.courses.migrations.0024_fill_search_terms"
+        ).fill_search_terms
+        indexed = set(
+            SearchTerm.objects.values_list("course", "term", "weight")
+        )
+        SearchTerm.objects.all().delete()
+        fill(django_apps, None)
+        self.assertEqual(
+            set(SearchTerm.objects.values_list("course", "term", "weight")),
+            indexed,
+        )
+
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize("The Python-3 way, a guide"),
+            ["python", "way", "guide"],
+        )
+
+    def test_title_ranks_above_overview(self):
+        self.assertEqual(
+            search_courses("python"), [self.python.pk, self.django.pk]
+        )
+
+    def test_every_term_must_match(self):
+        self.assertEqual(search_courses("python generators"), [self.python.pk])
+        self.assertEqual(search_courses("loops views"), [])
+        self.assertEqual(search_courses("the"), [])
+
+    def test_results_are_paginated(self):
+        first = self.search("says")
+        self.assertEqual(len(first["courses"]), 1)
+        self.assertTrue(first["has_next"])
+        second = self.search("says", page=2)
+        self.assertEqual(len(second["courses"]), 1)
+        self.assertFalse(second["has_next"])
+        self.assertNotEqual(first["courses"], second["courses"])
+
+    def test_candidates_are_bounded(self):
+        with override_settings(SEARCH_MAX_CANDIDATES=1):
+            self.assertEqual(search_courses("python"), [self.python.pk])
+
+    @override_settings(SEARCH_INDEX_WORKERS=0)
+    @mock.patch(
+        "app.courses.search.transaction.on_commit", lambda func: func()
+    )
+    def test_index_follows_saves(self):
+        course = Course.objects.get(pk=13)
+        self.assertEqual(search_courses("ojspdmi"), [course.pk])
+        module = Module.objects.create(course=course, title="Recursion")
+        self.assertEqual(search_courses("recursion"), [course.pk])
+        text = Text.objects.create(owner_id=1, title="Notes", content="x")
+        Content.objects.create(module=module, item=text)
+        text.content = "memoization"
+        text.save()
+        self.assertEqual(search_courses("memoization"), [course.pk])
+        module.delete()
+        self.assertEqual(search_courses("recursion"), [])
+
+    def test_deleted_course_leaves_the_index(self):
+        course_id = self.python.pk
+        self.python.delete()
+        index_course(course_id)
+        self.assertFalse(SearchTerm.objects.filter(course_id=course_id))
+
+    @override_settings(SEARCH_INDEX_WORKERS=1)
+    def test_queued_courses_are_indexed_once(self):
+        with mock.patch.object(search, "_executor") as executor, mock.patch(
+            "app.courses.search.index_courses"
+        ) as index:
+            search.queue_index([2, 1])
+            search.queue_index([2])
+            self.assertEqual(executor.submit.call_count, 2)
+            search._index_pending()
+            search._index_pending()
+        index.assert_called_once_with([1, 2])
+
+
+class SharedCacheCheckTestCase(EIPTestCase):
+    def test_deploy_check_requires_shared_caches(self):
+        self.assertEqual(
+            {error.id for error in check_shared_caches(None)},
+            {"courses.E001"},
+        )
+        database_cache = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "cache",
+            }
+        }
+        with self.settings(CACHES=database_cache):
+            self.assertEqual(check_shared_caches(None), [])
+
+
+class FragmentCacheTestCase(EIPTestCase):
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode(), len(queries)
+
+    def test_catalog_is_cached_until_a_module_changes(self):
+        url = reverse("student_courses_list")
+        course = Course.objects.create(
+            owner_id=1, subject_id=1, title="Fresh course"
+        )
+        html, cold = self.get(url)
+        self.assertNotIn("Fresh course", html)
+        cached, warm = self.get(url)
+        self.assertEqual(cached, html)
+        self.assertLess(warm, cold)
+        Module.objects.create(course=course, title="Intro")
+        html, queries = self.get(url)
+        self.assertIn("Fresh course", html)
+
+    def test_catalog_navigation_is_not_cached(self):
+        url = reverse("student_courses_list")
+        self.get(url)
+        # update() sends no signal, the cached course list stays
+        Subject.objects.filter(pk=1).update(title="Unsignalled subject")
+        html, queries = self.get(url)
+        self.assertIn("Unsignalled subject", html)
+
+    def test_subject_change_invalidates_course_detail(self):
+        course = Course.objects.get(pk=13)
+        url = reverse("student_course_detail", args=[course.slug])
+        self.assertIn(course.subject.title, self.get(url)[0])
+        course.subject.title = "Renamed subject"
+        course.subject.save()
+        self.assertIn("Renamed subject", self.get(url)[0])
+
+    def test_enrollment_is_not_cached(self):
+        course = Course.objects.get(pk=13)
+        url = reverse("student_course_detail", args=[course.slug])
+        course.students.remove(1)
+        self.assertIn("Register to enroll", self.get(url)[0])
+        self.user_login()
+        self.assertIn('value="Enroll"', self.get(url)[0])
+        course.students.add(1)
+        self.assertIn("Continue With Course", self.get(url)[0])
+
+    def test_only_lock_holder_builds(self):
+        key = fragment_key("test", 1)
+        cache.add(key + ":lock", 1)
+        build = mock.Mock(return_value="built")
+
+        def other_worker_finishes(seconds):
+            cache.set(key, "cached")
+
+        with mock.patch(
+            "app.courses.cache.time.sleep", side_effect=other_worker_finishes
+        ):
+            self.assertEqual(get_or_build(key, build), "cached")
+        build.assert_not_called()
+        cache.delete(key)
+        self.assertEqual(get_or_build("free", build), "built")
+
+
+class ConditionalGetTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.get(pk=12)
+        self.user_login()
+
+    def assertRevalidates(self, url, change):
+        # the first page sets the CSRF cookie its forms are valid with
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        with self.assertTemplateNotUsed("base.html"):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_course_detail(self):
+        def edit_overview():
+            self.course.overview = "Changed"
+            self.course.save()
+
+        self.assertRevalidates(
+            reverse("student_course_detail", args=[self.course.slug]),
+            edit_overview,
+        )
+
+    def test_catalog(self):
+        def add_module():
+            course = Course.objects.create(
+                owner_id=1, subject_id=1, title="New"
+            )
+            Module.objects.create(course=course, title="Intro")
+
+        self.assertRevalidates(reverse("student_courses_list"), add_module)
+
+    def test_module_contents(self):
+        text = Text.objects.get(pk=9)
+
+        def edit_text():
+            text.content = "changed"
+            text.save()
+
+        self.assertRevalidates(
+            reverse("module_content_list", args=[self.course.pk, 4]),
+            edit_text,
+        )
+
+    def test_not_modified_module_records_views(self):
+        self.course.students.add(1)
+        url = reverse("module_content_list", args=[self.course.pk, 4])
+        self.client.get(url)
+        etag = self.client.get(url)["ETag"]
+        buffer.clear()
+        # session, user, the validators in one query and the contents of
+        # the module when enrolled
+        with self.assertNumQueries(4):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(buffer), 2)
+
+    def test_validators_depend_on_user(self):
+        url = reverse("student_course_detail", args=[self.course.slug])
+        self.client.get(url)
+        etag = self.client.get(url)["ETag"]
+        self.user_logout()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class AsyncUploadTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staging_dir = os.path.join(self.media_root, "staging")
+        settings = self.settings(
+            CONTENT_ASYNC_UPLOADS=True,
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_STAGING_DIR=self.staging_dir,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user_login()
+
+    def upload(self, **extra):
+        return self.client.post(
+            reverse("module_content_create", args=[4, "file"]),
+            {
+                "title": "Notes",
+                "file": SimpleUploadedFile("notes.txt", b"course notes"),
+            },
+            **extra
+        )
+
+    def test_upload_completes_in_the_worker(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 302)
+        item = File.objects.get(title="Notes")
+        self.assertFalse(item.file)
+        task = UploadTask.objects.get(object_id=item.pk)
+        self.assertEqual(task.status, UploadTask.PENDING)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.staging_dir, task.staged_name))
+        )
+        response = self.client.get(
+            reverse("module_content_list", args=[12, 4])
+        )
+        self.assertContains(response, "The file is being uploaded.")
+
+        self.assertEqual(process_uploads(), 1)
+        task.refresh_from_db()
+        item.refresh_from_db()
+        self.assertEqual(task.status, UploadTask.DONE)
+        self.assertEqual(item.file.name, "files/notes.txt")
+        with item.file.open("rb") as uploaded:
+            self.assertEqual(uploaded.read(), b"course notes")
+        self.assertFalse(os.listdir(self.staging_dir))
+        self.assertEqual(process_uploads(), 0)
+
+    def test_status_polling(self):
+        response = self.upload(HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+        self.assertEqual(
+            self.client.get(status_url).json()["status"], "pending"
+        )
+        process_uploads()
+        self.assertEqual(self.client.get(status_url).json()["status"], "done")
+        self.user_logout()
+        get_user_model().objects.create_user("other", password="secret")
+        self.user_login("other", "secret")
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+    def test_failed_upload_is_retried_then_given_up(self):
+        self.upload()
+        task = UploadTask.objects.get()
+        os.remove(os.path.join(self.staging_dir, task.staged_name))
+        for attempt in range(3):
+            self.assertEqual(process_uploads(), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, UploadTask.FAILED)
+        self.assertEqual(task.attempts, 3)
+        self.assertEqual(process_uploads(), 0)
+
+    def test_tasks_are_claimed_as_they_start(self):
+        self.upload()
+        self.upload()
+        statuses = []
+
+        def run(task):
+            statuses.append(
+                list(
+                    UploadTask.objects.order_by("pk").values_list(
+                        "status", flat=True
+                    )
+                )
+            )
+            UploadTask.objects.filter(pk=task.pk).update(
+                status=UploadTask.DONE
+            )
+
+        with mock.patch("app.courses.uploads.run_task", side_effect=run):
+            self.assertEqual(process_uploads(limit=2), 2)
+        self.assertEqual(
+            statuses,
+            [
+                [UploadTask.RUNNING, UploadTask.PENDING],
+                [UploadTask.DONE, UploadTask.RUNNING],
+            ],
+        )
+
+    def test_stale_task_out_of_attempts_fails(self):
+        self.upload()
+        task = UploadTask.objects.get()
+        UploadTask.objects.filter(pk=task.pk).update(
+            status=UploadTask.RUNNING,
+            attempts=3,
+            updated=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(process_uploads(), 0)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (UploadTask.FAILED, 3))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.staging_dir, task.staged_name))
+        )
+
+
+class DirectUploadTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = mock.Mock(upload_expire=3600)
+        self.storage.generate_filename = FileSystemStorage().generate_filename
+        self.storage.presigned_post.return_value = {
+            "url": "https://bucket.s3.amazonaws.com/",
+            "fields": {},
+        }
+        self.storage.create_multipart_upload.return_value = "upload"
+        self.storage.presigned_part_urls.return_value = ["u1", "u2"]
+        self.storage.refresh_metadata.return_value = ObjectMetadata(True, 5)
+        field = File._meta.get_field("file")
+        patcher = mock.patch.object(field, "storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_login()
+
+    def post(self, name, data):
+        return self.client.post(
+            reverse(name, args=[4, "file"]),
+            json.dumps(data),
+            content_type="application/json",
+        )
+
+    def test_presigned_post_then_complete(self):
+        response = self.post(
+            "module_content_direct_upload", {"filename": "../notes.pdf"}
+        )
+        self.assertEqual(response.status_code, 200)
+        name = self.storage.presigned_post.call_args[0][0]
+        self.assertRegex(name, r"^files/[0-9a-f]{32}/notes.pdf$")
+        response = self.post(
+            "module_content_direct_upload_complete",
+            {"token": response.json()["token"], "title": "Notes"},
+        )
+        self.assertEqual(response.status_code, 201)
+        item = File.objects.get(pk=response.json()["item"])
+        self.assertEqual((item.title, item.file.name), ("Notes", name))
+        self.assertTrue(
+            Content.objects.filter(module_id=4, object_id=item.pk).exists()
+        )
+
+    def test_multipart_upload(self):
+        response = self.post(
+            "module_content_direct_upload",
+            {"filename": "video.mp4", "parts": 2},
+        )
+        self.assertEqual(response.json()["part_urls"], ["u1", "u2"])
+        parts = [
+            {"PartNumber": 2, "ETag": "e2"},
+            {"PartNumber": 1, "ETag": "e1"},
+        ]
+        response = self.post(
+            "module_content_direct_upload_complete",
+            {"token": response.json()["token"], "parts": parts},
+        )
+        self.assertEqual(response.status_code, 201)
+        name, upload_id, received = (
+            self.storage.complete_multipart_upload.call_args[0]
+        )
+        self.assertEqual(upload_id, "upload")
+        self.assertEqual(received, [(2, "e2"), (1, "e1")])
+
+    def test_token_is_bound_to_the_module(self):
+        response = self.post(
+            "module_content_direct_upload", {"filename": "notes.pdf"}
+        )
+        response = self.client.post(
+            reverse("module_content_direct_upload_complete", args=[2, "file"]),
+            json.dumps({"token": response.json()["token"]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(File.objects.exists())
+
+    def test_missing_object_is_rejected(self):
+        self.storage.refresh_metadata.return_value = ObjectMetadata(False, 0)
+        response = self.post(
+            "module_content_direct_upload", {"filename": "notes.pdf"}
+        )
+        response = self.post(
+            "module_content_direct_upload_complete",
+            {"token": response.json()["token"]},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_token_completes_a_single_item(self):
+        response = self.post(
+            "module_content_direct_upload", {"filename": "notes.pdf"}
+        )
+        token = response.json()["token"]
+        for status in (201, 400):
+            response = self.post(
+                "module_content_direct_upload_complete", {"token": token}
+            )
+            self.assertEqual(response.status_code, status)
+        self.assertEqual(File.objects.count(), 1)
+
+    def test_oversized_multipart_upload_is_deleted(self):
+        response = self.post(
+            "module_content_direct_upload",
+            {"filename": "video.mp4", "parts": 2},
+        )
+        self.storage.refresh_metadata.return_value = ObjectMetadata(True, 11)
+        with self.settings(DIRECT_UPLOAD_MAX_SIZE=10):
+            response = self.post(
+                "module_content_direct_upload_complete",
+                {
+                    "token": response.json()["token"],
+                    "parts": [{"PartNumber": 1, "ETag": "e1"}],
+                },
+            )
+        self.assertEqual(response.status_code, 400)
+        self.storage.delete.assert_called_once()
+        self.assertFalse(File.objects.exists())
+
+    def test_failed_multipart_completion_is_a_bad_request(self):
+        response = self.post(
+            "module_content_direct_upload",
+            {"filename": "video.mp4", "parts": 2},
+        )
+        self.storage.complete_multipart_upload.side_effect = ClientError(
+            {"Error": {"Code": "InvalidPart"}}, "CompleteMultipartUpload"
+        )
+        response = self.post(
+            "module_content_direct_upload_complete",
+            {
+                "token": response.json()["token"],
+                "parts": [{"PartNumber": 1, "ETag": "e1"}],
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_requests_are_rejected(self):
+        response = self.post("module_content_direct_upload", ["notes.pdf"])
+        self.assertEqual(response.status_code, 400)
+        response = self.post(
+            "module_content_direct_upload",
+            {"filename": "page.html", "content_type": "text/html"},
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.post(
+            "module_content_direct_upload", {"filename": "page.html"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.storage.presigned_post.assert_not_called()
+
+
+class MediaCleanupTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        settings = self.settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = Image._meta.get_field("file").storage
+
+    def create_image(self, name="photo.png"):
+        output = BytesIO()
+        PILImage.new("RGB", (10, 10)).save(output, "PNG")
+        image = Image(owner_id=1, title="Photo")
+        image.file.save(name, ContentFile(output.getvalue()), save=False)
+        image.save()
+        generate_derivatives(self.storage, image.file.name)
+        return image
+
+    @mock.patch(
+        "app.courses.signals.transaction.on_commit", lambda func: func()
+    )
+    def test_deleting_an_item_deletes_its_files(self):
+        image = self.create_image()
+        kept = Image.objects.create(owner_id=1, title="Same", file="x.png")
+        kept.file.name = image.file.name
+        kept.save()
+        image.delete()
+        self.assertTrue(self.storage.exists("images/photo.png"))
+        kept.delete()
+        self.assertFalse(self.storage.exists("images/photo.png"))
+        self.assertFalse(
+            self.storage.exists("images/thumbs/photo.png-card.webp")
+        )
+
+    @mock.patch(
+        "app.courses.signals.transaction.on_commit", lambda func: func()
+    )
+    def test_images_of_the_same_stem_keep_their_thumbnails(self):
+        png = self.create_image("photo.png")
+        jpg = self.create_image("photo.jpg")
+        self.assertFalse(set(stored_names(png)) & set(stored_names(jpg)))
+        png.delete()
+        for name in stored_names(jpg):
+            self.assertTrue(self.storage.exists(name))
+
+    def test_listed_names_are_checked_against_the_database(self):
+        image = self.create_image()
+        names = stored_names(image)
+        orphans = [
+            "images/thumbs/other.png-card.webp",
+            "images/thumbs/photo.png-unknown.webp",
+            "images/other.png",
+        ]
+        with self.assertNumQueries(5):
+            referenced = referenced_among(names + orphans)
+        self.assertEqual(referenced, set(names))
+
+    def test_gc_deletes_old_orphans_and_resumes(self):
+        old = timezone.now() - timedelta(days=2)
+        listing = [
+            ("files/a.pdf", 1, old),
+            ("files/b.pdf", 1, old),
+            ("files/kept.pdf", 1, old),
+            ("files/new.pdf", 1, timezone.now()),
+        ]
+        File.objects.create(owner_id=1, title="Kept", file="files/kept.pdf")
+        storage = mock.Mock()
+        storage.iter_objects.side_effect = lambda prefix, start_after: [
+            entry
+            for entry in listing
+            if entry[0].startswith(prefix)
+            and (start_after is None or entry[0] > start_after)
+        ]
+        storage.delete_many.side_effect = [[], OSError("interrupted"), []]
+        checkpoint = os.path.join(self.media_root, "gc.json")
+        command = ["gc_media", "--batch=1", "--checkpoint", checkpoint]
+        with mock.patch.object(
+            File._meta.get_field("file"), "storage", storage
+        ):
+            with self.assertRaises(OSError):
+                call_command(*command, stdout=StringIO())
+            call_command(*command, stdout=StringIO())
+        deleted = [call[0][0] for call in storage.delete_many.call_args_list]
+        self.assertEqual(
+            deleted, [["files/a.pdf"], ["files/b.pdf"], ["files/b.pdf"]]
+        )
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+class ProgressTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.get(pk=12)
+        self.course.students.add(1)
+        self.user_login()
+
+    def test_views_and_completions_are_written_in_batches(self):
+        self.client.get(reverse("module_content_list", args=[12, 4]))
+        self.assertEqual(len(buffer), 2)
+        self.assertFalse(ContentProgress.objects.exists())
+        self.assertEqual(buffer.flush(), 2)
+        progress = ModuleProgress.objects.get(user_id=1, module_id=4)
+        self.assertEqual((progress.viewed, progress.completed), (2, 0))
+
+        url = reverse("module_content_complete", args=[4, 1])
+        response = self.client.post(
+            url, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        self.assertEqual(response.status_code, 202)
+        buffer.flush()
+        progress.refresh_from_db()
+        self.assertEqual((progress.viewed, progress.completed), (2, 1))
+        self.assertIsNotNone(
+            ContentProgress.objects.get(user_id=1, content_id=1).completed
+        )
+        self.assertEqual(course_progress(progress.user, [12, 13]), {12: 1})
+
+    def test_events_are_coalesced(self):
+        for i in range(100):
+            buffer.record(1, 1, 4)
+            buffer.record(1, 2, 4, completed=i == 50)
+        self.assertEqual(len(buffer), 2)
+        with CaptureQueriesContext(connection) as queries:
+            buffer.flush()
+        few = len(queries)
+        ContentProgress.objects.all().delete()
+        buffer.record(1, 1, 4)
+        with CaptureQueriesContext(connection) as queries:
+            buffer.flush()
+        self.assertLessEqual(few, len(queries) + 1)
+        self.assertEqual(
+            ModuleProgress.objects.get(user_id=1, module_id=4).viewed, 1
+        )
+
+    def test_rows_keep_their_own_times(self):
+        # a first flush inserts the rows, the second one updates them
+        buffer.record(1, 1, 4)
+        buffer.record(1, 2, 4)
+        buffer.flush()
+        earlier = timezone.now() + timedelta(hours=1)
+        later = timezone.now() + timedelta(hours=2)
+        write_progress(
+            {(1, 1): (4, earlier, earlier), (1, 2): (4, later, later)}
+        )
+        rows = {
+            row.content_id: row
+            for row in ContentProgress.objects.filter(user_id=1)
+        }
+        self.assertEqual(rows[1].viewed, earlier)
+        self.assertEqual(rows[2].viewed, later)
+        self.assertEqual(rows[1].completed, earlier)
+        self.assertEqual(rows[2].completed, later)
+
+    def test_older_views_dont_move_viewed_back(self):
+        buffer.record(1, 1, 4)
+        buffer.flush()
+        viewed = ContentProgress.objects.get(user_id=1, content_id=1).viewed
+        earlier = viewed - timedelta(hours=1)
+        write_progress({(1, 1): (4, earlier, None)})
+        self.assertEqual(
+            ContentProgress.objects.get(user_id=1, content_id=1).viewed,
+            viewed,
+        )
+
+    def test_failed_write_keeps_the_events(self):
+        buffer.record(1, 1, 4)
+        with mock.patch(
+            "app.courses.progress.write_progress", side_effect=Exception
+        ):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer), 1)
+
+    def test_only_enrolled_students_complete_contents(self):
+        self.course.students.remove(1)
+        url = reverse("module_content_complete", args=[4, 1])
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(len(buffer), 0)
+
+    def test_only_enrolled_students_view_contents(self):
+        self.course.students.remove(1)
+        url = reverse("module_content_list", args=[12, 4])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(buffer), 0)
+
+
+class DashboardTestCase(EIPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_login()
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("home"))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_courses_load_in_constant_queries(self):
+        self.count_queries()
+        few, _ = self.count_queries()
+        Course.objects.get(pk=11).students.add(1)
+        Course.objects.get(pk=10).students.add(1)
+        self.count_queries()
+        many, response = self.count_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context["courses"]), 4)
+
+    def test_enrolling_refreshes_the_cached_courses(self):
+        Course.objects.get(pk=12).students.remove(1)
+        _, response = self.count_queries()
+        self.assertEqual(
+            [course.id for course in response.context["courses"]], [13]
+        )
+        self.client.post(reverse("student_enroll"), {"course": 12})
+        _, response = self.count_queries()
+        self.assertEqual(
+            {course.id for course in response.context["courses"]}, {12, 13}
+        )
+        Course.objects.get(pk=13).students.clear()
+        _, response = self.count_queries()
+        self.assertEqual(
+            [course.id for course in response.context["courses"]], [12]
+        )
+
+    def test_image_urls_are_not_recomputed(self):
+        self.count_queries()
+        with mock.patch(
+            "app.courses.views.content_view.thumbnail_sources"
+        ) as sources:
+            self.count_queries()
+        sources.assert_not_called()
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentRatingTestCase(TransactionTestCase):
+    def test_parallel_raters_are_all_counted(self):
+        User = get_user_model()
+        owner = User.objects.create_user("owner", password="x")
+        subject = Subject.objects.create(title="Subject")
+        course = Course.objects.create(
+            owner=owner, subject=subject, title="Rated"
+        )
+        users = [
+            User.objects.create_user("rater{}".format(i), password="x")
+            for i in range(20)
+        ]
+
+        def rate(user):
+            try:
+                for value in (5, user.pk % 6):
+                    CourseStats.rate(course.pk, user.pk, value)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            list(pool.map(rate, users))
+        stats = CourseStats.objects.get(course=course)
+        values = [user.pk % 6 for user in users]
+        self.assertEqual(stats.rating_count, len(users))
+        self.assertEqual(stats.rating_sum, sum(values))
+        self.assertEqual(
+            stats.rating_histogram,
+            [values.count(value) for value in range(6)],
+        )
+
+
+class BulkEnrollmentTestCase(EIPTestCase):
+    def test_roster_is_enrolled_in_batches(self):
+        user = get_user_model().objects.get(pk=2)
+        self.assertEqual(get_enrolled_course_ids(user), [])
+        roster = os.path.join(self.media_root, "roster.csv")
+        with open(roster, "w") as f:
+            f.write("username,name\nsimon,S\nkimbugp,K\nnobody,N\n")
+            f.write("soultech,S\npeter,P\nkimbugp,K\n")
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "enroll_roster",
+            12,
+            roster,
+            "--batch=2",
+            stdout=stdout,
+            stderr=stderr,
+        )
+        self.assertIn("Enrolled 3 new students from 6 rows", stdout.getvalue())
+        self.assertIn("Unknown user nobody", stderr.getvalue())
+        self.assertEqual(
+            set(
+                Course.objects.get(pk=12).students.values_list("pk", flat=True)
+            ),
+            {1, 2, 3, 6},
+        )
+        self.assertEqual(CourseStats.objects.get(pk=12).total_students, 4)
+        self.assertEqual(get_enrolled_course_ids(user), [12])
+
+    def test_bulk_enroll_reports_progress(self):
+        progress = mock.Mock()
+        self.assertEqual(
+            bulk_enroll(13, iter([1, 2, 3]), batch_size=2, progress=progress),
+            2,
+        )
+        self.assertEqual(progress.call_args_list, [mock.call(2), mock.call(3)])
+
+
+class CourseTransferTestCase(EIPTestCase):
+    def test_export_then_import(self):
+        settings = self.settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        export = os.path.join(self.media_root, "export.jsonl")
+        call_command("export_course", 12, "--output", export)
+        with open(export) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(
+            [record["type"] for record in records],
+            ["course", "module", "text", "image", "content", "content"],
+        )
+
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        image = records[0]["image"]
+        os.makedirs(os.path.join(source, os.path.dirname(image)))
+        with open(os.path.join(source, image), "wb") as f:
+            f.write(b"png")
+        stdout = StringIO()
+        call_command(
+            "import_course",
+            export,
+            "--owner=kimbugp",
+            "--media-source",
+            source,
+            stdout=stdout,
+        )
+        self.assertIn("1 course, 1 module, 1 text", stdout.getvalue())
+
+        original = Course.objects.get(pk=12)
+        course = Course.objects.latest("pk")
+        self.assertEqual(course.title, original.title)
+        self.assertNotEqual(course.slug, original.slug)
+        self.assertEqual(course.owner_id, 2)
+        contents = Content.objects.filter(module__course=course).order_by(
+            "order"
+        )
+        items = [content.item for content in contents]
+        self.assertEqual(
+            [(item.title, item.owner_id) for item in items],
+            [("Simon says", 2), ("Simon says", 2)],
+        )
+        self.assertEqual(items[0].content, "af")
+        self.assertEqual(items[1].file.name, "default.jpg")
+        self.assertEqual(course.image.name, image)
+        self.assertTrue(course.image.storage.exists(image))
+        stats = CourseStats.objects.get(course=course)
+        self.assertEqual((stats.total_modules, stats.total_contents), (1, 2))
+
+    def test_import_keeps_or_schedules_thumbnails(self):
+        Course.objects.filter(pk=12).update(
+            image="images/photo.png", thumbnails=True
+        )
+        lines = list(export_lines([12]))
+        self.assertTrue(json.loads(lines[0])["thumbnails"])
+        storage = Course._meta.get_field("image").storage
+        with mock.patch.object(storage, "exists", return_value=True):
+            CourseImporter().load(lines)
+        self.assertTrue(Course.objects.latest("pk").thumbnails)
+
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        os.makedirs(os.path.join(source, "images"))
+        with open(os.path.join(source, "images", "photo.png"), "wb") as f:
+            f.write(b"png")
+        settings = self.settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        importer = CourseImporter(media_source=source)
+        with mock.patch(
+            "app.courses.transfer.schedule_derivatives"
+        ) as schedule, mock.patch(
+            "app.courses.transfer.transaction.on_commit", lambda func: func()
+        ):
+            importer.load(lines)
+        course = Course.objects.latest("pk")
+        self.assertFalse(course.thumbnails)
+        schedule.assert_called_once_with(
+            course.image.storage, course.image.name
+        )
+
+    def test_import_invalidates_the_catalog(self):
+        importer = CourseImporter()
+        with mock.patch("app.courses.transfer.bump_versions") as bump:
+            importer.load(export_lines([12, 13]))
+        self.assertEqual(bump.call_args_list, [mock.call("catalog")] * 2)
+
+
+class BenchmarkTestCase(EIPTestCase):
+    def test_benchmark_writes_comparable_results(self):
+        output = os.path.join(self.media_root, "benchmark.json")
+        options = [
+            "--courses=3",
+            "--students=3",
+            "--enrollments=2",
+            "--rating-ratio=0.5",
+            "--hot=2",
+            "--requests=2",
+            "--warmup=2",
+            "--allocations=1",
+            "--output",
+            output,
+        ]
+        courses = Course.objects.count()
+        users = get_user_model().objects.count()
+        call_command("benchmark_views", *options, stdout=StringIO())
+        self.assertEqual(Course.objects.count(), courses)
+        self.assertEqual(get_user_model().objects.count(), users)
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(report["params"]["courses"], 3)
+        self.assertEqual(
+            set(report["results"]["dashboard"]),
+            {"requests", "latency_ms", "queries", "allocated_kib"},
+        )
+        stdout = StringIO()
+        call_command(
+            "benchmark_views",
+            *options,
+            "--scenario=catalog",
+            "--compare",
+            output,
+            stdout=stdout,
+        )
+        self.assertIn("catalog", stdout.getvalue())
+
+    def test_allocations_are_traced_without_reset_peak(self):
+        # the tracemalloc functions of Python 3.7, which CI runs
+        traced = mock.Mock(
+            wraps=tracemalloc,
+            spec=["start", "stop", "is_tracing", "get_traced_memory"],
+        )
+        with mock.patch(
+            "app.courses.management.commands.benchmark_views.tracemalloc",
+            traced,
+        ):
+            call_command(
+                "benchmark_views",
+                "--courses=2",
+                "--students=2",
+                "--requests=1",
+                "--warmup=0",
+                "--allocations=2",
+                "--scenario=catalog",
+                "--output",
+                os.path.join(self.media_root, "benchmark.json"),
+                stdout=StringIO(),
+            )
+        self.assertEqual(traced.start.call_count, 2)
+
+
+class GenerateDatasetTestCase(EIPTestCase):
+    options = [
+        "--users=40",
+        "--teachers=0.1",
+        "--subjects=2",
+        "--courses=5",
+        "--modules=3",
+        "--contents=2",
+        "--batch=7",
+    ]
+
+    def generate(self, prefix):
+        call_command(
+            "generate_dataset",
+            *self.options,
+            "--prefix={}".format(prefix),
+            stdout=StringIO(),
+        )
+        courses = Course.objects.filter(
+            slug__startswith="{}-course-".format(prefix)
+        ).order_by("pk")
+        return list(
+            courses.values_list(
+                "stats__total_modules",
+                "stats__total_contents",
+                "stats__total_students",
+                "stats__rating_sum",
+            )
+        )
+
+    def test_generated_dataset_is_consistent_and_reproducible(self):
+        users = get_user_model().objects.count()
+        shape = self.generate("one")
+        self.assertEqual(get_user_model().objects.count(), users + 40)
+        self.assertEqual(
+            get_user_model()
+            .objects.filter(username__startswith="one-", is_teacher=True)
+            .count(),
+            4,
+        )
+        self.assertEqual(len(shape), 5)
+        course = Course.objects.get(slug="one-course-0")
+        self.assertEqual(
+            list(course.modules.values_list("order", flat=True)),
+            list(range(course.stats.total_modules)),
+        )
+        texts = Text.objects.filter(
+            pk__in=Content.objects.filter(module__course=course).values(
+                "object_id"
+            )
+        )
+        self.assertEqual(
+            set(texts.values_list("owner_id", flat=True)), {course.owner_id}
+        )
+        for course in Course.objects.filter(slug__startswith="one-course-"):
+            stats = CourseStats.objects.get(course=course)
+            CourseStats.refresh(
+                course.pk, modules=True, students=True, ratings=True
+            )
+            refreshed = CourseStats.objects.get(course=course)
+            for field in ["total_contents", "total_students", "rating_sum"]:
+                self.assertEqual(
+                    getattr(stats, field), getattr(refreshed, field)
+                )
+            self.assertEqual(
+                stats.rating_histogram, refreshed.rating_histogram
+            )
+        # same seed, same dataset; the ids continue after the generated ones
+        self.assertEqual(self.generate("two"), shape)
+        subject = Subject.objects.create(title="After generation")
+        self.assertEqual(subject.slug, "after-generation")
+        with self.assertRaises(CommandError):
+            self.generate("one")
+
+    def test_generated_slugs_are_reserved(self):
+        subject = Subject.objects.get(pk=1)
+        taken = Course.objects.create(
+            owner_id=1, subject=subject, title="Three course"
+        )
+        Course.objects.create(
+            owner_id=1, subject=subject, title="Three course"
+        )
+        with self.assertRaises(CommandError):
+            self.generate("three")
+        self.assertFalse(Course.objects.filter(slug="three-course-2").exists())
+
+        self.generate("one")
+        again = Course.objects.create(
+            owner_id=1, subject=subject, title="One course 3"
+        )
+        self.assertEqual(again.slug, "one-course-3-1")
+        course = Course.objects.create(
+            owner_id=1, subject=subject, title="One course"
+        )
+        self.assertEqual(course.slug, "one-course-5")
@@ -0,0 +1,136 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import models
+from .cache import bump_versions
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+_executor = None
+
+
+def derivative_name(name, size, extension):
+    """
+    Name of the ``size`` derivative of an image, stored next to it and
+    keeping its extension, so photo.png and photo.jpg get their own:
+    images/photo.png -> images/thumbs/photo.png-card.webp
+    """
+    directory, filename = posixpath.split(name)
+    return posixpath.join(
+        directory, "thumbs", "{}-{}.{}".format(filename, size, extension)
+    )
+
+
+def resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def generate_derivatives(storage, name):
+    """
+    Write every size of THUMBNAIL_SIZES of the image ``name`` in each of
+    FORMATS to ``storage``, replacing older derivatives.
+    """
+    with storage.open(name, "rb") as original:
+        image = Image.open(original)
+        image.load()
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    for size, options in settings.THUMBNAIL_SIZES.items():
+        derivative = resize(image, *options)
+        for extension, image_format in FORMATS.items():
+            output = BytesIO()
+            derivative.save(
+                output, image_format, quality=settings.THUMBNAIL_QUALITY
+            )
+            target = derivative_name(name, size, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(output.getvalue()))
+
+
+def record_derivatives(name):
+    """
+    Flag the course and content images stored as ``name`` as having
+    derivatives, so pages link them without asking the storage, and
+    invalidate the fragments showing them.
+    """
+    now = timezone.now()
+    courses = models.Course.objects.filter(image=name)
+    images = models.Image.objects.filter(file=name)
+    course_ids = set(courses.values_list("pk", flat=True))
+    course_ids.update(
+        models.Content.objects.filter(
+            content_type=ContentType.objects.get_for_model(models.Image),
+            object_id__in=images.values("pk"),
+        ).values_list("module__course_id", flat=True)
+    )
+    courses.update(thumbnails=True, updated=now)
+    images.update(thumbnails=True, updated=now)
+    bump_versions(
+        "catalog", *["course:{}".format(pk) for pk in sorted(course_ids)]
+    )
+
+
+def _generate(storage, name):
+    close_old_connections()
+    try:
+        generate_derivatives(storage, name)
+        record_derivatives(name)
+    except Exception:
+        logger.exception("Could not generate thumbnails of %s", name)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(storage, name):
+    """
+    Generate the derivatives of ``name`` in the thumbnail worker pool so
+    the request that saved the image doesn't wait for them.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix="thumbnails",
+        )
+    return _executor.submit(_generate, storage, name)
+
+
+def thumbnail_url(field_file, size, extension="jpg"):
+    """
+    Url of a derivative of ``field_file``, or of the original while its
+    derivatives haven't been generated.
+    """
+    if not field_file:
+        return ""
+    if getattr(field_file.instance, "thumbnails", False):
+        return field_file.storage.url(
+            derivative_name(field_file.name, size, extension)
+        )
+    return field_file.url
+
+
+def thumbnail_sources(field_file, size):
+    """
+    Urls of the WebP and JPEG ``size`` derivatives of ``field_file``, the
+    WebP one None until they are generated. Whether they are comes from
+    the ``thumbnails`` flag of the instance, the storage isn't asked.
+    """
+    webp = None
+    if field_file and getattr(field_file.instance, "thumbnails", False):
+        webp = thumbnail_url(field_file, size, "webp")
+    return {"webp": webp, "src": thumbnail_url(field_file, size)}
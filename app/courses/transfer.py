@@ -0,0 +1,338 @@
+import json
+import os
+from functools import partial
+from itertools import groupby
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.files import File as StoredFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import ImageField
+
+from .cache import bump_versions
+from .models import (
+    Content,
+    Course,
+    CourseStats,
+    File,
+    Image,
+    Module,
+    Subject,
+    Text,
+    Video,
+)
+from .search import schedule_index
+from .thumbnails import schedule_derivatives
+
+# content item models by record type and the fields exported besides title
+ITEM_MODELS = {"text": Text, "video": Video, "image": Image, "file": File}
+ITEM_FIELDS = {
+    "text": ["content"],
+    "video": ["url"],
+    "image": ["file"],
+    "file": ["file"],
+}
+
+
+def export_records(course_ids):
+    """
+    Yield the records of ``course_ids`` as dicts, one course after the
+    other: the course, its modules, the items of its contents and its
+    contents. Rows are read with iterator() so memory doesn't grow with
+    the size of the courses.
+    """
+    courses = (
+        Course.objects.filter(pk__in=course_ids)
+        .select_related("owner", "subject")
+        .order_by("pk")
+    )
+    for course in courses.iterator():
+        yield {
+            "type": "course",
+            "id": course.pk,
+            "owner": course.owner.username,
+            "subject": {
+                "slug": course.subject.slug,
+                "title": course.subject.title,
+            },
+            "title": course.title,
+            "overview": course.overview,
+            "image": course.image.name,
+            "thumbnails": course.thumbnails,
+        }
+        modules = Module.objects.filter(course=course).order_by("order")
+        for module in modules.iterator():
+            yield {
+                "type": "module",
+                "id": module.pk,
+                "course": course.pk,
+                "title": module.title,
+                "description": module.description,
+                "order": module.order,
+            }
+        contents = Content.objects.filter(module__course=course)
+        for item_type, model in ITEM_MODELS.items():
+            object_ids = contents.filter(
+                content_type=ContentType.objects.get_for_model(model)
+            ).values("object_id")
+            items = (
+                model.objects.filter(pk__in=object_ids)
+                .select_related("owner")
+                .order_by("pk")
+            )
+            for item in items.iterator():
+                record = {
+                    "type": item_type,
+                    "id": item.pk,
+                    "owner": item.owner.username,
+                    "title": item.title,
+                }
+                for field in ITEM_FIELDS[item_type]:
+                    value = getattr(item, field)
+                    record[field] = getattr(value, "name", value)
+                if item_type == "image":
+                    record["thumbnails"] = item.thumbnails
+                yield record
+        contents = contents.select_related("content_type").order_by(
+            "module__order", "order"
+        )
+        for content in contents.iterator():
+            yield {
+                "type": "content",
+                "module": content.module_id,
+                "item_type": content.content_type.model,
+                "item": content.object_id,
+                "order": content.order,
+            }
+
+
+def export_lines(course_ids):
+    for record in export_records(course_ids):
+        yield json.dumps(record, cls=DjangoJSONEncoder) + "\n"
+
+
+def per_course(records):
+    """
+    Split ``records`` lazily into the records of each course.
+    """
+    number = 0
+
+    def key(record):
+        nonlocal number
+        number += record["type"] == "course"
+        return number
+
+    return (group for _, group in groupby(records, key))
+
+
+class CourseImporter:
+    """
+    Create the courses of exported records. Each course is imported in
+    its own transaction, its records are inserted with one bulk_create()
+    per ``batch_size`` records of a type, with the orders of the export
+    and slugs reserved per title in advance. Stored media are referenced
+    by name when the storage has them, keeping the exported thumbnails
+    flag of images, else uploaded from ``media_source`` when given, their
+    derivatives generated once the course commits.
+    """
+
+    def __init__(self, owner=None, media_source=None, batch_size=1000):
+        self.owner = owner
+        self.media_source = media_source
+        self.batch_size = batch_size
+        self.users = {}
+        self.subjects = {}
+        self.course_ids = []
+        self.missing_media = []
+        self.counts = dict.fromkeys(
+            ["course", "module", *ITEM_MODELS, "content"], 0
+        )
+
+    def load(self, lines):
+        records = (json.loads(line) for line in lines if line.strip())
+        for records in per_course(records):
+            # export ids are only referenced within their course
+            self.ids = {}
+            self.media = {}
+            self.stored = set()
+            self.uploaded = []
+            with transaction.atomic():
+                pending = []
+                for record in records:
+                    if pending and (
+                        record["type"] != pending[0]["type"]
+                        or len(pending) >= self.batch_size
+                    ):
+                        self.insert(pending)
+                        pending = []
+                    pending.append(record)
+                if pending:
+                    self.insert(pending)
+                # bulk inserts skip the post_save handlers that invalidate
+                # the catalog, bumped again once the course commits, and
+                # generate the thumbnails of the uploaded images
+                bump_versions("catalog")
+                if self.uploaded:
+                    transaction.on_commit(
+                        partial(schedule_uploaded, self.uploaded)
+                    )
+        return self.counts
+
+    def insert(self, records):
+        record_type = records[0]["type"]
+        if record_type not in self.counts:
+            raise ValueError("Unknown record type {}".format(record_type))
+        if record_type in ITEM_MODELS:
+            objs = self.build_items(ITEM_MODELS[record_type], records)
+        else:
+            objs = getattr(self, "build_{}s".format(record_type))(records)
+        objs = create(type(objs[0]), objs)
+        if record_type != "content":
+            for record, obj in zip(records, objs):
+                self.ids[record_type, record["id"]] = obj.pk
+        self.counts[record_type] += len(objs)
+        if record_type == "course":
+            CourseStats.objects.bulk_create(
+                [CourseStats(course=course) for course in objs],
+                ignore_conflicts=True,
+            )
+            self.course_ids += [course.pk for course in objs]
+            schedule_index(course.pk for course in objs)
+
+    def build_courses(self, records):
+        titles = {}
+        for record in records:
+            titles.setdefault(record["title"], []).append(record)
+        slugs = {}
+        for title, same_title in titles.items():
+            reserved = Course.reserve_slugs(title, len(same_title))
+            for record, slug in zip(same_title, reserved):
+                slugs[id(record)] = slug
+        image = Course._meta.get_field("image")
+        return [
+            Course(
+                owner_id=self.get_user(record["owner"]),
+                subject_id=self.get_subject(record["subject"]),
+                title=record["title"],
+                slug=slugs[id(record)],
+                overview=record["overview"],
+                image=self.get_media(image, record["image"]),
+                thumbnails=self.has_thumbnails(record, "image"),
+            )
+            for record in records
+        ]
+
+    def build_modules(self, records):
+        return [
+            Module(
+                course_id=self.ids["course", record["course"]],
+                title=record["title"],
+                description=record["description"],
+                order=record["order"],
+            )
+            for record in records
+        ]
+
+    def build_items(self, model, records):
+        fields = ITEM_FIELDS[model._meta.model_name]
+        objs = []
+        for record in records:
+            obj = model(
+                owner_id=self.get_user(record["owner"]), title=record["title"]
+            )
+            for field in fields:
+                value = record[field]
+                if field == "file":
+                    value = self.get_media(model._meta.get_field(field), value)
+                setattr(obj, field, value)
+            if model is Image:
+                obj.thumbnails = self.has_thumbnails(record, "file")
+            objs.append(obj)
+        return objs
+
+    def build_contents(self, records):
+        return [
+            Content(
+                module_id=self.ids["module", record["module"]],
+                content_type=ContentType.objects.get_for_model(
+                    ITEM_MODELS[record["item_type"]]
+                ),
+                object_id=self.ids[record["item_type"], record["item"]],
+                order=record["order"],
+            )
+            for record in records
+        ]
+
+    def get_user(self, username):
+        if self.owner is not None:
+            return self.owner.pk
+        if username not in self.users:
+            self.users[username] = (
+                get_user_model()
+                .objects.values_list("pk", flat=True)
+                .get(username=username)
+            )
+        return self.users[username]
+
+    def get_subject(self, subject):
+        slug = subject["slug"]
+        if slug not in self.subjects:
+            pk = (
+                Subject.objects.filter(slug=slug)
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if pk is None:
+                pk = Subject.objects.create(title=subject["title"]).pk
+            self.subjects[slug] = pk
+        return self.subjects[slug]
+
+    def get_media(self, field, name):
+        """
+        Name of the stored file ``name`` in the storage of ``field``: the
+        same when the storage has it, else the name it was uploaded as
+        from ``media_source``.
+        """
+        if not name or name == field.default:
+            return name
+        if name not in self.media:
+            stored = name
+            if field.storage.exists(name):
+                self.stored.add(name)
+            else:
+                path = os.path.join(self.media_source or "", name)
+                if self.media_source and os.path.isfile(path):
+                    with open(path, "rb") as f:
+                        stored = field.storage.save(name, StoredFile(f))
+                    if isinstance(field, ImageField):
+                        self.uploaded.append((field.storage, stored))
+                else:
+                    self.missing_media.append(name)
+            self.media[name] = stored
+        return self.media[name]
+
+    def has_thumbnails(self, record, field):
+        """
+        Whether the derivatives of the image of ``record`` exist: as
+        exported when the storage had the image, not for a missing or
+        uploaded one.
+        """
+        return record.get("thumbnails", False) and record[field] in self.stored
+
+
+def schedule_uploaded(media):
+    for storage, name in media:
+        schedule_derivatives(storage, name)
+
+
+def create(model, objs):
+    """
+    Insert ``objs`` and return them with their pks. Backends that can't
+    return the ids of a bulk insert save the rows one by one.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objs)
+    for obj in objs:
+        obj.save(force_insert=True)
+    return objs
@@ -0,0 +1,156 @@
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import UploadTask
+
+logger = logging.getLogger(__name__)
+
+
+def get_staging_storage():
+    return FileSystemStorage(location=settings.UPLOAD_STAGING_DIR)
+
+
+def stage_upload(uploaded_file):
+    """
+    Keep ``uploaded_file`` in the staging directory and return its name
+    there. Uploads Django already spooled to disk are moved, not copied.
+    """
+    staging = get_staging_storage()
+    name = staging.get_available_name(os.path.basename(uploaded_file.name))
+    if hasattr(uploaded_file, "temporary_file_path"):
+        uploaded_file.close()
+        path = staging.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_move_safe(uploaded_file.temporary_file_path(), path)
+        return name
+    return staging.save(name, uploaded_file)
+
+
+def enqueue_upload(item, uploaded_file):
+    """
+    Stage ``uploaded_file`` for the ``file`` field of ``item``, a saved
+    File or Image, and queue its transfer to the item's storage.
+    """
+    return UploadTask.objects.create(
+        owner=item.owner,
+        item=item,
+        staged_name=stage_upload(uploaded_file),
+        name=os.path.basename(uploaded_file.name),
+    )
+
+
+def fail_stale_tasks(stale):
+    """
+    Fail the tasks left running by a dead worker that have used up their
+    attempts, rather than claiming them again.
+    """
+    tasks = list(
+        UploadTask.objects.filter(
+            status=UploadTask.RUNNING,
+            updated__lt=stale,
+            attempts__gte=settings.UPLOAD_MAX_ATTEMPTS,
+        ).values_list("pk", "staged_name")
+    )
+    if not tasks:
+        return
+    UploadTask.objects.filter(
+        pk__in=[pk for pk, staged_name in tasks], status=UploadTask.RUNNING
+    ).update(
+        status=UploadTask.FAILED,
+        error="The worker running the upload stopped",
+        updated=timezone.now(),
+    )
+    staging = get_staging_storage()
+    for pk, staged_name in tasks:
+        staging.delete(staged_name)
+
+
+def claim_task(exclude=()):
+    """
+    Mark the next due task, other than those in ``exclude``, as running
+    and return it, None when there is none. Claiming one task at a time
+    keeps ``updated`` at the time it started: tasks left running by a
+    dead worker are due again after UPLOAD_TASK_TIMEOUT while they have
+    attempts left. Rows locked by another worker are skipped where the
+    database supports it.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.UPLOAD_TASK_TIMEOUT)
+    fail_stale_tasks(stale)
+    with transaction.atomic():
+        task = (
+            UploadTask.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=UploadTask.PENDING)
+                | Q(
+                    status=UploadTask.RUNNING,
+                    updated__lt=stale,
+                    attempts__lt=settings.UPLOAD_MAX_ATTEMPTS,
+                )
+            )
+            .exclude(pk__in=exclude)
+            .order_by("pk")
+            .first()
+        )
+        if task is None:
+            return None
+        UploadTask.objects.filter(pk=task.pk).update(
+            status=UploadTask.RUNNING,
+            attempts=F("attempts") + 1,
+            updated=timezone.now(),
+        )
+    task.status = UploadTask.RUNNING
+    task.attempts += 1
+    return task
+
+
+def run_task(task):
+    """
+    Save the staged file of ``task`` to its item, the regular model save
+    uploads it to the storage and fires the item's signals.
+    """
+    staging = get_staging_storage()
+    try:
+        item = task.item
+        if item is None:
+            raise ValueError("The item of the upload was deleted")
+        with staging.open(task.staged_name, "rb") as staged:
+            item.file = File(staged, name=task.name)
+            item.save()
+    except Exception as error:
+        logger.exception("Upload %s failed", task.pk)
+        task.error = str(error)
+        if task.attempts < settings.UPLOAD_MAX_ATTEMPTS:
+            task.status = UploadTask.PENDING
+        else:
+            task.status = UploadTask.FAILED
+            staging.delete(task.staged_name)
+    else:
+        task.status = UploadTask.DONE
+        task.error = ""
+        staging.delete(task.staged_name)
+    task.save(update_fields=["status", "error", "updated"])
+    return task
+
+
+def process_uploads(limit=10):
+    """
+    Run up to ``limit`` due upload tasks, return how many were run.
+    """
+    done = []
+    while len(done) < limit:
+        # a failed task goes back to pending, retry it on the next pass
+        task = claim_task(exclude=done)
+        if task is None:
+            break
+        run_task(task)
+        done.append(task.pk)
+    return len(done)
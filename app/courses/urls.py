@@ -14,6 +14,11 @@ urlpatterns = [
         courses_views.CourseListView.as_view(),
         name="student_course_list_subject",
     ),
+    path(
+        "course/search/",
+        courses_views.CourseSearchView.as_view(),
+        name="student_course_search",
+    ),
     path(
         "course/<slug:slug>/",
         courses_views.CourseDetailView.as_view(),
@@ -42,12 +47,37 @@ urlpatterns = [
         modules_view.CourseModuleUpdateView.as_view(),
         name="course_module_update",
     ),
+    path(
+        "<int:pk>/module/order/",
+        modules_view.CourseModuleOrderView.as_view(),
+        name="course_module_order",
+    ),
     path(
         "<int:pk>/module/<int:module_id>/",
         modules_view.ModuleContentListView.as_view(),
         name="module_content_list",
     ),
     # content
+    path(
+        "module/<int:module_id>/content/order/",
+        content_view.ContentOrderView.as_view(),
+        name="module_content_order",
+    ),
+    path(
+        "module/<int:module_id>/content/<int:id>/complete/",
+        content_view.ContentCompleteView.as_view(),
+        name="module_content_complete",
+    ),
+    path(
+        "module/<int:module_id>/content/<model_name>/upload/",
+        content_view.DirectUploadView.as_view(),
+        name="module_content_direct_upload",
+    ),
+    path(
+        "module/<int:module_id>/content/<model_name>/upload/complete/",
+        content_view.DirectUploadCompleteView.as_view(),
+        name="module_content_direct_upload_complete",
+    ),
     path(
         "module/<int:module_id>/content/<model_name>/",
         content_view.ContentCreateUpdateView.as_view(),
@@ -63,6 +93,11 @@ urlpatterns = [
         content_view.ContentDeleteView.as_view(),
         name="module_content_delete",
     ),
+    path(
+        "upload/<int:pk>/",
+        content_view.UploadStatusView.as_view(),
+        name="upload_status",
+    ),
     path(
         "rating/<int:id>",
         content_view.RateCourseView.as_view(),
@@ -1,13 +1,42 @@
+import json
+import mimetypes
+import os
+import posixpath
+from uuid import uuid4
+
+from botocore.exceptions import ClientError
 from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core import signing
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.forms.models import modelform_factory
 from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic.base import TemplateResponseMixin, TemplateView, View
 
 from app import students
-from app.courses.models import Rating
-
-from ..models import Content, Course, Module
+from ..cache import (
+    fragment_key,
+    get_enrolled_course_ids,
+    get_or_build,
+    get_versions,
+)
+from ..models import (
+    RATING_VALUES,
+    Content,
+    Course,
+    CourseStats,
+    Image,
+    Module,
+    UploadTask,
+)
+from ..progress import course_progress, record_completion
+from ..thumbnails import schedule_derivatives, thumbnail_sources
+from ..uploads import enqueue_upload
+from .ordering import OrderView
 
 
 class ContentCreateUpdateView(TemplateResponseMixin, View):
@@ -41,6 +70,8 @@ class ContentCreateUpdateView(TemplateResponseMixin, View):
         return self.render_to_response({"form": form, "object": self.obj})
 
     def post(self, request, module_id, model_name, id=None):
+        previous_file = getattr(self.obj, "file", None)
+        previous_file = previous_file.name if previous_file else ""
         form = self.get_form(
             self.model,
             instance=self.obj,
@@ -50,9 +81,27 @@ class ContentCreateUpdateView(TemplateResponseMixin, View):
         if form.is_valid():
             obj = form.save(commit=False)
             obj.owner = request.user
-            obj.save()
-            if not id:
-                Content.objects.create(module=self.module, item=obj)
+            upload = request.FILES.get("file")
+            if upload and settings.CONTENT_ASYNC_UPLOADS:
+                # the item keeps its current file until the worker is done
+                obj.file = previous_file
+            else:
+                upload = None
+            with transaction.atomic():
+                obj.save()
+                if not id:
+                    Content.objects.create(module=self.module, item=obj)
+                if upload:
+                    task = enqueue_upload(obj, upload)
+            if upload and request.is_ajax():
+                return JsonResponse(
+                    {
+                        "id": task.pk,
+                        "status": task.status,
+                        "status_url": reverse("upload_status", args=[task.pk]),
+                    },
+                    status=202,
+                )
             return redirect(
                 "module_content_list",
                 pk=self.module.course.id,
@@ -74,12 +123,24 @@ class ContentDeleteView(TemplateResponseMixin, View):
         )
 
 
-class RateCourseView(View):
+class ContentOrderView(OrderView):
+    model = Content
+    parent_model = Module
+    parent_field = "module"
+    parent_kwarg = "module_id"
+    owner_field = "course__owner"
+
+
+class RateCourseView(LoginRequiredMixin, View):
     def post(self, request, id, *args, **kwargs):
-        value = request.POST.get("points", 0)
-        rating = Rating(request.user.id, id, value)
         course = get_object_or_404(Course, id=id)
-        Rating.objects.create(user=request.user, course=course, value=value)
+        try:
+            value = int(request.POST.get("points", 0))
+        except ValueError:
+            value = None
+        if value not in RATING_VALUES:
+            return HttpResponseBadRequest("Invalid rating.")
+        CourseStats.rate(course.id, request.user.id, value)
         return redirect(
             "module_content_list",
             pk=course.id,
@@ -88,8 +149,241 @@ class RateCourseView(View):
 
 
 class DashBoardView(TemplateView, TemplateResponseMixin):
+    """
+    Courses of the student with their progress. The enrolled course ids
+    and the card image urls are cached, the courses and their owners and
+    stats come in one query.
+    """
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        courses = Course.objects.filter(students__id=self.request.user.id)
+        courses = []
+        if self.request.user.is_authenticated:
+            course_ids = get_enrolled_course_ids(self.request.user)
+            if course_ids:
+                courses = list(
+                    Course.objects.filter(id__in=course_ids).select_related(
+                        "owner", "stats"
+                    )
+                )
+        if courses:
+            images = card_images(courses)
+            completed = course_progress(
+                self.request.user, [course.id for course in courses]
+            )
+            for course in courses:
+                course.card_image = images[course.id]
+                course.completed = completed.get(course.id, 0)
         context["courses"] = courses
         return context
+
+
+def card_images(courses):
+    """
+    Card thumbnail sources of ``courses`` by course id, cached until one
+    of the courses changes.
+    """
+    versions = get_versions(
+        *["course:{}".format(course.id) for course in courses]
+    )
+    key = fragment_key(
+        "card-images",
+        *[
+            "{}:{}".format(course.id, version)
+            for course, version in zip(courses, versions)
+        ]
+    )
+    return get_or_build(
+        key,
+        lambda: {
+            course.id: thumbnail_sources(course.image, "card")
+            for course in courses
+        },
+    )
+
+
+class ContentCompleteView(LoginRequiredMixin, View):
+    """
+    Mark a content of a course the student is enrolled in as completed.
+    The event is buffered, the progress shows once it is written.
+    """
+
+    def post(self, request, module_id, id):
+        content = get_object_or_404(
+            Content,
+            id=id,
+            module_id=module_id,
+            module__course__students=request.user,
+        )
+        record_completion(request.user, content)
+        if request.is_ajax():
+            return JsonResponse({"recorded": True}, status=202)
+        return redirect(
+            "module_content_list",
+            pk=content.module.course_id,
+            module_id=module_id,
+        )
+
+
+class UploadStatusView(LoginRequiredMixin, View):
+    def get(self, request, pk):
+        task = get_object_or_404(UploadTask, pk=pk, owner=request.user)
+        return JsonResponse(
+            {"status": task.status, "error": task.error, "name": task.name}
+        )
+
+
+class DirectUploadMixin(LoginRequiredMixin):
+    """
+    Uploads sent by the browser straight to the storage of the item's
+    ``file``, for storages able to sign them (S3Storage).
+    """
+
+    salt = "app.courses.direct-upload"
+    models = ("file", "image")
+
+    def dispatch(self, request, module_id, model_name):
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        if model_name not in self.models:
+            raise Http404("No direct uploads for {}".format(model_name))
+        self.module = get_object_or_404(
+            Module, id=module_id, course__owner=request.user
+        )
+        self.model = apps.get_model("courses", model_name)
+        self.storage = self.model._meta.get_field("file").storage
+        if not hasattr(self.storage, "presigned_post"):
+            return HttpResponseBadRequest("Direct uploads are not supported.")
+        try:
+            self.data = json.loads(request.body)
+        except ValueError:
+            self.data = None
+        if not isinstance(self.data, dict):
+            return HttpResponseBadRequest("Expected a JSON object.")
+        return super().dispatch(request, module_id, model_name)
+
+
+class DirectUploadView(DirectUploadMixin, View):
+    """
+    Issue the credentials of an upload, a presigned POST or, when the
+    client asks for ``parts``, a multipart upload with a url per part.
+    The returned token identifies the upload to DirectUploadCompleteView.
+    """
+
+    def post(self, request, module_id, model_name):
+        filename = os.path.basename(str(self.data.get("filename", "")))
+        parts = self.data.get("parts")
+        if not filename:
+            return HttpResponseBadRequest("Missing filename.")
+        if parts is not None and not (
+            isinstance(parts, int)
+            and 0 < parts <= settings.DIRECT_UPLOAD_MAX_PARTS
+        ):
+            return HttpResponseBadRequest("Invalid number of parts.")
+        field = self.model._meta.get_field("file")
+        name = field.generate_filename(
+            None, posixpath.join(uuid4().hex, filename)
+        )
+        content_type = (
+            self.data.get("content_type")
+            or mimetypes.guess_type(filename)[0]
+            or "application/octet-stream"
+        )
+        if content_type not in settings.DIRECT_UPLOAD_CONTENT_TYPES.get(
+            model_name, ()
+        ):
+            return HttpResponseBadRequest("Content type not allowed.")
+        upload = {
+            "user": request.user.pk,
+            "module": self.module.pk,
+            "model": model_name,
+            "name": name,
+        }
+        response = {}
+        if parts:
+            upload_id = self.storage.create_multipart_upload(
+                name, content_type
+            )
+            upload["upload_id"] = upload_id
+            response["part_urls"] = self.storage.presigned_part_urls(
+                name, upload_id, parts
+            )
+        else:
+            response["post"] = self.storage.presigned_post(
+                name, content_type, settings.DIRECT_UPLOAD_MAX_SIZE
+            )
+        response["token"] = signing.dumps(upload, salt=self.salt)
+        return JsonResponse(response)
+
+
+class DirectUploadCompleteView(DirectUploadMixin, View):
+    """
+    Create the item and its Content once the browser has sent the bytes,
+    completing the multipart upload with the part ETags it collected.
+    A token completes a single item, uploads above DIRECT_UPLOAD_MAX_SIZE
+    are deleted.
+    """
+
+    def post(self, request, module_id, model_name):
+        try:
+            upload = signing.loads(
+                self.data.get("token", ""),
+                salt=self.salt,
+                max_age=int(self.storage.upload_expire),
+            )
+        except signing.BadSignature:
+            return HttpResponseBadRequest("Invalid upload token.")
+        if upload["user"] != request.user.pk or (
+            upload["module"],
+            upload["model"],
+        ) != (self.module.pk, model_name):
+            return HttpResponseBadRequest("Invalid upload token.")
+        name = upload["name"]
+        if self.model.objects.filter(file=name).exists():
+            return HttpResponseBadRequest("The upload was already completed.")
+        if "upload_id" in upload:
+            try:
+                parts = [
+                    (int(part["PartNumber"]), str(part["ETag"]))
+                    for part in self.data["parts"]
+                ]
+            except (KeyError, TypeError, ValueError):
+                return HttpResponseBadRequest("Invalid parts.")
+            try:
+                self.storage.complete_multipart_upload(
+                    name, upload["upload_id"], parts
+                )
+            except ClientError:
+                return HttpResponseBadRequest("Could not complete the upload.")
+        metadata = self.storage.refresh_metadata(name)
+        if not metadata.exists:
+            return HttpResponseBadRequest("The file was not uploaded.")
+        if metadata.size > settings.DIRECT_UPLOAD_MAX_SIZE:
+            self.storage.delete(name)
+            return HttpResponseBadRequest("The file is too large.")
+        with transaction.atomic():
+            # completions of a module are serialized, so a replayed token
+            # can't create a second item for the same key
+            list(
+                Module.objects.select_for_update()
+                .filter(pk=self.module.pk)
+                .values_list("pk", flat=True)
+            )
+            if self.model.objects.filter(file=name).exists():
+                return HttpResponseBadRequest(
+                    "The upload was already completed."
+                )
+            item = self.model(
+                owner=request.user,
+                title=self.data.get("title") or os.path.basename(name),
+            )
+            item.file.name = name
+            item.save()
+            content = Content.objects.create(module=self.module, item=item)
+            if self.model is Image:
+                transaction.on_commit(
+                    lambda: schedule_derivatives(self.storage, name)
+                )
+        return JsonResponse(
+            {"content": content.pk, "item": item.pk}, status=201
+        )
@@ -1,10 +1,16 @@
+from functools import partial
+
 from django.contrib.auth.mixins import (
     LoginRequiredMixin,
     PermissionRequiredMixin,
 )
+from django.conf import settings
 from django.contrib.auth.views import reverse_lazy
-from django.db.models import Count
+from django.db.models import Count, Max, Subquery
+from django.http import Http404
 from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.views.generic.base import TemplateResponseMixin, View
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
@@ -12,7 +18,11 @@ from django.views.generic.list import ListView
 
 from app.students.forms import CourseEnrollForm
 
-from ..models import Course, Subject
+from ..cache import fragment_key, get_or_build, get_versions
+from ..conditional import ConditionalGetMixin
+from ..models import Course, Rating, Subject
+from ..pagination import keyset_page
+from ..search import search_courses
 
 
 class CourseOwnerMixin(LoginRequiredMixin):
@@ -65,29 +75,129 @@ class CoursesListView(CourseOwnerMixin, ListView):
     template_name = "courses_list.html"
 
 
-class CourseListView(TemplateResponseMixin, View):
+class CourseListView(ConditionalGetMixin, TemplateResponseMixin, View):
     model = Course
     template_name = "course/list.html"
+    lifetime = settings.FRAGMENT_CACHE_TIMEOUT
+
+    def get_validator_values(self, request, subject=None):
+        courses = Course.objects.all()
+        if subject:
+            courses = courses.filter(subject__slug=subject)
+        latest_subject = Subject.objects.order_by("-updated").values(
+            "updated"
+        )[:1]
+        return courses.aggregate(
+            courses=Max("updated"),
+            stats=Max("stats__updated"),
+            subjects=Max(Subquery(latest_subject)),
+            count=Count("id"),
+        )
 
     def get(self, request, subject=None):
-        subjects = Subject.objects.annotate(total_courses=Count("courses"))
-        courses = Course.objects.annotate(
-            total_modules=Count("modules")
-        ).filter(total_modules__gt=0)
+        cursor = request.GET.get("after")
+        (version,) = get_versions("catalog")
+        key = fragment_key("catalog", subject, cursor, version)
+        catalog = get_or_build(key, partial(self.build, subject, cursor))
+        return self.render_to_response(
+            {
+                "title": catalog["title"],
+                "catalog": mark_safe(catalog["html"]),
+                "subjects": Subject.objects.all(),
+            }
+        )
+
+    def build(self, subject, cursor):
+        """
+        Render the course list of the catalog page, identical for every
+        visitor. The navigation is rendered around it per request.
+        """
+        courses = Course.objects.select_related(
+            "stats", "subject", "owner"
+        ).filter(stats__total_modules__gt=0)
         if subject:
             subject = get_object_or_404(Subject, slug=subject)
             courses = courses.filter(subject=subject)
+        try:
+            courses, next_cursor = keyset_page(
+                courses, cursor, settings.COURSES_PER_PAGE
+            )
+        except ValueError:
+            raise Http404("Invalid page")
+        context = {
+            "subject": subject,
+            "courses": courses,
+            "next_cursor": next_cursor,
+        }
+        return {
+            "title": (
+                "{} courses".format(subject.title)
+                if subject
+                else "All courses"
+            ),
+            "html": render_to_string("course/catalog.html", context),
+        }
+
+
+class CourseSearchView(TemplateResponseMixin, View):
+    template_name = "course/search.html"
+
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        try:
+            page = int(request.GET.get("page", 1))
+        except ValueError:
+            raise Http404("Invalid page")
+        if page < 1:
+            raise Http404("Invalid page")
+        size = settings.COURSES_PER_PAGE
+        ids = search_courses(query, (page - 1) * size, size + 1)
+        courses = Course.objects.select_related(
+            "stats", "subject", "owner"
+        ).in_bulk(ids[:size])
         return self.render_to_response(
-            {"subjects": subjects, "subject": subject, "courses": courses}
+            {
+                "subjects": Subject.objects.all(),
+                "query": query,
+                "courses": [courses[pk] for pk in ids[:size] if pk in courses],
+                "page": page,
+                "has_next": len(ids) > size,
+            }
         )
 
 
-class CourseDetailView(DetailView):
+class CourseDetailView(ConditionalGetMixin, DetailView):
     model = Course
     template_name = "course/details.html"
+    queryset = Course.objects.select_related("stats", "subject")
+    lifetime = settings.FRAGMENT_CACHE_TIMEOUT
+
+    def get_validator_values(self, request, slug):
+        return Course.objects.filter(slug=slug).aggregate(
+            course=Max("updated"),
+            stats=Max("stats__updated"),
+            subject=Max("subject__updated"),
+            modules=Max("modules__updated"),
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        course_version, subjects_version = get_versions(
+            "course:{}".format(self.object.pk), "subjects"
+        )
+        key = fragment_key(
+            "course", self.object.pk, course_version, subjects_version
+        )
+        context["summary"] = mark_safe(
+            get_or_build(
+                key,
+                partial(
+                    render_to_string,
+                    "course/summary.html",
+                    {"course": self.object},
+                ),
+            )
+        )
         is_enrolled = False
         if self.object.students.all().filter(id=self.request.user.id):
             is_enrolled = True
@@ -96,4 +206,12 @@ class CourseDetailView(DetailView):
             initial={"course": self.object}
         )
         context["is_enrolled"] = is_enrolled
+        context["rating"] = self.object.stats.rating_average
+        context["user_rating"] = (
+            Rating.objects.filter(
+                user=self.request.user.id, course=self.object
+            )
+            .values_list("value", flat=True)
+            .first()
+        )
         return context
@@ -1,9 +1,20 @@
-from django.db.models.aggregates import Avg
+from django.conf import settings
+from django.db.models import (
+    Count,
+    DateTimeField,
+    Max,
+    Prefetch,
+    Q,
+    Subquery,
+)
 from django.shortcuts import get_object_or_404, redirect
 from django.views.generic.base import TemplateResponseMixin, View
 
+from ..conditional import ConditionalGetMixin
 from ..forms import ModuleFormSet
-from ..models import Course, Module
+from ..models import Content, Course, Module, ModuleProgress, Rating
+from ..progress import record_view
+from .ordering import OrderView
 
 
 class CourseModuleUpdateView(TemplateResponseMixin, View):
@@ -33,17 +44,61 @@ class CourseModuleUpdateView(TemplateResponseMixin, View):
         )
 
 
-class ModuleContentListView(TemplateResponseMixin, View):
+class CourseModuleOrderView(OrderView):
+    model = Module
+    parent_model = Course
+    parent_field = "course"
+
+
+class ModuleContentListView(ConditionalGetMixin, TemplateResponseMixin, View):
     template_name = "content_list.html"
+    lifetime = settings.CONTENT_RENDER_CACHE_TIMEOUT
+
+    def get_validator_values(self, request, pk, module_id):
+        in_module = Q(id=module_id)
+        progress = ModuleProgress.objects.filter(
+            user_id=request.user.pk, module_id=module_id
+        ).values("updated")
+        return Module.objects.filter(course_id=pk).aggregate(
+            course=Max("course__updated"),
+            stats=Max("course__stats__updated"),
+            modules=Max("updated"),
+            module_count=Count("id", distinct=True),
+            contents=Max("contents__updated", filter=in_module),
+            content_count=Count("contents", filter=in_module),
+            progress=Max(Subquery(progress[:1], output_field=DateTimeField())),
+        )
+
+    def dispatch(self, request, pk, module_id):
+        response = super().dispatch(request, pk, module_id)
+        if response.status_code == 304 and request.user.is_authenticated:
+            # the page wasn't rendered, its contents were still viewed
+            record_view(request.user, module_id)
+        return response
 
     def get(self, request, pk, module_id):
-        module = get_object_or_404(Module, id=module_id, course__id=pk)
-        rating = module.course.ratings.aggregate(rating=Avg("value"))
-        rated = False
-        if module.course.ratings.all().filter(
-            user=self.request.user.id, course=pk
-        ):
-            rated = True
+        modules = Module.objects.select_related(
+            "course", "course__owner", "course__stats"
+        ).prefetch_related(
+            Prefetch("contents", queryset=Content.objects.with_items())
+        )
+        module = get_object_or_404(modules, id=module_id, course__id=pk)
+        user_rating = (
+            Rating.objects.filter(user=request.user.id, course=pk)
+            .values_list("value", flat=True)
+            .first()
+        )
+        progress = None
+        if request.user.is_authenticated:
+            record_view(request.user, module.id)
+            progress = ModuleProgress.objects.filter(
+                user=request.user, module=module
+            ).first()
         return self.render_to_response(
-            {"module": module, "rated": rated, **rating}
+            {
+                "module": module,
+                "rating": module.course.stats.rating_average,
+                "user_rating": user_rating,
+                "progress": progress,
+            }
         )
@@ -0,0 +1,50 @@
+import json
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.generic.base import View
+
+
+class OrderView(LoginRequiredMixin, View):
+    """
+    Reorder the children of a parent owned by the user in one UPDATE.
+    Expects a JSON list of the ids of all the children, each once, in
+    their new order as request body.
+    """
+
+    model = None
+    parent_model = None
+    parent_field = None
+    parent_kwarg = "pk"
+    owner_field = "owner"
+
+    def get_parent(self, request, **kwargs):
+        return get_object_or_404(
+            self.parent_model,
+            pk=kwargs[self.parent_kwarg],
+            **{self.owner_field: request.user}
+        )
+
+    def post(self, request, **kwargs):
+        parent = self.get_parent(request, **kwargs)
+        try:
+            data = json.loads(request.body)
+            if not isinstance(data, list):
+                raise TypeError
+            pks = [int(pk) for pk in data]
+        except (TypeError, ValueError):
+            return HttpResponseBadRequest("Expected a list of ids.")
+        if len(set(pks)) != len(pks):
+            return HttpResponseBadRequest("Duplicate ids.")
+        children = self.model.objects.filter(**{self.parent_field: parent})
+        with transaction.atomic():
+            # positions 0..n-1 only stay unique with every child listed
+            current = children.select_for_update().values_list("pk", flat=True)
+            if set(current) != set(pks):
+                return HttpResponseBadRequest(
+                    "Expected the ids of all the children."
+                )
+            children.set_order(pks)
+        return JsonResponse({"saved": len(pks)})
@@ -0,0 +1,44 @@
+from itertools import islice
+
+from app.courses.cache import forget_enrollments
+from app.courses.models import Course, CourseStats
+
+Enrollment = Course.students.through
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def bulk_enroll(course_id, user_ids, batch_size=1000, progress=None):
+    """
+    Enroll the users of ``user_ids``, any iterable, in a course and return
+    how many were not enrolled yet.
+    Rows go in with one INSERT per ``batch_size`` users, ignoring the
+    students already enrolled, and ``progress`` is called with the number
+    of users handled after each batch. bulk_create() sends no m2m_changed,
+    so the student count and enrollment caches are updated here.
+    """
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+    before = enrollments.count()
+    done = 0
+    try:
+        for batch in batches(user_ids, batch_size):
+            Enrollment.objects.bulk_create(
+                [
+                    Enrollment(course_id=course_id, user_id=user_id)
+                    for user_id in batch
+                ],
+                ignore_conflicts=True,
+            )
+            forget_enrollments(*batch)
+            done += len(batch)
+            if progress:
+                progress(done)
+    finally:
+        CourseStats.refresh(course_id, students=True)
+    return enrollments.count() - before
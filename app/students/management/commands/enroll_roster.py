@@ -0,0 +1,86 @@
+import csv
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from app.courses.models import Course
+from app.students.enrollment import batches, bulk_enroll
+
+
+class Command(BaseCommand):
+    help = (
+        "Enroll the students of a CSV roster in a course. The roster is "
+        "read as a stream and its users are looked up and enrolled in "
+        "batches, rows of students already enrolled are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_id", type=int)
+        parser.add_argument("roster", help="CSV file, - for stdin.")
+        parser.add_argument(
+            "--field",
+            choices=["username", "email"],
+            default="username",
+            help="User field the roster identifies students by.",
+        )
+        parser.add_argument(
+            "--column", help="Roster column holding it, --field by default."
+        )
+        parser.add_argument("--batch", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        course_id = options["course_id"]
+        if not Course.objects.filter(pk=course_id).exists():
+            raise CommandError("Course {} does not exist.".format(course_id))
+        self.rows = 0
+        self.missing = 0
+        if options["roster"] == "-":
+            enrolled = self.enroll(sys.stdin, options)
+        else:
+            with open(
+                options["roster"], newline="", encoding="utf-8-sig"
+            ) as f:
+                enrolled = self.enroll(f, options)
+        self.stdout.write(
+            "Enrolled {} new students from {} rows, {} unknown".format(
+                enrolled, self.rows, self.missing
+            )
+        )
+
+    def enroll(self, roster, options):
+        reader = csv.DictReader(roster)
+        column = options["column"] or options["field"]
+        if column not in (reader.fieldnames or []):
+            raise CommandError("The roster has no {} column.".format(column))
+        user_ids = self.resolve(reader, options["field"], column, options)
+        return bulk_enroll(
+            options["course_id"],
+            user_ids,
+            batch_size=options["batch"],
+            progress=self.progress,
+        )
+
+    def resolve(self, reader, field, column, options):
+        """
+        Yield the ids of the users of the roster, looked up one batch of
+        rows at a time. Unknown users are reported on stderr.
+        """
+        users = get_user_model().objects.all()
+        for rows in batches(reader, options["batch"]):
+            self.rows += len(rows)
+            values = {row[column].strip() for row in rows if row[column]}
+            found = dict(
+                users.filter(**{field + "__in": values}).values_list(
+                    field, "id"
+                )
+            )
+            for value in sorted(values.difference(found)):
+                self.missing += 1
+                self.stderr.write("Unknown user {}".format(value))
+            yield from found.values()
+
+    def progress(self, done):
+        self.stdout.write(
+            "{} rows read, {} students handled".format(self.rows, done)
+        )
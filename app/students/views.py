@@ -4,6 +4,8 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.views.generic.edit import CreateView, FormView
 
+from app.courses.cache import forget_enrollments
+
 from .forms import CourseEnrollForm
 
 
@@ -14,6 +16,7 @@ class StudentEnrollCourseView(LoginRequiredMixin, FormView):
     def form_valid(self, form):
         self.course = form.cleaned_data["course"]
         self.course.students.add(self.request.user)
+        forget_enrollments(self.request.user.pk)
         return super().form_valid(form)
 
     def get_success_url(self):
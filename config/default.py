@@ -142,12 +142,68 @@ AUTH_USER_MODEL = "authentication.User"
 
 CRISPY_TEMPLATE_PACK = "bootstrap4"
 
+# The caches below are invalidated on save and must be shared by every
+# worker process in deployments (see config/staging.py and the
+# courses.E001 deploy check). CACHES is left to the per-process default
+# here, which is enough for runserver and the tests.
+
+# Rendered module content. Keep the timeout below AWS_URL_EXPIRE since
+# file and image items embed signed urls.
+CONTENT_RENDER_CACHE = "default"
+CONTENT_RENDER_CACHE_TIMEOUT = 300
+
+# Catalog and course detail fragments, they embed image urls as well.
+# A cold fragment is rebuilt by one worker holding a lock for at most
+# FRAGMENT_CACHE_LOCK_TIMEOUT seconds while the others wait for it.
+FRAGMENT_CACHE = "default"
+FRAGMENT_CACHE_TIMEOUT = 300
+FRAGMENT_CACHE_LOCK_TIMEOUT = 10
+
+# Ids of the courses each student is enrolled in, for the dashboard.
+ENROLLMENT_CACHE = "default"
+ENROLLMENT_CACHE_TIMEOUT = 3600
+
+COURSES_PER_PAGE = 20
+
+# Hand File and Image uploads of the content form to the process_uploads
+# worker: the request only moves them to UPLOAD_STAGING_DIR, which the
+# worker must be able to read.
+CONTENT_ASYNC_UPLOADS = False
+UPLOAD_STAGING_DIR = os.path.join(BASE_DIR, "uploads/")
+UPLOAD_MAX_ATTEMPTS = 3
+# seconds after which a running upload is considered abandoned and retried
+UPLOAD_TASK_TIMEOUT = 600
+
+# Content views and completions are buffered per process and written in
+# batches of up to PROGRESS_BUFFER_SIZE student and content pairs, at
+# least every PROGRESS_FLUSH_INTERVAL seconds while events come in.
+PROGRESS_BUFFER_SIZE = 1000
+PROGRESS_FLUSH_INTERVAL = 10
+
+# Image derivatives: name -> (width, height, crop to fill)
+THUMBNAIL_SIZES = {"card": (400, 100, True), "content": (800, 600, False)}
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_WORKERS = 2
+
+# Course search: saved courses are reindexed by SEARCH_INDEX_WORKERS
+# threads (0 indexes them on commit), and a query ranks at most
+# SEARCH_MAX_CANDIDATES courses.
+SEARCH_INDEX_WORKERS = 1
+SEARCH_MAX_CANDIDATES = 1000
+
 
 # AWS content upload
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.environ.get("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_FILE_BUFFER_SIZE = 52420000
+# parts uploaded at once and bytes of buffered parts allowed per upload
+AWS_S3_UPLOAD_CONCURRENCY = 4
+AWS_S3_UPLOAD_MAX_MEMORY = 4 * AWS_S3_FILE_BUFFER_SIZE
+# read mode fetches ranges of this size and keeps the last few in memory
+AWS_S3_STREAMING_READS = True
+AWS_S3_READ_BLOCK_SIZE = 1048576
+AWS_S3_READ_CACHE_BLOCKS = 4
 FILE_UPLOAD_TEMP_DIR = "/static/temp"
 AWS_S3_FILE_OVERWRITE = True
 AWS_S3_FILE_NAME_CHARSET = "utf-8"
@@ -158,3 +214,42 @@ AWS_LOCATION = "iot"
 AWS_CUSTOM_DOMAIN = os.environ.get("AWS_CUSTOM_DOMAIN")
 AWS_DEFAULT_ACL = os.environ.get("AWS_DEFAULT_ACL")
 AWS_URL_EXPIRE = os.environ.get("AWS_URL_EXPIRE")
+# CACHES alias shared signed urls are kept in, None to sign on every call
+AWS_S3_URL_CACHE = "default"
+# seconds between logging the hit rate of the signed url cache and adding
+# it to the totals shown by the url_cache_stats command, 0 to never
+AWS_S3_URL_STATS_INTERVAL = 300
+AWS_PRELOAD_METADATA = False
+AWS_S3_METADATA_CACHE_SIZE = 10000
+AWS_S3_METADATA_CACHE_TTL = 300
+AWS_S3_METADATA_MISSING_TTL = 10
+# S3 compatible stand-ins (minio, localstack) usually need path addressing
+AWS_S3_ENDPOINT_URL = os.environ.get("AWS_S3_ENDPOINT_URL")
+AWS_S3_ADDRESSING_STYLE = os.environ.get("AWS_S3_ADDRESSING_STYLE")
+AWS_S3_SIGNATURE_VERSION = os.environ.get("AWS_S3_SIGNATURE_VERSION")
+# lifetime of the credentials handed out for direct browser uploads
+AWS_S3_UPLOAD_EXPIRE = 3600
+# keep-alive connections of the S3 client shared by the threads of a worker
+AWS_S3_MAX_POOL_CONNECTIONS = 32
+
+DIRECT_UPLOAD_MAX_SIZE = 5 * 1024 * 1024 * 1024
+DIRECT_UPLOAD_MAX_PARTS = 10000
+# content types browsers may upload directly, per item model
+DIRECT_UPLOAD_CONTENT_TYPES = {
+    "image": ["image/gif", "image/jpeg", "image/png", "image/webp"],
+    "file": [
+        "application/octet-stream",
+        "application/pdf",
+        "application/zip",
+        "application/msword",
+        "application/vnd.openxmlformats-officedocument."
+        "wordprocessingml.document",
+        "application/vnd.ms-powerpoint",
+        "application/vnd.openxmlformats-officedocument."
+        "presentationml.presentation",
+        "audio/mpeg",
+        "text/csv",
+        "text/plain",
+        "video/mp4",
+    ],
+}
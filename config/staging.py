@@ -3,6 +3,16 @@ import django_heroku
 
 DEBUG = False
 
+# Shared by the gunicorn workers, so that a save invalidating fragments,
+# enrollments or rendered contents does it for all of them. The table is
+# created by `createcachetable` in the release phase.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "cache",
+    }
+}
+
 # To upload your media files to S3
 DEFAULT_FILE_STORAGE = "utils.content_manager.aws_S3.S3Storage"
 
@@ -1,17 +1,37 @@
+import hashlib
+import logging
 import mimetypes
 import os
 import posixpath
 import threading
+import time
 
 import boto3.session
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
+from django.core.cache import caches
 from django.core.files.storage import Storage
 from django.utils.deconstruct import deconstructible
 from django.utils.encoding import force_text, smart_text, filepath_to_uri
 
+from .aws_client import get_client
+from .aws_metadata import MISSING, MetadataCache, ObjectMetadata
 from .aws_utils import get_available_overwrite_name, setting
 from .aws_s3_file import S3StorageFile
 
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = 1000
+
+# write parameters and the form fields setting them in a presigned POST
+POST_FIELDS = {
+    "ACL": "acl",
+    "CacheControl": "Cache-Control",
+    "ContentDisposition": "Content-Disposition",
+    "ContentEncoding": "Content-Encoding",
+    "ContentType": "Content-Type",
+}
+
 
 @deconstructible
 class S3Storage(Storage):
@@ -28,14 +48,26 @@ class S3Storage(Storage):
     file_name_charset = setting("AWS_S3_FILE_NAME_CHARSET", "utf-8")
     url_protocol = setting("AWS_S3_URL_PROTOCOL", "http:")
     endpoint_url = setting("AWS_S3_ENDPOINT_URL")
+    addressing_style = setting("AWS_S3_ADDRESSING_STYLE")
+    signature_version = setting("AWS_S3_SIGNATURE_VERSION")
     region_name = setting("AWS_S3_REGION_NAME")
     use_ssl = setting("AWS_S3_USE_SSL", True)
     max_memory_size = setting("AWS_S3_MAX_MEMORY_SIZE", 0)
     location = setting("AWS_LOCATION", "")
-    preload_metadata = True
+    preload_metadata = setting("AWS_PRELOAD_METADATA", False)
+    metadata_cache_size = setting("AWS_S3_METADATA_CACHE_SIZE", 10000)
+    metadata_cache_ttl = setting("AWS_S3_METADATA_CACHE_TTL", 300)
+    metadata_missing_ttl = setting("AWS_S3_METADATA_MISSING_TTL", 10)
     custom_domain = setting("AWS_CUSTOM_DOMAIN", None)
     default_acl = setting("AWS_DEFAULT_ACL", "public-read")
     expire = setting("AWS_URL_EXPIRE", 3600)
+    upload_expire = setting("AWS_S3_UPLOAD_EXPIRE", 3600)
+    url_cache = setting("AWS_S3_URL_CACHE", "default")
+    url_stats_interval = setting("AWS_S3_URL_STATS_INTERVAL", 300)
+    upload_concurrency = setting("AWS_S3_UPLOAD_CONCURRENCY", 4)
+    upload_max_memory = setting("AWS_S3_UPLOAD_MAX_MEMORY", None)
+    upload_chunk_size = setting("AWS_S3_FILE_BUFFER_SIZE", 5242880)
+    max_pool_connections = setting("AWS_S3_MAX_POOL_CONNECTIONS", 10)
 
     def __init__(self, bucket=None, region_name=None, **settings):
         for name, value in settings.items():
@@ -43,11 +75,14 @@ class S3Storage(Storage):
                 setattr(self, name, value)
         if bucket:
             self.bucket_name = bucket
-        self._entries = {}
-        self._bucket = None
-        self._session = None
+        self._metadata = self._new_metadata_cache()
+        self._client = None
         self._region_name = setting("AWS_REGION_NAME")
-        self._connections = threading.local()
+        self._url_hits = 0
+        self._url_misses = 0
+        self._url_published = (0, 0)
+        self._url_stats_time = time.monotonic()
+        self._url_stats_lock = threading.Lock()
 
     @property
     def region_name(self):
@@ -56,61 +91,106 @@ class S3Storage(Storage):
         return self._region_name
 
     def _get_region_name(self):
-        session = self.get_session()
-        return session.region_name
+        return boto3.session.Session().region_name
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        state.pop("_connections", None)
-        state.pop("_bucket", None)
+        state.pop("_client", None)
+        state.pop("_metadata", None)
+        state.pop("_url_stats_lock", None)
         return state
 
     def __setstate__(self, state):
-        state["_connections"] = threading.local()
-        state["_bucket"] = None
+        state["_url_stats_lock"] = threading.Lock()
+        state["_url_stats_time"] = time.monotonic()
+        state["_client"] = None
         self.__dict__ = state
+        self._metadata = self._new_metadata_cache()
+
+    def _new_metadata_cache(self):
+        return MetadataCache(
+            max_entries=self.metadata_cache_size,
+            ttl=self.metadata_cache_ttl,
+            missing_ttl=self.metadata_missing_ttl,
+        )
 
     @property
-    def connection(self):
-        connection = getattr(self._connections, "connection", None)
-        if connection is None:
-            session = self.get_session()
-            self._connections.connection = session.resource(
-                "s3",
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
+    def client(self):
+        """
+        The S3 client shared by the storages and threads of the process
+        that use the same connection options.
+        """
+        if self._client is None:
+            self._client = get_client(
+                access_key=self.access_key,
+                secret_key=self.secret_key,
                 region_name=self.region_name,
-                use_ssl=self.use_ssl,
                 endpoint_url=self.endpoint_url,
+                use_ssl=self.use_ssl,
+                addressing_style=self.addressing_style,
+                signature_version=self.signature_version,
+                max_pool_connections=self.max_pool_connections,
             )
-        return self._connections.connection
+        return self._client
 
-    def get_session(self):
-        if not self._session:
-            self._session = boto3.session.Session()
-        return self._session
-
-    @property
-    def bucket(self):
-        if self._bucket is None:
-            self._bucket = self._get_bucket(self.bucket_name)
-        return self._bucket
-
-    @property
-    def entries(self):
+    def metadata(self, name):
         """
-        Get the locally cached files for the bucket.
+        Return the ObjectMetadata of a normalized name.
+        Misses are filled with a HEAD request, or with a listing of the
+        name's directory when ``preload_metadata`` is set and the
+        directory wasn't listed lately, and kept in a bounded LRU cache.
         """
-        if self.preload_metadata and not self._entries:
-            self._entries = {
-                self._decode_name(entry.key): entry
-                for entry in self.bucket.objects.filter(Prefix=self.location)
-            }
-        return self._entries
+        metadata = self._metadata.get(name)
+        if metadata is None:
+            # directory entries mark listings that are still fresh, but
+            # their objects may have been evicted or uploaded since
+            path = posixpath.dirname(name)
+            if (
+                self.preload_metadata
+                and self._metadata.get(path + "/") is None
+            ):
+                metadata = self.preload_directory(path).get(name, MISSING)
+            else:
+                metadata = self._head(name)
+            self._metadata.set(name, metadata)
+        return metadata
+
+    def preload_directory(self, path):
+        """
+        Cache the metadata of the objects directly under ``path``.
+        """
+        prefix = path.rstrip("/") + "/" if path else ""
+        paginator = self.client.get_paginator("list_objects")
+        pages = paginator.paginate(
+            Bucket=self.bucket_name, Delimiter="/", Prefix=prefix
+        )
+        entries = {}
+        for page in pages:
+            for entry in page.get("Contents", ()):
+                name = self._decode_name(entry["Key"])
+                entries[name] = ObjectMetadata(True, entry["Size"])
+                self._metadata.set(name, entries[name])
+        self._metadata.set(path.rstrip("/") + "/", ObjectMetadata(True, 0))
+        return entries
 
-    def _get_bucket(self, name):
-        bucket = self.connection.Bucket(name)
-        return bucket
+    def _head(self, name):
+        try:
+            response = self.client.head_object(
+                Bucket=self.bucket_name, Key=self._encode_name(name)
+            )
+        except ClientError as err:
+            # without s3:ListBucket a missing key answers 403
+            status = err.response["ResponseMetadata"]["HTTPStatusCode"]
+            if status in (403, 404):
+                return MISSING
+            raise
+        return ObjectMetadata(True, response["ContentLength"])
+
+    def metadata_stats(self):
+        """
+        Hit and miss counters of the metadata cache of this process.
+        """
+        return self._metadata.stats()
 
     def _clean_name(self, name):
         """
@@ -178,33 +258,204 @@ class S3Storage(Storage):
         name = self._normalize_name(cleaned_name)
         params = self._get_write_parameters(name, content)
 
-        encoded_name = self._encode_name(name)
-        obj = self.bucket.Object(encoded_name)
-        if self.preload_metadata:
-            self._entries[encoded_name] = obj
-
         content.seek(0, os.SEEK_SET)
-        obj.upload_fileobj(content, ExtraArgs=params)
+        self.client.upload_fileobj(
+            content,
+            self.bucket_name,
+            self._encode_name(name),
+            ExtraArgs=params,
+            Config=self.get_transfer_config(),
+        )
+        size = getattr(content, "size", None)
+        if size is None:
+            self._metadata.delete(name)
+        else:
+            self._metadata.set(name, ObjectMetadata(True, size))
         return cleaned_name
 
+    def presigned_post(self, name, content_type=None, max_size=None):
+        """
+        Return the url and form fields a browser posts to upload ``name``
+        straight to the bucket. The policy pins the key, the write
+        parameters of the storage and, with ``max_size``, the size.
+        """
+        name = self._normalize_name(self._clean_name(name))
+        params = self._get_write_parameters(name)
+        if content_type:
+            params["ContentType"] = content_type
+        fields = {
+            POST_FIELDS[param]: value
+            for param, value in params.items()
+            if param in POST_FIELDS
+        }
+        conditions = [{field: value} for field, value in fields.items()]
+        if max_size:
+            conditions.append(["content-length-range", 0, max_size])
+        self._metadata.delete(name)
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket_name,
+            Key=self._encode_name(name),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=int(self.upload_expire),
+        )
+
+    def create_multipart_upload(self, name, content_type=None):
+        """
+        Start a multipart upload of ``name`` whose parts the client sends
+        to the urls of ``presigned_part_urls``, return its id.
+        """
+        name = self._normalize_name(self._clean_name(name))
+        params = self._get_write_parameters(name)
+        if content_type:
+            params["ContentType"] = content_type
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket_name, Key=self._encode_name(name), **params
+        )
+        return response["UploadId"]
+
+    def presigned_part_urls(self, name, upload_id, parts):
+        name = self._normalize_name(self._clean_name(name))
+        client = self.client
+        return [
+            client.generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": self.bucket_name,
+                    "Key": self._encode_name(name),
+                    "UploadId": upload_id,
+                    "PartNumber": number,
+                },
+                ExpiresIn=int(self.upload_expire),
+            )
+            for number in range(1, parts + 1)
+        ]
+
+    def complete_multipart_upload(self, name, upload_id, parts):
+        """
+        Assemble an upload from ``parts``, (part number, ETag) pairs.
+        """
+        name = self._normalize_name(self._clean_name(name))
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self._encode_name(name),
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": number, "ETag": etag}
+                    for number, etag in sorted(parts)
+                ]
+            },
+        )
+        self._metadata.delete(name)
+
+    def abort_multipart_upload(self, name, upload_id):
+        name = self._normalize_name(self._clean_name(name))
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self._encode_name(name),
+            UploadId=upload_id,
+        )
+
+    def refresh_metadata(self, name):
+        """
+        Read the metadata of ``name`` from the bucket again, for objects
+        written by someone else than this storage.
+        """
+        name = self._normalize_name(self._clean_name(name))
+        metadata = self._head(name)
+        self._metadata.set(name, metadata)
+        return metadata
+
+    def get_transfer_config(self):
+        """
+        Multipart settings of uploads done by boto's transfer manager,
+        bounded by the same concurrency and memory ceiling as S3StorageFile.
+        """
+        config = TransferConfig(
+            multipart_threshold=self.upload_chunk_size,
+            multipart_chunksize=self.upload_chunk_size,
+            max_concurrency=self.upload_concurrency,
+            use_threads=self.upload_concurrency > 1,
+        )
+        if self.upload_max_memory:
+            config.max_in_memory_upload_chunks = max(
+                1, self.upload_max_memory // self.upload_chunk_size
+            )
+        return config
+
     def delete(self, name):
         name = self._normalize_name(self._clean_name(name))
-        self.bucket.Object(self._encode_name(name)).delete()
+        self.client.delete_object(
+            Bucket=self.bucket_name, Key=self._encode_name(name)
+        )
+        self._metadata.set(name, MISSING)
+
+    def delete_many(self, names):
+        """
+        Delete ``names`` with multi-object deletes of up to 1000 keys and
+        return the names S3 failed to delete.
+        """
+        failed = []
+        names = [
+            self._normalize_name(self._clean_name(name)) for name in names
+        ]
+        for start in range(0, len(names), DELETE_BATCH_SIZE):
+            batch = names[start : start + DELETE_BATCH_SIZE]
+            response = self.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={
+                    "Objects": [
+                        {"Key": self._encode_name(name)} for name in batch
+                    ],
+                    "Quiet": True,
+                },
+            )
+            errors = {
+                self._decode_name(error["Key"])
+                for error in response.get("Errors", ())
+            }
+            for name in batch:
+                if name in errors:
+                    self._metadata.delete(name)
+                else:
+                    self._metadata.set(name, MISSING)
+            failed += [self._strip_location(name) for name in errors]
+        return failed
+
+    def iter_objects(self, prefix, start_after=None):
+        """
+        Yield the name, size and modification time of the objects under
+        ``prefix`` in key order, after the name ``start_after`` if given.
+        The listing is read one page of up to 1000 keys at a time.
+        """
+        path = self._normalize_name(self._clean_name(prefix))
+        if not path.endswith("/"):
+            path += "/"
+        params = {"Bucket": self.bucket_name, "Prefix": path}
+        if start_after:
+            params["StartAfter"] = self._encode_name(
+                self._normalize_name(self._clean_name(start_after))
+            )
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**params):
+            for entry in page.get("Contents", ()):
+                name = self._decode_name(entry["Key"])
+                yield (
+                    self._strip_location(name),
+                    entry["Size"],
+                    entry["LastModified"],
+                )
 
-        if name in self._entries:
-            del self._entries[name]
+    def _strip_location(self, name):
+        location = force_text(self.location).strip("/")
+        if location and name.startswith(location + "/"):
+            return name[len(location) + 1 :]
+        return name
 
     def exists(self, name):
         name = self._normalize_name(self._clean_name(name))
-        if self.entries:
-            return name in self.entries
-        try:
-            self.connection.meta.client.head_object(
-                Bucket=self.bucket_name, Key=name
-            )
-            return True
-        except ClientError:
-            return False
+        return self.metadata(name).exists
 
     def listdir(self, name):
         path = self._normalize_name(self._clean_name(name))
@@ -215,7 +466,7 @@ class S3Storage(Storage):
 
         directories = []
         files = []
-        paginator = self.connection.meta.client.get_paginator("list_objects")
+        paginator = self.client.get_paginator("list_objects")
         pages = paginator.paginate(
             Bucket=self.bucket_name, Delimiter="/", Prefix=path
         )
@@ -228,16 +479,7 @@ class S3Storage(Storage):
 
     def size(self, name):
         name = self._normalize_name(self._clean_name(name))
-        if self.entries:
-            entry = self.entries.get(name)
-            if entry:
-                return (
-                    entry.size
-                    if hasattr(entry, "size")
-                    else entry.content_length
-                )
-            return 0
-        return self.bucket.Object(self._encode_name(name)).content_length
+        return self.metadata(name).size
 
     def _get_write_parameters(self, name, content=None):
         params = {}
@@ -264,13 +506,109 @@ class S3Storage(Storage):
             return "https://{}/{}".format(
                 self.custom_domain, filepath_to_uri(name)
             )
+        expire = int(self.expire or 3600)
+        if parameters or not self.url_cache:
+            return self._presigned_url(name, parameters, expire)
+
+        # URLs are shared for half their lifetime, so a cached one always
+        # has at least expire / 2 seconds left when it is handed out.
+        window = max(1, expire // 2)
+        now = int(time.time())
+        key = "s3-url:{}:{}:{}".format(
+            hashlib.md5(
+                "{}/{}".format(self.bucket_name, name).encode()
+            ).hexdigest(),
+            expire,
+            now // window,
+        )
+        cache = caches[self.url_cache]
+        url = cache.get(key)
+        self._count_url_lookup(hit=url is not None)
+        if url is None:
+            url = self._presigned_url(name, parameters, expire)
+            cache.set(key, url, window - now % window)
+        return url
+
+    def _presigned_url(self, name, parameters, expire):
         params = parameters.copy() if parameters else {}
-        params["Bucket"] = self.bucket.name
+        params["Bucket"] = self.bucket_name
         params["Key"] = self._encode_name(name)
-        url = self.bucket.meta.client.generate_presigned_url(
-            "get_object", Params=params, ExpiresIn=self.expire
+        return self.client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=expire
         )
-        return url
+
+    def _count_url_lookup(self, hit):
+        with self._url_stats_lock:
+            if hit:
+                self._url_hits += 1
+            else:
+                self._url_misses += 1
+            now = time.monotonic()
+            if (
+                not self.url_stats_interval
+                or now - self._url_stats_time < self.url_stats_interval
+            ):
+                return
+            published_hits, published_misses = self._url_published
+            new_hits = self._url_hits - published_hits
+            new_misses = self._url_misses - published_misses
+            self._url_published = (self._url_hits, self._url_misses)
+            self._url_stats_time = now
+        self._publish_url_stats(new_hits, new_misses)
+
+    def _url_stats_key(self, name):
+        return "s3-url-stats:{}:{}".format(self.bucket_name, name)
+
+    def _publish_url_stats(self, new_hits, new_misses):
+        """
+        Log the hit rate of the process and add the lookups made since
+        the last call to the totals of all processes, kept in the url
+        cache and reported by shared_url_cache_stats().
+        """
+        stats = self.url_cache_stats()
+        logger.info(
+            "Signed URL cache: %d hits, %d misses, %.1f%% hit rate",
+            stats["hits"],
+            stats["misses"],
+            stats["hit_rate"] * 100,
+        )
+        cache = caches[self.url_cache]
+        for name, count in (("hits", new_hits), ("misses", new_misses)):
+            key = self._url_stats_key(name)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # evicted since add()
+                cache.set(key, count, None)
+
+    def url_cache_stats(self):
+        """
+        Hit rate of the signed URL cache in this process.
+        """
+        with self._url_stats_lock:
+            hits, misses = self._url_hits, self._url_misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def shared_url_cache_stats(self):
+        """
+        Hit rate of the signed URL cache in every process, as published
+        each AWS_S3_URL_STATS_INTERVAL seconds.
+        """
+        cache = caches[self.url_cache]
+        hits = cache.get(self._url_stats_key("hits"), 0)
+        misses = cache.get(self._url_stats_key("misses"), 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
 
     def get_available_name(self, name, max_length=None):
         """Overwrite existing file with the same name."""
@@ -0,0 +1,68 @@
+import threading
+
+import boto3.session
+from botocore.config import Config
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(
+    access_key=None,
+    secret_key=None,
+    region_name=None,
+    endpoint_url=None,
+    use_ssl=True,
+    addressing_style=None,
+    signature_version=None,
+    max_pool_connections=10,
+):
+    """
+    Return the S3 client of the process for these options.
+    botocore clients are thread-safe, so every storage and thread with the
+    same options shares one client and its pool of keep-alive connections
+    instead of resolving credentials and opening TLS sessions of its own.
+    The client is created on first use, sessions are not thread-safe so
+    they are only touched under the lock.
+    """
+    key = (
+        access_key,
+        secret_key,
+        region_name,
+        endpoint_url,
+        use_ssl,
+        addressing_style,
+        signature_version,
+        max_pool_connections,
+    )
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                s3 = {}
+                if addressing_style:
+                    s3["addressing_style"] = addressing_style
+                client = boto3.session.Session().client(
+                    "s3",
+                    aws_access_key_id=access_key,
+                    aws_secret_access_key=secret_key,
+                    region_name=region_name,
+                    use_ssl=use_ssl,
+                    endpoint_url=endpoint_url,
+                    config=Config(
+                        s3=s3,
+                        signature_version=signature_version,
+                        max_pool_connections=max_pool_connections,
+                    ),
+                )
+                _clients[key] = client
+    return client
+
+
+def reset_clients():
+    """
+    Forget the shared clients, e.g. in a process forked after using them.
+    """
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+ObjectMetadata = namedtuple("ObjectMetadata", ["exists", "size"])
+
+MISSING = ObjectMetadata(False, 0)
+
+
+class MetadataCache:
+    """
+    Bounded cache of S3 object metadata.
+    Entries expire ``ttl`` seconds after they were stored, ``missing_ttl``
+    seconds for missing objects so an upload from another worker soon
+    shows, and the least recently used entry is evicted once
+    ``max_entries`` is reached. The
+    cache is shared by the threads of a worker, so every access holds a
+    lock.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300, missing_ttl=10):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.missing_ttl = min(ttl, missing_ttl)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached ObjectMetadata for ``key`` or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, metadata = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return metadata
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, metadata):
+        ttl = self.ttl if metadata.exists else self.missing_ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, metadata)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
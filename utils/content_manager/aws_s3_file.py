@@ -1,4 +1,8 @@
+import io
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from tempfile import SpooledTemporaryFile
 
 from botocore.exceptions import ClientError
@@ -8,6 +12,81 @@ from django.core.files import File
 from .aws_utils import setting
 
 
+class S3RangeReader(io.RawIOBase):
+    """
+    Read-only stream over an S3 object fetched with HTTP Range GETs.
+    Data is requested ``block_size`` bytes at a time, so small reads are
+    served from the block read ahead, and the last ``cache_blocks`` blocks
+    are kept for backward seeks. Memory stays bounded by
+    ``block_size * cache_blocks`` whatever the object size.
+    """
+
+    def __init__(
+        self, client, bucket, key, size, e_tag, block_size, cache_blocks
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.e_tag = e_tag
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self._size = size
+        self._position = 0
+        self._blocks = OrderedDict()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError("Invalid whence ({})".format(whence))
+        if position < 0:
+            raise ValueError("Negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        if self._position >= self._size:
+            return 0
+        index, start = divmod(self._position, self.block_size)
+        block = self._get_block(index)
+        length = min(len(buffer), len(block) - start)
+        buffer[:length] = block[start : start + length]
+        self._position += length
+        return length
+
+    def _get_block(self, index):
+        block = self._blocks.get(index)
+        if block is None:
+            start = index * self.block_size
+            end = min(start + self.block_size, self._size) - 1
+            response = self.client.get_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Range="bytes={}-{}".format(start, end),
+                IfMatch=self.e_tag,
+            )
+            block = response["Body"].read()
+            self._blocks[index] = block
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(index)
+        return block
+
+
 @deconstructible
 class S3StorageFile(File):
 
@@ -23,6 +102,9 @@ class S3StorageFile(File):
     """
 
     buffer_size = setting("AWS_S3_FILE_BUFFER_SIZE", 5242880)
+    streaming_reads = setting("AWS_S3_STREAMING_READS", True)
+    read_block_size = setting("AWS_S3_READ_BLOCK_SIZE", 1048576)
+    read_cache_blocks = setting("AWS_S3_READ_CACHE_BLOCKS", 4)
 
     def __init__(self, name, mode, storage, buffer_size=None):
         if "r" in mode and "w" in mode:
@@ -31,9 +113,10 @@ class S3StorageFile(File):
         self.name = name[len(self._storage.region_name) :].lstrip("/")
         self._mode = mode
         self._force_mode = (lambda b: b) if "b" in mode else force_text
-        self.obj = storage.bucket.Object(storage._encode_name(name))
+        self.key = storage._encode_name(name)
+        self._head = None
         if "w" not in mode:
-            self.obj.load()
+            self._load()
         self._is_dirty = False
         self._raw_bytes_written = 0
         self._file = None
@@ -41,12 +124,33 @@ class S3StorageFile(File):
         if buffer_size is not None:
             self.buffer_size = buffer_size
         self._write_counter = 0
+        self._parts = []
+        self._executor = None
+        self._upload_slots = None
+
+    def _load(self):
+        self._head = self._storage.client.head_object(
+            Bucket=self._storage.bucket_name, Key=self.key
+        )
+        return self._head
 
     @property
     def size(self):
-        return self.obj.content_length
+        return (self._head or self._load())["ContentLength"]
 
     def _get_file(self):
+        if self._file is None and "r" in self._mode and self.streaming_reads:
+            self._file = io.BufferedReader(
+                S3RangeReader(
+                    self._storage.client,
+                    self._storage.bucket_name,
+                    self.key,
+                    self.size,
+                    self._head["ETag"],
+                    self.read_block_size,
+                    self.read_cache_blocks,
+                )
+            )
         if self._file is None:
             self._file = SpooledTemporaryFile(
                 max_size=self._storage.max_memory_size,
@@ -55,7 +159,9 @@ class S3StorageFile(File):
             )
             if "r" in self._mode:
                 self._is_dirty = False
-                self.obj.download_fileobj(self._file)
+                self._storage.client.download_fileobj(
+                    self._storage.bucket_name, self.key, self._file
+                )
                 self._file.seek(0)
         return self._file
 
@@ -79,11 +185,17 @@ class S3StorageFile(File):
             raise AttributeError("File was not opened in write mode.")
         self._is_dirty = True
         if self._multipart is None:
-            self._multipart = self.obj.initiate_multipart_upload(
-                **self._storage._get_write_parameters(self.obj.key)
-            )
+            self._multipart = self._storage.client.create_multipart_upload(
+                Bucket=self._storage.bucket_name,
+                Key=self.key,
+                **self._storage._get_write_parameters(self.key)
+            )["UploadId"]
         if self.buffer_size <= self._buffer_file_size:
-            self._flush_write_buffer()
+            try:
+                self._flush_write_buffer()
+            except Exception:
+                self._abort_upload()
+                raise
         bstr = force_bytes(content)
         self._raw_bytes_written += len(bstr)
         return super().write(bstr)
@@ -99,14 +211,95 @@ class S3StorageFile(File):
     def _flush_write_buffer(self):
         """
         Flushes the write buffer.
+        With an upload concurrency above one the buffer is handed to a
+        thread pool as is and writing continues in a fresh buffer. At most
+        ``upload_max_memory`` bytes of buffers wait for upload at a time,
+        further flushes block until a part is done.
         """
         if self._buffer_file_size:
             self._write_counter += 1
-            self.file.seek(0)
-            part = self._multipart.Part(self._write_counter)
-            part.upload(Body=self.file.read())
-            self.file.seek(0)
-            self.file.truncate()
+            if self._storage.upload_concurrency > 1:
+                self._check_parts()
+                self._get_upload_slots().acquire()
+                self._parts.append(
+                    self._get_executor().submit(
+                        self._upload_part, self._write_counter, self.file
+                    )
+                )
+                self._file = None
+            else:
+                self.file.seek(0)
+                self._parts.append(
+                    self._upload_part(self._write_counter, self.file)
+                )
+                self.file.seek(0)
+                self.file.truncate()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._storage.upload_concurrency
+            )
+        return self._executor
+
+    def _get_upload_slots(self):
+        if self._upload_slots is None:
+            max_memory = self._storage.upload_max_memory
+            slots = self._storage.upload_concurrency
+            if max_memory:
+                slots = max(1, max_memory // self.buffer_size)
+            self._upload_slots = threading.BoundedSemaphore(slots)
+        return self._upload_slots
+
+    def _upload_part(self, number, buffer):
+        """
+        Upload ``buffer`` as part ``number``, from the pool if concurrent.
+        """
+        concurrent = self._storage.upload_concurrency > 1
+        try:
+            buffer.seek(0)
+            response = self._storage.client.upload_part(
+                Bucket=self._storage.bucket_name,
+                Key=self.key,
+                UploadId=self._multipart,
+                PartNumber=number,
+                Body=buffer if concurrent else buffer.read(),
+            )
+        finally:
+            if concurrent:
+                buffer.close()
+                self._upload_slots.release()
+        return {"ETag": response["ETag"], "PartNumber": number}
+
+    def _check_parts(self):
+        """
+        Raise the error of the first failed part upload, if any.
+        """
+        for part in self._parts:
+            if part.done():
+                part.result()
+
+    def _wait_for_parts(self):
+        if self._executor is None:
+            return self._parts
+        return [part.result() for part in self._parts]
+
+    def _abort_upload(self):
+        if self._executor is not None:
+            for part in self._parts:
+                part.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._abort_multipart()
+        self._is_dirty = False
+
+    def _abort_multipart(self):
+        self._storage.client.abort_multipart_upload(
+            Bucket=self._storage.bucket_name,
+            Key=self.key,
+            UploadId=self._multipart,
+        )
+        self._multipart = None
 
     def _create_empty_on_close(self):
         """
@@ -122,27 +315,39 @@ class S3StorageFile(File):
 
         try:
             # Check if the object exists on the server; if so, don't do anything
-            self.obj.load()
+            self._load()
         except ClientError as err:
             if err.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
-                self.obj.put(
+                self._storage.client.put_object(
+                    Bucket=self._storage.bucket_name,
+                    Key=self.key,
                     Body=b"",
-                    **self._storage._get_write_parameters(self.obj.key)
+                    **self._storage._get_write_parameters(self.key)
                 )
             else:
                 raise
 
     def close(self):
         if self._is_dirty:
-            self._flush_write_buffer()
-            parts = [
-                {"ETag": part.e_tag, "PartNumber": part.part_number}
-                for part in self._multipart.parts.all()
-            ]
-            self._multipart.complete(MultipartUpload={"Parts": parts})
+            try:
+                self._flush_write_buffer()
+                parts = self._wait_for_parts()
+            except Exception:
+                self._abort_upload()
+                raise
+            finally:
+                if self._executor is not None:
+                    self._executor.shutdown()
+                    self._executor = None
+            self._storage.client.complete_multipart_upload(
+                Bucket=self._storage.bucket_name,
+                Key=self.key,
+                UploadId=self._multipart,
+                MultipartUpload={"Parts": parts},
+            )
         else:
             if self._multipart is not None:
-                self._multipart.abort()
+                self._abort_multipart()
             if "w" in self._mode and self._raw_bytes_written == 0:
                 self._create_empty_on_close()
         if self._file is not None:
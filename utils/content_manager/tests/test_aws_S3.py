@@ -0,0 +1,364 @@
+import base64
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+from botocore.stub import ANY, Stubber
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from ..aws_metadata import MISSING, MetadataCache, ObjectMetadata
+from ..aws_S3 import S3Storage
+from ..aws_s3_file import S3StorageFile
+
+
+class MetadataCacheTestCase(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = MetadataCache(max_entries=2)
+        cache.set("a", ObjectMetadata(True, 1))
+        cache.set("b", ObjectMetadata(True, 2))
+        cache.get("a")
+        cache.set("c", ObjectMetadata(True, 3))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a").size, 1)
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_entries_expire(self):
+        cache = MetadataCache(ttl=0)
+        cache.set("a", ObjectMetadata(True, 1))
+        self.assertIsNone(cache.get("a"))
+
+    def test_missing_objects_expire_sooner(self):
+        cache = MetadataCache(ttl=300, missing_ttl=0)
+        cache.set("a", ObjectMetadata(True, 1))
+        cache.set("b", MISSING)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+
+
+class StubbedStorageTestCase(SimpleTestCase):
+    def setUp(self):
+        self.storage = S3Storage(
+            bucket="bucket",
+            access_key="key",
+            secret_key="secret",
+            location="iot",
+            default_acl=None,
+            endpoint_url=None,
+        )
+        self.storage._region_name = "us-east-1"
+        self.stubber = Stubber(self.storage.client)
+        self.stubber.activate()
+
+    def tearDown(self):
+        self.stubber.deactivate()
+
+
+class S3StorageTestCase(StubbedStorageTestCase):
+    def test_exists_and_size_head_once(self):
+        self.stubber.add_response(
+            "head_object",
+            {"ContentLength": 42},
+            {"Bucket": "bucket", "Key": "iot/files/a.pdf"},
+        )
+        self.assertTrue(self.storage.exists("files/a.pdf"))
+        self.assertEqual(self.storage.size("files/a.pdf"), 42)
+        self.stubber.assert_no_pending_responses()
+        self.assertEqual(self.storage.metadata_stats()["hits"], 1)
+
+    def test_missing_object(self):
+        self.stubber.add_client_error(
+            "head_object", service_error_code="404", http_status_code=404
+        )
+        self.assertFalse(self.storage.exists("files/missing.pdf"))
+        self.assertFalse(self.storage.exists("files/missing.pdf"))
+
+    def test_preload_lists_one_directory(self):
+        self.storage.preload_metadata = True
+        self.stubber.add_response(
+            "list_objects",
+            {"Contents": [{"Key": "iot/images/a.png", "Size": 7}]},
+            {"Bucket": "bucket", "Delimiter": "/", "Prefix": "iot/images/"},
+        )
+        self.stubber.add_client_error(
+            "head_object", service_error_code="404", http_status_code=404
+        )
+        self.assertEqual(self.storage.size("images/a.png"), 7)
+        # absent from a fresh listing, it may have been uploaded since
+        self.assertFalse(self.storage.exists("images/b.png"))
+        self.stubber.assert_no_pending_responses()
+
+    def test_preload_heads_names_evicted_from_a_fresh_listing(self):
+        self.storage.preload_metadata = True
+        self.storage._metadata = MetadataCache(max_entries=2)
+        self.stubber.add_response(
+            "list_objects",
+            {
+                "Contents": [
+                    {"Key": "iot/images/a.png", "Size": 1},
+                    {"Key": "iot/images/b.png", "Size": 2},
+                    {"Key": "iot/images/c.png", "Size": 3},
+                ]
+            },
+            {"Bucket": "bucket", "Delimiter": "/", "Prefix": "iot/images/"},
+        )
+        self.stubber.add_response(
+            "head_object",
+            {"ContentLength": 1},
+            {"Bucket": "bucket", "Key": "iot/images/a.png"},
+        )
+        self.assertTrue(self.storage.exists("images/c.png"))
+        self.assertTrue(self.storage.exists("images/a.png"))
+        self.stubber.assert_no_pending_responses()
+
+
+class S3StorageFileWriteTestCase(StubbedStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage.upload_concurrency = 2
+        self.stubber.add_response(
+            "create_multipart_upload",
+            {"UploadId": "upload"},
+            {"Bucket": "bucket", "Key": "iot/files/a.bin", "ContentType": ANY},
+        )
+        self.file = S3StorageFile(
+            "iot/files/a.bin", "wb", self.storage, buffer_size=5
+        )
+
+    def test_parts_are_uploaded_from_a_pool(self):
+        for i in range(3):
+            self.stubber.add_response("upload_part", {"ETag": '"etag"'})
+        self.stubber.add_response(
+            "complete_multipart_upload",
+            {},
+            {
+                "Bucket": "bucket",
+                "Key": "iot/files/a.bin",
+                "UploadId": "upload",
+                "MultipartUpload": {
+                    "Parts": [
+                        {"ETag": '"etag"', "PartNumber": number}
+                        for number in (1, 2, 3)
+                    ]
+                },
+            },
+        )
+        for chunk in (b"aaaaa", b"bbbbb", b"cc"):
+            self.file.write(chunk)
+        self.file.close()
+        self.stubber.assert_no_pending_responses()
+
+    def test_failed_part_aborts_the_upload(self):
+        self.stubber.add_client_error("upload_part", http_status_code=500)
+        self.stubber.add_response("abort_multipart_upload", {})
+        self.file.write(b"aaaaa")
+        with self.assertRaises(ClientError):
+            self.file.close()
+        self.stubber.assert_no_pending_responses()
+
+
+class S3StorageFileReadTestCase(StubbedStorageTestCase):
+    data = b"ab\ncdefghij"
+
+    def setUp(self):
+        super().setUp()
+        self.stubber.add_response(
+            "head_object",
+            {"ContentLength": len(self.data), "ETag": '"etag"'},
+            {"Bucket": "bucket", "Key": "iot/files/a.txt"},
+        )
+        self.file = S3StorageFile("iot/files/a.txt", "rb", self.storage)
+        self.file.read_block_size = 4
+
+    def expect_range(self, start, end):
+        self.stubber.add_response(
+            "get_object",
+            {
+                "Body": StreamingBody(
+                    io.BytesIO(self.data[start : end + 1]), end + 1 - start
+                )
+            },
+            {
+                "Bucket": "bucket",
+                "Key": "iot/files/a.txt",
+                "Range": "bytes={}-{}".format(start, end),
+                "IfMatch": '"etag"',
+            },
+        )
+
+    def test_reads_only_the_requested_ranges(self):
+        self.expect_range(8, 10)
+        self.file.seek(8)
+        self.assertEqual(self.file.read(), b"hij")
+        self.expect_range(0, 3)
+        self.file.seek(0)
+        self.assertEqual(self.file.readline(), b"ab\n")
+        self.assertEqual(self.file.read(1), b"c")
+        self.stubber.assert_no_pending_responses()
+
+
+class S3StorageUrlTestCase(StubbedStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+        self.storage.custom_domain = None
+
+    def test_signed_urls_are_reused(self):
+        client = self.storage.client
+        with mock.patch.object(
+            client, "generate_presigned_url", return_value="https://signed"
+        ) as sign:
+            urls = {self.storage.url("images/a.png") for i in range(3)}
+        self.assertEqual(urls, {"https://signed"})
+        sign.assert_called_once()
+        stats = self.storage.url_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_urls_are_renewed_each_half_lifetime(self):
+        self.storage.expire = 100
+        client = self.storage.client
+        with mock.patch.object(
+            client, "generate_presigned_url", side_effect=["first", "second"]
+        ), mock.patch("utils.content_manager.aws_S3.time") as clock:
+            clock.time.side_effect = [1000, 1049, 1050]
+            clock.monotonic.return_value = 0
+            urls = [self.storage.url("images/a.png") for i in range(3)]
+        self.assertEqual(urls, ["first", "first", "second"])
+
+    def test_hit_rate_is_published(self):
+        client = self.storage.client
+        with mock.patch.object(
+            client, "generate_presigned_url", return_value="https://signed"
+        ):
+            self.storage.url("images/a.png")
+            self.storage._url_stats_time -= self.storage.url_stats_interval
+            with mock.patch("utils.content_manager.aws_S3.logger") as logger:
+                self.storage.url("images/a.png")
+            self.storage.url("images/a.png")
+        self.assertEqual(logger.info.call_args[0][1:], (1, 1, 50.0))
+        stats = self.storage.shared_url_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        stdout = io.StringIO()
+        call_command("url_cache_stats", "--bucket=bucket", stdout=stdout)
+        self.assertEqual(
+            stdout.getvalue(), "1 hits, 1 misses, 50.0% hit rate\n"
+        )
+
+
+class S3StorageDirectUploadTestCase(StubbedStorageTestCase):
+    def test_presigned_post_pins_key_type_and_size(self):
+        post = self.storage.presigned_post(
+            "files/a.pdf", "application/pdf", max_size=100
+        )
+        self.assertEqual(post["fields"]["key"], "iot/files/a.pdf")
+        self.assertEqual(post["fields"]["Content-Type"], "application/pdf")
+        policy = json.loads(base64.b64decode(post["fields"]["policy"]))
+        self.assertIn(["content-length-range", 0, 100], policy["conditions"])
+        self.assertIn(
+            {"Content-Type": "application/pdf"}, policy["conditions"]
+        )
+
+    def test_multipart_upload(self):
+        self.stubber.add_response(
+            "create_multipart_upload",
+            {"UploadId": "upload"},
+            {
+                "Bucket": "bucket",
+                "Key": "iot/files/a.pdf",
+                "ContentType": "application/pdf",
+            },
+        )
+        self.stubber.add_response(
+            "complete_multipart_upload",
+            {},
+            {
+                "Bucket": "bucket",
+                "Key": "iot/files/a.pdf",
+                "UploadId": "upload",
+                "MultipartUpload": {
+                    "Parts": [
+                        {"PartNumber": 1, "ETag": "e1"},
+                        {"PartNumber": 2, "ETag": "e2"},
+                    ]
+                },
+            },
+        )
+        upload_id = self.storage.create_multipart_upload("files/a.pdf")
+        urls = self.storage.presigned_part_urls("files/a.pdf", upload_id, 2)
+        self.assertEqual(len(urls), 2)
+        self.assertIn("partNumber=2", urls[1])
+        self.storage.complete_multipart_upload(
+            "files/a.pdf", upload_id, [(2, "e2"), (1, "e1")]
+        )
+        self.stubber.assert_no_pending_responses()
+
+
+class SharedClientTestCase(SimpleTestCase):
+    def get_storage(self, **options):
+        storage = S3Storage(
+            bucket="bucket", access_key="key", secret_key="secret", **options
+        )
+        storage._region_name = "us-east-1"
+        return storage
+
+    def test_storages_and_threads_share_one_client(self):
+        storages = [self.get_storage() for i in range(16)]
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            clients = set(pool.map(lambda storage: storage.client, storages))
+        self.assertEqual(len(clients), 1)
+        other = self.get_storage(max_pool_connections=50).client
+        self.assertNotIn(other, clients)
+        self.assertEqual(other.meta.config.max_pool_connections, 50)
+
+
+class S3StorageBatchTestCase(StubbedStorageTestCase):
+    def test_delete_many_sends_batches_of_1000_keys(self):
+        names = ["files/{}.pdf".format(i) for i in range(1001)]
+        self.stubber.add_response("delete_objects", {})
+        self.stubber.add_response(
+            "delete_objects",
+            {
+                "Errors": [
+                    {"Key": "iot/files/1000.pdf", "Code": "AccessDenied"}
+                ]
+            },
+            {
+                "Bucket": "bucket",
+                "Delete": {
+                    "Objects": [{"Key": "iot/files/1000.pdf"}],
+                    "Quiet": True,
+                },
+            },
+        )
+        self.assertEqual(self.storage.delete_many(names), ["files/1000.pdf"])
+        self.stubber.assert_no_pending_responses()
+        self.assertFalse(self.storage.exists("files/0.pdf"))
+
+    def test_iter_objects_resumes_after_a_name(self):
+        self.stubber.add_response(
+            "list_objects_v2",
+            {
+                "Contents": [
+                    {
+                        "Key": "iot/files/b.pdf",
+                        "Size": 3,
+                        "LastModified": datetime(2020, 1, 1),
+                    }
+                ]
+            },
+            {
+                "Bucket": "bucket",
+                "Prefix": "iot/files/",
+                "StartAfter": "iot/files/a.pdf",
+            },
+        )
+        objects = list(
+            self.storage.iter_objects("files", start_after="files/a.pdf")
+        )
+        self.assertEqual(objects, [("files/b.pdf", 3, datetime(2020, 1, 1))])